@@ -1,51 +1,225 @@
-from flask import Flask, request, render_template, send_from_directory
-import numpy as np
 import os
 import sys
-import pickle
-import pandas as pd
-from pathlib import Path
+import json
+import time
+from contextlib import contextmanager
+
+# Cold-start layout: only flask, numpy and the plain-Python normaliser are
+# imported at module load. With Artifacts/compact_model present the model and
+# encoder are loaded from .npy/.json files, so pandas, pickle, scikit-learn and
+# catboost are never imported; they are deferred to the pickle fallback.
+
+# AIRBNB_STARTUP_PROFILE=true prints per-import and per-artifact load times and
+# adds them to /health. AIRBNB_WARMUP=true loads the artifacts and runs one
+# dummy prediction during init instead of on the first request.
+STARTUP_PROFILE = os.environ.get("AIRBNB_STARTUP_PROFILE", "false").lower() == "true"
+WARMUP = os.environ.get("AIRBNB_WARMUP", "false").lower() == "true"
+# Set to false to always load the pickled artifacts
+USE_COMPACT_ARTIFACTS = os.environ.get("AIRBNB_COMPACT_ARTIFACTS", "true").lower() == "true"
+
+_init_started = time.perf_counter()
+startup_timings = {}
+
+
+@contextmanager
+def timed(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings[name] = round((time.perf_counter() - start) * 1000.0, 3)
+
+
+with timed("import flask"):
+    from flask import Flask, request, render_template, send_from_directory
+with timed("import numpy"):
+    import numpy as np
 
 # Add the project root to Python path
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, project_root)
 
-app = Flask(__name__, 
+with timed("import feature_schema"):
+    from src.Airbnb.pipelines.Feature_schema import FEATURE_COLUMNS, FEATURE_DTYPE, AMENITY_LIST, normalise_record
+    from src.Airbnb.pipelines.Runtime_metrics import get_metrics, instrument_app, mark_failed, timed_stage
+
+app = Flask(__name__,
             template_folder=os.path.join(project_root, 'templates'),
             static_folder=os.path.join(project_root, 'static'))
+# Request latency/outcome histograms and the Prometheus /metrics endpoint
+instrument_app(app, ["home"])
 
-# Global variables for model and preprocessor
+MODEL_PATH = os.path.join(project_root, 'Artifacts', 'Model.pkl')
+PREPROCESSOR_PATH = os.path.join(project_root, 'Artifacts', 'Preprocessor.pkl')
+COMPACT_MODEL_DIR = os.path.join(project_root, 'Artifacts', 'compact_model')
+PRICE_GRID_DIR = os.path.join(project_root, 'Artifacts', 'price_grid')
+GEO_INDEX_DIR = os.path.join(project_root, 'Artifacts', 'geo_index')
+AMENITIES_PATH = os.path.join(project_root, 'Artifacts', 'amenities.json')
+TRAINING_METRICS_PATH = os.path.join(project_root, 'Artifacts', 'training_metrics.json')
+
+# Global variables for model, preprocessor and its compiled fast-path encoder
 model = None
 preprocessor = None
+encoder = None
+artifact_format = None
+# Precomputed prices for SearchForm-style requests (Artifacts/price_grid)
+price_grid = None
+# Spatial index when the model was trained with the geo features (Artifacts/geo_index)
+geo_index = None
+# Amenity vocabulary when the model was trained with the amenity columns (Artifacts/amenities.json)
+amenities = None
 
-def load_artifacts():
-    """Load model and preprocessor lazily"""
-    global model, preprocessor
-    
-    if model is not None and preprocessor is not None:
-        return model, preprocessor
-    
-    MODEL_PATH = os.path.join(project_root, 'Artifacts', 'Model.pkl')
-    PREPROCESSOR_PATH = os.path.join(project_root, 'Artifacts', 'Preprocessor.pkl')
-    
-    try:
-        if os.path.exists(MODEL_PATH):
+def load_compact_artifacts():
+    """Model and encoder from Artifacts/compact_model, if it was exported from the current pickles."""
+    global model, encoder, artifact_format
+
+    with timed("import compact_model"):
+        from src.Airbnb.pipelines.Compact_model import CompactModel, ENCODER_FILE, is_current
+        from src.Airbnb.pipelines.Feature_encoder import FastFeatureEncoder
+
+    encoder_path = os.path.join(COMPACT_MODEL_DIR, ENCODER_FILE)
+    with timed("check compact_model"):
+        if not (os.path.exists(encoder_path) and is_current(COMPACT_MODEL_DIR, [MODEL_PATH, PREPROCESSOR_PATH])):
+            print("Compact artifacts missing or stale, loading pickles")
+            return False
+    with timed("load encoder.json"):
+        encoder = FastFeatureEncoder.load(encoder_path)
+    with timed("load compact_model"):
+        model = CompactModel.load(COMPACT_MODEL_DIR)
+    artifact_format = "compact"
+    print("Compact model and encoder loaded successfully")
+    return True
+
+def load_pickled_artifacts():
+    global model, preprocessor, encoder, artifact_format
+
+    with timed("import pickle"):
+        import pickle
+        from src.Airbnb.pipelines.Feature_encoder import compile_encoder
+
+    if os.path.exists(MODEL_PATH):
+        with timed("unpickle Model.pkl"):
             with open(MODEL_PATH, 'rb') as f:
                 model = pickle.load(f)
-            print("Model loaded successfully")
-        else:
-            print(f"Model file not found at: {MODEL_PATH}")
-            
-        if os.path.exists(PREPROCESSOR_PATH):
+        print("Model loaded successfully")
+    else:
+        print(f"Model file not found at: {MODEL_PATH}")
+
+    if os.path.exists(PREPROCESSOR_PATH):
+        with timed("unpickle Preprocessor.pkl"):
             with open(PREPROCESSOR_PATH, 'rb') as f:
                 preprocessor = pickle.load(f)
-            print("Preprocessor loaded successfully")
-        else:
-            print(f"Preprocessor file not found at: {PREPROCESSOR_PATH}")
+        print("Preprocessor loaded successfully")
+        try:
+            with timed("compile encoder"):
+                encoder = compile_encoder(preprocessor)
+        except Exception as e:
+            print(f"Fast feature encoder unavailable, using preprocessor.transform: {e}")
+    else:
+        print(f"Preprocessor file not found at: {PREPROCESSOR_PATH}")
+    artifact_format = "pickle"
+
+def load_artifacts():
+    """Load model and preprocessor lazily"""
+    if model is not None and (encoder is not None or preprocessor is not None):
+        return model, encoder, preprocessor
+
+    try:
+        with timed("load artifacts"):
+            if not (USE_COMPACT_ARTIFACTS and load_compact_artifacts()):
+                load_pickled_artifacts()
+        record_model_load()
     except Exception as e:
         print(f"Error loading artifacts: {e}")
-    
-    return model, preprocessor
+    load_feature_extras()
+    load_price_grid()
+    report_startup("artifacts")
+
+    return model, encoder, preprocessor
+
+def load_feature_extras():
+    """Amenity vocabulary and geo index, when the model's recorded feature layout has those blocks."""
+    global geo_index, amenities
+    if model is None or (encoder is None and preprocessor is None):
+        return
+    try:
+        with timed("load feature extras"):
+            from src.Airbnb.pipelines.Geo_index import GeoIndexConfig
+            from src.Airbnb.pipelines.Amenities_encoder import AmenitiesConfig
+            from src.Airbnb.pipelines.Feature_layout import LAYOUT_KEY, read_feature_layout, load_feature_blocks
+            encoded_features = encoder.n_features if encoder is not None else len(preprocessor.get_feature_names_out())
+            if artifact_format == "compact":
+                layout = model.meta.get(LAYOUT_KEY)
+            else:
+                layout = read_feature_layout(TRAINING_METRICS_PATH, MODEL_PATH)
+            geo_index, amenities = load_feature_blocks(layout, model, encoded_features,
+                                                       GeoIndexConfig(index_dir=GEO_INDEX_DIR),
+                                                       AmenitiesConfig(vocabulary_path=AMENITIES_PATH))
+    except Exception as e:
+        print(f"Geo index or amenity vocabulary unavailable: {e}")
+
+def load_price_grid():
+    global price_grid
+    if os.environ.get("AIRBNB_PRICE_GRID", "true").lower() != "true" or not os.path.exists(PRICE_GRID_DIR):
+        return
+    try:
+        with timed("load price_grid"):
+            from src.Airbnb.pipelines.Compact_model import is_current
+            from src.Airbnb.pipelines.Price_grid import PriceGrid
+            if is_current(PRICE_GRID_DIR, [MODEL_PATH, PREPROCESSOR_PATH]):
+                price_grid = PriceGrid.load(PRICE_GRID_DIR)
+            else:
+                print("Price grid was built for other artifacts, not using it")
+    except Exception as e:
+        print(f"Price grid unavailable: {e}")
+
+def lookup_log_price(record):
+    """Precomputed log price for SearchForm-style records, else the model's."""
+    if price_grid is not None:
+        log_price = price_grid.lookup(record)
+        if log_price is not None:
+            metrics = get_metrics()
+            if metrics is not None:
+                metrics.grid_hits.inc()
+            return log_price
+    return predict_log_price(record)
+
+def record_model_load():
+    metrics = get_metrics()
+    if metrics is None or model is None:
+        return
+    from src.Airbnb.pipelines.Compact_model import file_digest
+    if artifact_format == "compact":
+        version = model.meta.get("source_digests", {}).get("Model.pkl", "")
+    else:
+        version = file_digest(MODEL_PATH)
+    metrics.model_loaded(version[:12], startup_timings["load artifacts"] / 1000.0, artifact_format)
+
+def predict_log_price(record):
+    with timed_stage("transform"):
+        if encoder is not None:
+            transformed_data = encoder.encode(record)
+        else:
+            import pandas as pd
+            transformed_data = np.asarray(preprocessor.transform(pd.DataFrame([record], columns=FEATURE_COLUMNS)),
+                                          dtype=FEATURE_DTYPE)
+        if geo_index is not None:
+            from src.Airbnb.pipelines.Geo_index import append_geo_features
+            transformed_data = append_geo_features(transformed_data, [record["latitude"]], [record["longitude"]],
+                                                   geo_index)
+        if amenities is not None:
+            from src.Airbnb.pipelines.Amenities_encoder import append_amenity_features
+            transformed_data = append_amenity_features(transformed_data, [record.get(AMENITY_LIST)], amenities)
+    with timed_stage("predict"):
+        log_price = model.predict(transformed_data)[0]
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.rows.inc()
+    return log_price
+
+def report_startup(stage):
+    if STARTUP_PROFILE:
+        print(json.dumps({"startup_profile": stage, "timings_ms": startup_timings}))
 
 @app.route("/static/<path:filename>")
 def serve_static(filename):
@@ -58,145 +232,43 @@ def serve_static(filename):
 @app.route("/health")
 def health():
     """Health check endpoint"""
-    return {
-        "status": "healthy", 
+    status = {
+        "status": "healthy",
         "message": "Airbnb Price Prediction API is running",
         "model_loaded": model is not None,
-        "preprocessor_loaded": preprocessor is not None
+        "preprocessor_loaded": encoder is not None or preprocessor is not None,
+        "artifact_format": artifact_format
     }
+    if STARTUP_PROFILE:
+        status["startup_ms"] = startup_timings
+    return status
 
 @app.route("/", methods=["GET", "POST"])
 def home():
     if request.method == "POST":
         try:
             # Load artifacts
-            model, preprocessor = load_artifacts()
-            
-            if model is None or preprocessor is None:
+            model, encoder, preprocessor = load_artifacts()
+
+            if model is None or (encoder is None and preprocessor is None):
                 msg = "Error: Model or preprocessor not loaded. Please ensure model artifacts are available."
                 if request.is_json:
                     return {"success": False, "error": msg}, 500
+                mark_failed()
                 return render_template("index.html", result=msg)
-            
+
             # Determine source of data
-            source = request.get_json() if request.is_json else request.form
-            
-            # Helper to get value
-            def get_val(key, default):
-                return source.get(key, default)
-
-            # Get data with defaults
-            property_type = get_val("property_type", "Apartment")
-            room_type = get_val("room_type", "Entire home/apt")
-            amenities = get_val("amenities", 0) # API expects simple int for now? 
-            # Note: The original code used request.form.get("amenities", "") -> string
-            # But app.py used safe_int(..., 0).
-            # The original api/index.py used request.form.get("amenities", "")
-            # And then: 'amenities': [amenities] -> usage in DataFrame.
-            # If the model expects text features (e.g. CountVectorizer on amenities), string is correct.
-            # If it expects a count, int is correct.
-            # Looking at api/index.py line 137: 'amenities': [amenities]
-            # And app.py line 45: amenities=safe_int(json_data.get("amenities"), 0)
-            # This is a CONTRADICTION.
-            # app.py treats amenities as INT. api/index.py treats it as STRING?
-            # Let's look at lines 158: preprocessor.transform(df).
-            # If the preprocessor handles text, string is right.
-            # I will trust api/index.py existing logic which was: amenities = request.form.get("amenities", "")
-            # So I will keep it as string/raw unless I see otherwise.
-            
-            amenities = get_val("amenities", "")
-            
-            # Handle numeric fields
-            def safe_int(key, default=0):
-                try:
-                    val = get_val(key, default)
-                    return int(val)
-                except (ValueError, TypeError):
-                    return default
-            
-            def safe_float(key, default=0.0):
-                try:
-                    val = get_val(key, default)
-                    return float(val)
-                except (ValueError, TypeError):
-                    return default
-
-            accommodates = safe_int("accommodates", 1)
-            bathrooms = safe_float("bathrooms", 1.0)
-            bed_type = get_val("bed_type", "Real Bed")
-            cancellation_policy = get_val("cancellation_policy", "flexible")
-            
-            # Cleaning fee: form uses "1" for true?
-            raw_cleaning = get_val("cleaning_fee", "1")
-            if isinstance(raw_cleaning, bool):
-                cleaning_fee = raw_cleaning
-            else:
-                cleaning_fee = str(raw_cleaning) == "1"
-
-            city = get_val("city", "NYC")
-            
-            raw_host_pic = get_val("host_has_profile_pic", "1")
-            host_has_profile_pic = raw_host_pic if isinstance(raw_host_pic, bool) else str(raw_host_pic) == "1"
-            
-            raw_host_ident = get_val("host_identity_verified", "1")
-            host_identity_verified = raw_host_ident if isinstance(raw_host_ident, bool) else str(raw_host_ident) == "1"
-            
-            # Handle host_response_rate
-            # Original: string "100" -> "100%"
-            val_resp = get_val("host_response_rate", "100")
-            if isinstance(val_resp, (int, float)):
-                host_response_rate = f"{int(val_resp)}%"
-            else:
-                # It might already have % or be empty?
-                # Try to parse number
-                try:
-                    clean_resp = str(val_resp).replace("%", "")
-                    host_response_rate = f"{int(clean_resp)}%"
-                except:
-                    host_response_rate = "100%"
-            
-            raw_instant = get_val("instant_bookable", "1")
-            instant_bookable = raw_instant if isinstance(raw_instant, bool) else str(raw_instant) == "1"
-            
-            neighbourhood = get_val("neighbourhood", "")
-            
-            number_of_reviews = safe_int("number_of_reviews", 0)
-            review_scores_rating = safe_int("review_scores_rating", 0)
-            bedrooms = safe_int("bedrooms", 0)
-            beds = safe_int("beds", 0)
-
-            # Create dataframe with all required columns
-            data = {
-                'property_type': [property_type],
-                'room_type': [room_type],
-                'amenities': [amenities],
-                'accommodates': [accommodates],
-                'bathrooms': [bathrooms],
-                'bed_type': [bed_type],
-                'cancellation_policy': [cancellation_policy],
-                'cleaning_fee': [cleaning_fee],
-                'city': [city],
-                'host_has_profile_pic': [host_has_profile_pic],
-                'host_identity_verified': [host_identity_verified],
-                'host_response_rate': [host_response_rate],
-                'instant_bookable': [instant_bookable],
-                'neighbourhood': [neighbourhood],
-                'number_of_reviews': [number_of_reviews],
-                'review_scores_rating': [review_scores_rating],
-                'bedrooms': [bedrooms],
-                'beds': [beds]
-            }
-            
-            df = pd.DataFrame(data)
-
-            # Transform and predict
-            transformed_data = preprocessor.transform(df)
-            prediction = model.predict(transformed_data)
-            
-            # Convert log_price to actual price
-            log_price = prediction[0]
-            actual_price = round(np.exp(log_price), 2)
-            
+            with timed_stage("parse"):
+                source = request.get_json() if request.is_json else request.form
+
+            # Shared normaliser: same defaults, mappings and column order as app.py
+            with timed_stage("normalise"):
+                record = normalise_record(source)
+
+            # Transform and predict, then convert log_price to actual price
+            log_price = lookup_log_price(record)
+            actual_price = round(float(np.exp(log_price)), 2)
+
             if request.is_json:
                 return {
                     "success": True,
@@ -208,6 +280,7 @@ def home():
         except Exception as e:
             error_message = f"Error during prediction: {str(e)}"
             print(error_message)
+            mark_failed()
             if request.is_json:
                 return {"success": False, "error": error_message}, 500
             return render_template("index.html", result=f"Error: {error_message}")
@@ -218,9 +291,19 @@ def home():
              return {"status": "Backend running"}
         return render_template("index.html", result="")
 
+if WARMUP:
+    # Pay the artifact load and first-prediction costs at init, not on a user's request
+    with timed("warmup"):
+        load_artifacts()
+        if model is not None:
+            predict_log_price(normalise_record({}))
+
+startup_timings["module init"] = round((time.perf_counter() - _init_started) * 1000.0, 3)
+report_startup("init")
+
 # For Vercel serverless
 app = app
 
 # For local development
 if __name__ == '__main__':
-    app.run(host="0.0.0.0", port=8080, debug=True)
\ No newline at end of file
+    app.run(host="0.0.0.0", port=8080, debug=True)
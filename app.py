@@ -1,7 +1,18 @@
-from flask import Flask, request, render_template, jsonify
+from flask import Flask, request, render_template, jsonify, g
 from flask_cors import CORS
-from src.Airbnb.pipelines.Prediction_Pipeline import CustomData, PredictPipeline
+from src.Airbnb.pipelines.Prediction_Pipeline import PredictPipeline, get_batcher
+from src.Airbnb.pipelines.Feature_schema import normalise_record
+from src.Airbnb.pipelines.Prediction_cache import get_cache
+from src.Airbnb.pipelines.Runtime_metrics import instrument_app, mark_failed, timed_stage
+from src.Airbnb.pipelines.Request_profiler import instrument_profiling
+from src.Airbnb.logger import queue_handler, set_request_id, reset_request_id
 import numpy as np
+import json
+import os
+import uuid
+
+# Upper bound on records accepted by /predict/batch in one request
+MAX_BATCH_RECORDS = int(os.environ.get("AIRBNB_MAX_BATCH_RECORDS", "50000"))
 
 app = Flask(__name__)
 # Update CORS to allow the new Vercel App
@@ -9,70 +20,61 @@ CORS(app, resources={r"/*": {"origins": [
     "https://airbnb-sigma-azure.vercel.app",
     "http://localhost:3000"
 ]}})
+# Request latency/outcome histograms and the Prometheus /metrics endpoint
+instrument_app(app, ["predict", "predict_batch", "form"])
+# Opt-in cProfile of selected requests and POST /admin/profile (AIRBNB_PROFILE_TOKEN / AIRBNB_PROFILE_SAMPLE_RATE)
+instrument_profiling(app, ["predict", "predict_batch", "form"])
+
+# Every log record of a request carries its id (the caller's X-Request-ID when given)
+@app.before_request
+def bind_request_id():
+    g.request_id = request.headers.get("X-Request-ID", "")[:64] or uuid.uuid4().hex
+    g.request_id_token = set_request_id(g.request_id)
+
+@app.after_request
+def add_request_id_header(response):
+    if "request_id" in g:
+        response.headers["X-Request-ID"] = g.request_id
+    return response
+
+@app.teardown_request
+def unbind_request_id(exc):
+    token = g.pop("request_id_token", None)
+    if token is not None:
+        reset_request_id(token)
 
 # Health check endpoint
 @app.route("/", methods=["GET"])
 def health():
-    return jsonify({"status": "Backend is running"})
+    status = {"status": "Backend is running", "log_records_dropped": queue_handler.dropped}
+    cache = get_cache()
+    if cache is not None:
+        status["cache"] = cache.stats()
+    batcher = get_batcher()
+    if batcher is not None:
+        status["microbatch"] = batcher.stats()
+    return jsonify(status)
 
 # API endpoint for predictions (JSON)
 @app.route("/predict", methods=["POST"])
 def predict():
     try:
         # Get JSON data from request
-        json_data = request.get_json()
+        with timed_stage("parse"):
+            json_data = request.get_json()
         
         if not json_data:
             return jsonify({"error": "No JSON data provided"}), 400
         
-        # Helper function for safe type conversion
-        def safe_int(value, default):
-            if value is None:
-                return default
-            try:
-                return int(value)
-            except (ValueError, TypeError):
-                return default
-        
-        def safe_float(value, default):
-            if value is None:
-                return default
-            try:
-                return float(value)
-            except (ValueError, TypeError):
-                return default
-        
-        # Validate and convert form data to CustomData object
-        data = CustomData(
-            property_type=json_data.get("property_type") or "Apartment",
-            room_type=json_data.get("room_type") or "Entire home/apt",
-            amenities=safe_int(json_data.get("amenities"), 0),
-            accommodates=safe_int(json_data.get("accommodates"), 1),
-            bathrooms=safe_float(json_data.get("bathrooms"), 1.0),
-            bed_type=json_data.get("bed_type") or "Real Bed",
-            cancellation_policy=json_data.get("cancellation_policy") or "flexible",
-            cleaning_fee=json_data.get("cleaning_fee") or "1",
-            city=json_data.get("city") or "NYC",
-            host_has_profile_pic=json_data.get("host_has_profile_pic") or "1",
-            host_identity_verified=json_data.get("host_identity_verified") or "1",
-            host_response_rate=safe_int(json_data.get("host_response_rate"), 100),
-            instant_bookable=json_data.get("instant_bookable") or "0",
-            latitude=safe_float(json_data.get("latitude"), 0.0),
-            longitude=safe_float(json_data.get("longitude"), 0.0),
-            number_of_reviews=safe_int(json_data.get("number_of_reviews"), 0),
-            review_scores_rating=safe_int(json_data.get("review_scores_rating"), 90),
-            bedrooms=safe_int(json_data.get("bedrooms"), 1),
-            beds=safe_int(json_data.get("beds"), 1)
-        )
-
-        final_data = data.get_data_as_dataframe()
+        # Validate and normalise the request in one pass (invalid values fall back to defaults)
+        with timed_stage("normalise"):
+            final_data = normalise_record(json_data)
 
         # Make prediction
         predict_pipeline = PredictPipeline()
-        pred = predict_pipeline.predict(final_data)
+        log_price = predict_pipeline.predict_record(final_data)
         
         # Convert log_price to actual price
-        log_price = pred[0]
         actual_price = round(np.exp(log_price), 2)
         
         return jsonify({
@@ -87,48 +89,80 @@ def predict():
             "error": str(e)
         }), 500
 
+# Batch prediction endpoint: JSON list, {"records": [...]} or NDJSON
+@app.route("/predict/batch", methods=["POST"])
+def predict_batch():
+    try:
+        parse_errors = {}
+        with timed_stage("parse"):
+            if request.mimetype in ("application/x-ndjson", "application/jsonl"):
+                records = []
+                lines = [line for line in request.get_data(as_text=True).splitlines() if line.strip()]
+                for i, line in enumerate(lines):
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError as e:
+                        parse_errors[i] = f"Invalid JSON line: {e}"
+                        records.append(None)
+            else:
+                payload = request.get_json(silent=True)
+                records = payload.get("records") if isinstance(payload, dict) else payload
+
+        if not isinstance(records, list) or not records:
+            return jsonify({"success": False, "error": "Expected a non-empty list of records"}), 400
+        if len(records) > MAX_BATCH_RECORDS:
+            return jsonify({
+                "success": False,
+                "error": f"Batch too large: {len(records)} records (max {MAX_BATCH_RECORDS})"
+            }), 413
+
+        predict_pipeline = PredictPipeline()
+        log_prices, errors = predict_pipeline.predict_many(records)
+        errors.update(parse_errors)
+
+        # Convert log_price to actual price
+        prices = np.round(np.exp(log_prices), 2)
+        predictions = []
+        for i, price in enumerate(prices.tolist()):
+            if i in errors:
+                predictions.append({"index": i, "success": False, "error": errors[i]})
+            else:
+                predictions.append({"index": i, "success": True, "predicted_price": price})
+
+        return jsonify({
+            "success": True,
+            "count": len(records),
+            "failed": len(errors),
+            "predictions": predictions
+        })
+
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
 # Legacy form-based endpoint (kept for backward compatibility)
 @app.route("/form", methods=["GET", "POST"])
 def form():
     if request.method == "POST":
         try:
-            # Validate and convert form data to CustomData object
-            data = CustomData(
-                property_type=request.form.get("property_type"),
-                room_type=request.form.get("room_type"),
-                amenities=int(request.form.get("amenities", 0)),
-                accommodates=int(request.form.get("accommodates", 1)),
-                bathrooms=float(request.form.get("bathrooms", 0)),
-                bed_type=request.form.get("bed_type"),
-                cancellation_policy=request.form.get("cancellation_policy"),
-                cleaning_fee=request.form.get("cleaning_fee"),
-                city=request.form.get("city"),
-                host_has_profile_pic=request.form.get("host_has_profile_pic"),
-                host_identity_verified=request.form.get("host_identity_verified"),
-                host_response_rate=int(request.form.get("host_response_rate", 0)),
-                instant_bookable=request.form.get("instant_bookable"),
-                latitude=float(request.form.get("latitude", 0.0)),
-                longitude=float(request.form.get("longitude", 0.0)),
-                number_of_reviews=int(request.form.get("number_of_reviews", 0)),
-                review_scores_rating=int(request.form.get("review_scores_rating", 0)),
-                bedrooms=int(request.form.get("bedrooms", 0)),
-                beds=int(request.form.get("beds", 0))
-            )
-
-            final_data = data.get_data_as_dataframe()
+            # Validate and normalise form data (invalid values raise and render the error page)
+            with timed_stage("normalise"):
+                final_data = normalise_record(request.form, strict=True)
 
             # Make prediction
             predict_pipeline = PredictPipeline()
-            pred = predict_pipeline.predict(final_data)
+            log_price = predict_pipeline.predict_record(final_data)
             
             # Convert log_price to actual price
-            log_price = pred[0]
             actual_price = round(np.exp(log_price), 2)
             
             return render_template("index.html", result=f"${actual_price}")
 
         except Exception as e:
             # Handle exceptions gracefully
+            mark_failed()
             error_message = f"Error during prediction: {str(e)}"
             return render_template("error.html", error_message=error_message)
 
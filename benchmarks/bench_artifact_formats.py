@@ -0,0 +1,131 @@
+"""
+Round-trip check and timings for the split formats (AIRBNB_ARTIFACT_FORMAT).
+
+The source is sorted by city and ingested with streaming ingestion in small
+chunks, so consecutive chunks bring different category sets. Each format's
+train/test splits are read back with read_dataset and iter_dataset and compared
+with the CSV splits. The amenity vocabulary is fitted on each train split and
+both splits are encoded with it (AIRBNB_AMENITY_FEATURES), which must give the
+CSV result too: a multi-chunk Arrow column is what the transform stage sees
+with streaming ingestion. Reported per format: ingestion, full read and chunked
+read time and file size. Exits non-zero when a format fails to write or reads
+back different rows or amenity matrices.
+
+    python benchmarks/bench_artifact_formats.py
+    python benchmarks/bench_artifact_formats.py --rows 500000 --chunk-size 10000
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import PROJECT_ROOT, save_results
+
+FORMATS = ['csv', 'parquet', 'arrow']
+SORT_COLUMN = 'city'
+
+
+def ingest(source_path, workdir, file_format, chunk_size):
+    from src.Airbnb.components.Data_ingestion import DataIngestion, DataIngestionConfig
+    ingestion = DataIngestion()
+    ingestion.ingestion_config = DataIngestionConfig(
+        source_data_path=source_path,
+        raw_data_path=os.path.join(workdir, 'raw_data.csv'),
+        train_data_path=os.path.join(workdir, file_format, 'train_data.csv'),
+        test_data_path=os.path.join(workdir, file_format, 'test_data.csv'),
+        streaming=True, chunk_size=chunk_size, artifact_format=file_format)
+    return ingestion.initiate_data_ingestion()
+
+
+def comparable(df):
+    # Categories and parsed host_response_rate differ in dtype between formats, not in value
+    import pandas as pd
+    df = df.reset_index(drop=True)
+    if 'host_response_rate' in df.columns and not pd.api.types.is_numeric_dtype(df['host_response_rate']):
+        df['host_response_rate'] = pd.to_numeric(df['host_response_rate'].astype('string').str.rstrip('%'),
+                                                 errors='coerce')
+    return df.astype('string').fillna('')
+
+
+def amenity_features(splits):
+    # Raw read_dataset splits, so Arrow/Parquet columns keep their pyarrow-backed chunks
+    from src.Airbnb.pipelines.Amenities_encoder import AmenitiesEncoder
+    encoder = AmenitiesEncoder.fit([splits[0]['amenities']], min_count=1)
+    return encoder.vocabulary, [encoder.transform(split['amenities']) for split in splits]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', default=os.path.join(PROJECT_ROOT, 'Notebook_Experiments', 'Data', 'Airbnb_Data.csv'))
+    parser.add_argument('--rows', type=int, default=0, help='resample the source to this many rows (0: as is)')
+    parser.add_argument('--chunk-size', type=int, default=100, help='ingestion chunk size')
+    parser.add_argument('--output', help='result JSON path (default: benchmarks/results/artifact_formats_<time>.json)')
+    args = parser.parse_args()
+
+    import pandas as pd
+    from src.Airbnb.utils.utils import read_dataset, iter_dataset
+
+    results = {'meta': {'rows': args.rows, 'chunk_size': args.chunk_size}}
+    failures = []
+    with tempfile.TemporaryDirectory(prefix='bench_formats_') as workdir:
+        source = pd.read_csv(args.source)
+        if args.rows:
+            source = source.sample(args.rows, replace=True, random_state=0)
+            source['id'] = range(len(source))
+        source_path = os.path.join(workdir, 'source.csv')
+        source.sort_values(SORT_COLUMN, kind='stable').to_csv(source_path, index=False)
+
+        expected = None
+        for file_format in FORMATS:
+            try:
+                start = time.perf_counter()
+                paths = ingest(source_path, workdir, file_format, args.chunk_size)
+                ingested = time.perf_counter()
+                splits = [read_dataset(path) for path in paths]
+                read = time.perf_counter()
+                chunked_rows = sum(len(chunk) for path in paths for chunk in iter_dataset(path, chunk_size=1000))
+                iterated = time.perf_counter()
+                vocabulary, amenities = amenity_features(splits)
+            except Exception as e:
+                failures.append(f"{file_format}: {e}")
+                print(f"{file_format:8s} failed: {e}")
+                continue
+
+            splits = [comparable(split) for split in splits]
+            if expected is None:
+                expected = splits
+                expected_amenities = vocabulary, amenities
+            matches = all(split.equals(reference[split.columns]) for split, reference in zip(splits, expected))
+            amenities_match = (vocabulary == expected_amenities[0]
+                               and all((matrix != reference).nnz == 0
+                                       for matrix, reference in zip(amenities, expected_amenities[1])))
+            rows = sum(len(split) for split in splits)
+            if not matches or chunked_rows != rows:
+                failures.append(f"{file_format}: read back different rows than csv")
+            if not amenities_match:
+                failures.append(f"{file_format}: amenity features differ from csv")
+            results[file_format] = {
+                'rows': rows, 'matches_csv': matches, 'amenities_match_csv': amenities_match,
+                'chunked_rows': chunked_rows,
+                'size_mb': round(sum(os.path.getsize(path) for path in paths) / 2 ** 20, 2),
+                'ingest_seconds': round(ingested - start, 3), 'read_seconds': round(read - ingested, 3),
+                'chunked_read_seconds': round(iterated - read, 3)
+            }
+            run = results[file_format]
+            print(f"{file_format:8s} rows {rows:>9}  size {run['size_mb']:8.2f} MB  ingest {run['ingest_seconds']:7.2f}s  "
+                  f"read {run['read_seconds']:6.2f}s  chunked read {run['chunked_read_seconds']:6.2f}s  "
+                  f"{'matches csv' if matches and amenities_match else 'DIFFERS from csv'}")
+
+    path = save_results('artifact_formats', results, args.output)
+    print(f"Results written to {path}")
+    if failures:
+        print('Round-trip failures:\n  ' + '\n  '.join(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Cold-start benchmark for api/index.py, the serverless entry point.
+
+Each run starts a fresh interpreter that imports api/index.py and serves one
+JSON POST through the Flask test client, so every run pays the imports,
+artifact loads and first prediction of a new instance. Modes:
+
+    compact  Artifacts/compact_model (default deployment)
+    pickle   Model.pkl / Preprocessor.pkl (AIRBNB_COMPACT_ARTIFACTS=false)
+    warmup   compact artifacts loaded during init (AIRBNB_WARMUP=true)
+
+    python benchmarks/bench_cold_start.py --runs 10
+    python benchmarks/bench_cold_start.py --compare benchmarks/results/baseline.json
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import PROJECT_ROOT, summarize, save_results, compare_results, report_regressions
+
+MODES = {
+    'compact': {'AIRBNB_COMPACT_ARTIFACTS': 'true', 'AIRBNB_WARMUP': 'false'},
+    'pickle': {'AIRBNB_COMPACT_ARTIFACTS': 'false', 'AIRBNB_WARMUP': 'false'},
+    'warmup': {'AIRBNB_COMPACT_ARTIFACTS': 'true', 'AIRBNB_WARMUP': 'true'}
+}
+
+# Runs in the child interpreter; prints one JSON line with its timings
+CHILD = r"""
+import os, sys, json, time, importlib.util
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location('api_index', os.path.join(sys.argv[1], 'api', 'index.py'))
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+imported = time.perf_counter()
+response = module.app.test_client().post('/', json=json.loads(sys.argv[2]))
+done = time.perf_counter()
+print(json.dumps({'import': imported - start, 'first_request': done - imported, 'total': done - start,
+                  'status': response.status_code, 'artifact_format': module.artifact_format,
+                  'loaded': sorted(m for m in ('pandas', 'sklearn', 'catboost') if m in sys.modules)}))
+"""
+
+PAYLOAD = {'property_type': 'Apartment', 'room_type': 'Entire home/apt', 'accommodates': 4,
+           'bathrooms': 2, 'bedrooms': 2, 'beds': 2, 'city': 'Mumbai', 'cancellation_policy': 'strict'}
+
+
+def cold_start(mode):
+    env = dict(os.environ, **MODES[mode], AIRBNB_STARTUP_PROFILE='false', PYTHONWARNINGS='ignore')
+    output = subprocess.run([sys.executable, '-c', CHILD, PROJECT_ROOT, json.dumps(PAYLOAD)], env=env,
+                            cwd=PROJECT_ROOT, capture_output=True, text=True, check=True).stdout
+    # index.py prints load messages; the timings are the last line
+    run = json.loads(output.strip().splitlines()[-1])
+    if run['status'] != 200:
+        raise RuntimeError(f"{mode}: first request returned {run['status']}")
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='fresh processes per mode')
+    parser.add_argument('--modes', nargs='+', choices=sorted(MODES), default=list(MODES))
+    parser.add_argument('--output', help='result JSON path (default: benchmarks/results/cold_start_<time>.json)')
+    parser.add_argument('--compare', help='baseline result JSON to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown against the baseline')
+    args = parser.parse_args()
+
+    results = {'meta': {'runs': args.runs}}
+    for mode in args.modes:
+        runs = [cold_start(mode) for _ in range(args.runs)]
+        results[mode] = {stage: summarize([run[stage] for run in runs])
+                         for stage in ('import', 'first_request', 'total')}
+        results['meta'][mode] = {'artifact_format': runs[-1]['artifact_format'], 'loaded': runs[-1]['loaded']}
+        print(f"{mode:8s} import p50 {results[mode]['import']['p50_ms']:8.1f} ms  "
+              f"first request p50 {results[mode]['first_request']['p50_ms']:8.1f} ms  "
+              f"total p50 {results[mode]['total']['p50_ms']:8.1f} ms  "
+              f"({runs[-1]['artifact_format']}, loaded: {', '.join(runs[-1]['loaded']) or 'none'})")
+
+    path = save_results('cold_start', results, args.output)
+    print(f"Results written to {path}")
+
+    if args.compare:
+        sys.exit(report_regressions(compare_results(results, args.compare, args.tolerance), args.tolerance))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""
+Load-test and latency benchmark for the prediction endpoints.
+
+Drives app.py /predict and /form and api/index.py / with payloads drawn from the
+same distributions as train_indian_model.generate_synthetic_data, either in
+process through Flask's test client or against running servers (--url/--api-url).
+Reports throughput and p50/p95/p99 latency per endpoint, plus per-stage timings
+(parse, normalise, transform, predict, serialise) measured in process, and
+stores everything as JSON.
+
+    python benchmarks/bench_endpoints.py --requests 2000 --concurrency 4
+    python benchmarks/bench_endpoints.py --compare benchmarks/results/baseline.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import PROJECT_ROOT, summarize, save_results, compare_results, report_regressions
+
+
+def make_payloads(n, seed=42):
+    import train_indian_model
+    frame = train_indian_model.generate_synthetic_data(n, seed).drop(columns=['log_price'])
+    return json.loads(frame.to_json(orient='records'))
+
+
+class InProcessClient:
+    """One Flask test client per thread."""
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def post(self, path, json_body=None, form=None):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        response = client.post(path, json=json_body, data=form)
+        return response.status_code
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def post(self, path, json_body=None, form=None):
+        if json_body is not None:
+            data, content_type = json.dumps(json_body).encode(), 'application/json'
+        else:
+            data, content_type = urllib.parse.urlencode(form).encode(), 'application/x-www-form-urlencoded'
+        request = urllib.request.Request(self.base_url + path, data=data, headers={'Content-Type': content_type})
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+def run_endpoint(client, path, payloads, concurrency, as_form=False):
+    def call(payload):
+        start = time.perf_counter()
+        if as_form:
+            status = client.post(path, form={key: str(value) for key, value in payload.items()})
+        else:
+            status = client.post(path, json_body=payload)
+        return time.perf_counter() - start, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(call, payloads))
+    wall = time.perf_counter() - started
+
+    summary = summarize([seconds for seconds, _ in outcomes], wall)
+    summary['errors'] = sum(1 for _, status in outcomes if status >= 400)
+    return summary
+
+
+def run_stages(payloads):
+    """Time each stage of a /predict request in process, on the shared registry artifacts."""
+    import numpy as np
+    import pandas as pd
+    from src.Airbnb.pipelines.Model_registry import get_registry
+    from src.Airbnb.pipelines.Feature_schema import FEATURE_COLUMNS, normalise_record
+
+    artifacts = get_registry().get()
+    timings = {name: [] for name in ('parse', 'normalise', 'transform', 'transform_dataframe', 'predict', 'serialise')}
+    for payload in payloads:
+        body = json.dumps(payload)
+
+        t0 = time.perf_counter()
+        data = json.loads(body)
+        t1 = time.perf_counter()
+        record = normalise_record(data)
+        t2 = time.perf_counter()
+        if artifacts.encoder is not None:
+            features = artifacts.encoder.encode(record)
+        else:
+            features = artifacts.preprocessor.transform(pd.DataFrame([record], columns=FEATURE_COLUMNS))
+        t3 = time.perf_counter()
+        log_price = artifacts.model.predict(features)[0]
+        t4 = time.perf_counter()
+        price = round(float(np.exp(log_price)), 2)
+        json.dumps({"success": True, "predicted_price": price, "formatted_price": f"${price}"})
+        t5 = time.perf_counter()
+        artifacts.preprocessor.transform(pd.DataFrame([record], columns=FEATURE_COLUMNS))
+        t6 = time.perf_counter()
+
+        timings['parse'].append(t1 - t0)
+        timings['normalise'].append(t2 - t1)
+        timings['transform'].append(t3 - t2)
+        timings['predict'].append(t4 - t3)
+        timings['serialise'].append(t5 - t4)
+        timings['transform_dataframe'].append(t6 - t5)
+
+    stages = {name: summarize(values) for name, values in timings.items()}
+    return stages, artifacts.version
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=1000, help='requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--url', help='base URL of a running app.py server (default: in-process test client)')
+    parser.add_argument('--api-url', help='base URL of a running api/index.py server (default: in-process)')
+    parser.add_argument('--with-cache', action='store_true', help='keep the prediction cache enabled')
+    parser.add_argument('--output', help='result JSON path (default: benchmarks/results/endpoints_<time>.json)')
+    parser.add_argument('--compare', help='baseline result JSON to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown against the baseline')
+    args = parser.parse_args()
+
+    if not args.with_cache:
+        os.environ['AIRBNB_CACHE_SIZE'] = '0'
+    os.chdir(PROJECT_ROOT)
+
+    payloads = make_payloads(args.requests + args.warmup)
+    warmup, payloads = payloads[:args.warmup], payloads[args.warmup:]
+
+    if args.url:
+        app_client = HttpClient(args.url)
+    else:
+        from app import app
+        app_client = InProcessClient(app)
+    if args.api_url:
+        api_client = HttpClient(args.api_url)
+    else:
+        sys.path.insert(0, os.path.join(PROJECT_ROOT, 'api'))
+        import index
+        api_client = InProcessClient(index.app)
+
+    endpoints = {
+        'app_predict': (app_client, '/predict', False),
+        'app_form': (app_client, '/form', True),
+        'api_index': (api_client, '/', False)
+    }
+    results = {'endpoints': {}}
+    for name, (client, path, as_form) in endpoints.items():
+        run_endpoint(client, path, warmup, 1, as_form)
+        results['endpoints'][name] = run_endpoint(client, path, payloads, args.concurrency, as_form)
+
+    results['stages'], model_version = run_stages(payloads)
+    results['meta'] = {'requests': args.requests, 'concurrency': args.concurrency, 'model_version': model_version}
+
+    for section in ('endpoints', 'stages'):
+        print(f"\n{section}:")
+        for name, summary in results[section].items():
+            extra = f"  {summary['throughput_rps']:9.1f} req/s  errors {summary['errors']}" if 'throughput_rps' in summary else ''
+            print(f"  {name:20s} p50 {summary['p50_ms']:8.3f} ms  p95 {summary['p95_ms']:8.3f} ms  "
+                  f"p99 {summary['p99_ms']:8.3f} ms{extra}")
+
+    path = save_results('endpoints', results, args.output)
+    print(f"\nResults written to {path}")
+
+    if args.compare:
+        sys.exit(report_regressions(compare_results(results, args.compare, args.tolerance), args.tolerance))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark the vectorized feature cleaners against the row-wise .apply path
+they replaced in DataTransformation.initialize_data_transformation.
+
+    python benchmarks/bench_feature_cleaning.py --rows 1000000
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.Airbnb.components.Feature_cleaning import clean_response_rate, count_amenities
+
+
+# Previous row-wise implementations, kept here as the reference
+def convert_response_rate(x):
+    if pd.isna(x) or str(x).lower() == 'nan' or str(x) == '':
+        return np.nan
+    try:
+        return float(str(x).replace('%', ''))
+    except:
+        return np.nan
+
+
+def count_amenities_apply(x):
+    if pd.isna(x) or str(x) == '{}' or str(x) == '':
+        return 0
+    return len(str(x).split(','))
+
+
+def make_columns(n_rows, seed=42):
+    rng = np.random.default_rng(seed)
+    rates = np.char.add(rng.integers(0, 101, n_rows).astype(str), '%').astype(object)
+    rates[rng.random(n_rows) < 0.25] = np.nan
+    names = np.array(['TV', '"Wireless Internet"', 'Kitchen', 'Heating', 'Washer', 'Dryer', 'Essentials'])
+    counts = rng.integers(0, len(names) + 1, n_rows)
+    amenities = np.array(['{' + ','.join(names[:k]) + '}' for k in counts], dtype=object)
+    amenities[rng.random(n_rows) < 0.02] = np.nan
+    return pd.Series(rates), pd.Series(amenities)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    rates, amenities = make_columns(args.rows)
+
+    old_rates, old_rates_s = timed(lambda s: s.apply(convert_response_rate), rates)
+    new_rates, new_rates_s = timed(clean_response_rate, rates)
+    old_amen, old_amen_s = timed(lambda s: s.apply(count_amenities_apply), amenities)
+    new_amen, new_amen_s = timed(count_amenities, amenities)
+
+    assert np.array_equal(old_rates.to_numpy(dtype=float), new_rates.to_numpy(dtype=float), equal_nan=True)
+    assert np.array_equal(old_amen.to_numpy(), new_amen.to_numpy())
+
+    print(f"rows: {args.rows}")
+    print(f"host_response_rate  apply {old_rates_s:8.3f}s  vectorized {new_rates_s:8.3f}s  speedup {old_rates_s / new_rates_s:6.1f}x")
+    print(f"amenities           apply {old_amen_s:8.3f}s  vectorized {new_amen_s:8.3f}s  speedup {old_amen_s / new_amen_s:6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
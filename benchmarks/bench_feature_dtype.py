@@ -0,0 +1,121 @@
+"""
+Accuracy and memory benchmark for the feature dtype policy (AIRBNB_FEATURE_DTYPE).
+
+Each dtype runs in a fresh interpreter (in a scratch directory, so Artifacts/
+is not touched) that builds the train/test matrices with DataTransformation,
+trains CatBoost on them and scores the test split. Reported per dtype: matrix
+bytes, peak RSS after the transform and after training, transform/fit time and
+test R2. Exits non-zero when the R2 of the dtypes differs by more than
+--tolerance. Needs the splits written by the ingestion stage. In memory the
+peak is dominated by the pandas DataFrame of the split, so the saving shows
+most with --out-of-core.
+
+    python benchmarks/bench_feature_dtype.py --rows 500000
+    python benchmarks/bench_feature_dtype.py --rows 500000 --out-of-core
+"""
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import PROJECT_ROOT, save_results
+
+DTYPES = ['float64', 'float32']
+
+# Runs in the child interpreter; prints one JSON line with its measurements
+CHILD = r"""
+import os, sys, json, time, resource, warnings
+warnings.filterwarnings('ignore')
+sys.path.insert(0, sys.argv[1])
+train_path, test_path, predictions_path, iterations = sys.argv[2], sys.argv[3], sys.argv[4], int(sys.argv[5])
+import numpy as np
+from catboost import CatBoostRegressor
+from sklearn.metrics import r2_score
+from src.Airbnb.components.Data_transformation import DataTransformation
+
+def peak_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+baseline = peak_mb()
+start = time.perf_counter()
+train_arr, test_arr = DataTransformation().initialize_data_transformation(train_path, test_path)
+transformed = time.perf_counter()
+transform_peak = peak_mb()
+model = CatBoostRegressor(iterations=iterations, random_seed=0, verbose=False, thread_count=-1)
+model.fit(train_arr[:, :-1], train_arr[:, -1])
+fitted = time.perf_counter()
+predictions = model.predict(test_arr[:, :-1])
+np.save(predictions_path, predictions)
+print(json.dumps({
+    'dtype': train_arr.dtype.name, 'rows': int(len(train_arr)),
+    'matrix_mb': round((train_arr.nbytes + test_arr.nbytes) / 2 ** 20, 2),
+    'baseline_rss_mb': round(baseline, 1), 'transform_peak_rss_mb': round(transform_peak, 1),
+    'train_peak_rss_mb': round(peak_mb(), 1),
+    'transform_seconds': round(transformed - start, 3), 'fit_seconds': round(fitted - transformed, 3),
+    'test_r2': float(r2_score(test_arr[:, -1], predictions))
+}))
+"""
+
+
+def run_dtype(dtype, train_path, test_path, predictions_path, iterations, workdir, out_of_core=False):
+    env = dict(os.environ, AIRBNB_FEATURE_DTYPE=dtype, AIRBNB_OUT_OF_CORE=str(out_of_core).lower(),
+               PYTHONWARNINGS='ignore')
+    output = subprocess.run([sys.executable, '-c', CHILD, PROJECT_ROOT, train_path, test_path, predictions_path,
+                             str(iterations)], env=env, cwd=workdir, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--train', default=os.path.join(PROJECT_ROOT, 'Artifacts', 'train_data.csv'))
+    parser.add_argument('--test', default=os.path.join(PROJECT_ROOT, 'Artifacts', 'test_data.csv'))
+    parser.add_argument('--rows', type=int, default=0, help='resample the train split to this many rows (0: as is)')
+    parser.add_argument('--iterations', type=int, default=300)
+    parser.add_argument('--out-of-core', action='store_true', help='build the matrices with AIRBNB_OUT_OF_CORE=true')
+    parser.add_argument('--tolerance', type=float, default=1e-3, help='allowed absolute test R2 difference')
+    parser.add_argument('--output', help='result JSON path (default: benchmarks/results/feature_dtype_<time>.json)')
+    args = parser.parse_args()
+
+    import numpy as np
+    with tempfile.TemporaryDirectory(prefix='bench_dtype_') as workdir:
+        train_path = os.path.abspath(args.train)
+        if args.rows:
+            import pandas as pd
+            train_path = os.path.join(workdir, 'train_data.csv')
+            pd.read_csv(args.train).sample(args.rows, replace=True, random_state=0).to_csv(train_path, index=False)
+
+        results = {'meta': {'rows': args.rows, 'iterations': args.iterations, 'out_of_core': args.out_of_core}}
+        predictions = {}
+        for dtype in DTYPES:
+            predictions_path = os.path.join(workdir, f'predictions_{dtype}.npy')
+            results[dtype] = run_dtype(dtype, train_path, os.path.abspath(args.test), predictions_path,
+                                       args.iterations, workdir, args.out_of_core)
+            predictions[dtype] = np.load(predictions_path)
+            run = results[dtype]
+            print(f"{dtype:8s} rows {run['rows']:>9}  matrices {run['matrix_mb']:9.1f} MB  "
+                  f"peak RSS transform {run['transform_peak_rss_mb']:8.1f} MB  train {run['train_peak_rss_mb']:8.1f} MB  "
+                  f"transform {run['transform_seconds']:7.2f}s  fit {run['fit_seconds']:7.2f}s  R2 {run['test_r2']:.6f}")
+
+    r2_change = abs(results['float32']['test_r2'] - results['float64']['test_r2'])
+    results['comparison'] = {
+        'r2_change': r2_change,
+        'max_prediction_change': float(np.max(np.abs(predictions['float32'] - predictions['float64']))),
+        'matrix_saving': round(1 - results['float32']['matrix_mb'] / results['float64']['matrix_mb'], 3)
+    }
+    print(f"R2 change {r2_change:.2e}, largest prediction change {results['comparison']['max_prediction_change']:.2e}, "
+          f"matrix memory saved {results['comparison']['matrix_saving']:.0%}")
+
+    path = save_results('feature_dtype', results, args.output)
+    print(f"Results written to {path}")
+    if r2_change > args.tolerance:
+        print(f"R2 changed by more than {args.tolerance}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Shared helpers for the benchmark scripts: latency summaries, result files and
+regression checks against a stored baseline.
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+import numpy as np
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RESULTS_DIR = os.path.join(PROJECT_ROOT, 'benchmarks', 'results')
+
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+
+def summarize(seconds, wall_seconds=None):
+    """p50/p95/p99/mean latency in milliseconds (and throughput when wall time is given)."""
+    ms = np.asarray(seconds, dtype=float) * 1000.0
+    if ms.size == 0:
+        return {'count': 0}
+    summary = {
+        'count': int(ms.size),
+        'mean_ms': round(float(ms.mean()), 4),
+        'p50_ms': round(float(np.percentile(ms, 50)), 4),
+        'p95_ms': round(float(np.percentile(ms, 95)), 4),
+        'p99_ms': round(float(np.percentile(ms, 99)), 4),
+        'max_ms': round(float(ms.max()), 4)
+    }
+    if wall_seconds:
+        summary['throughput_rps'] = round(ms.size / wall_seconds, 2)
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def save_results(name, results, output=None):
+    """Write results (plus run metadata) to JSON and return the path."""
+    results = dict(results)
+    results['meta'] = {
+        'benchmark': name,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        **results.get('meta', {})
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{name}_{time.strftime('%Y_%m_%d_%H_%M_%S')}.json")
+    with open(output, 'w') as file_obj:
+        json.dump(results, file_obj, indent=2)
+    return output
+
+
+def _metrics(results, prefix=''):
+    # Flatten {section: {name: {p95_ms: ..}}} into {"section.name.p95_ms": value}
+    flat = {}
+    for key, value in results.items():
+        if key == 'meta':
+            continue
+        if isinstance(value, dict):
+            flat.update(_metrics(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare_results(current, baseline_path, tolerance, keys=('p95_ms', 'p99_ms', 'seconds')):
+    """
+    Compare latency-like metrics with a baseline file. Returns the list of
+    regressions, i.e. metrics more than `tolerance` (fraction) slower.
+    """
+    with open(baseline_path) as file_obj:
+        baseline = _metrics(json.load(file_obj))
+    regressions = []
+    for name, value in _metrics(current).items():
+        if not name.endswith(keys) or name not in baseline or baseline[name] <= 0:
+            continue
+        change = (value - baseline[name]) / baseline[name]
+        if change > tolerance:
+            regressions.append((name, baseline[name], value, change))
+    return regressions
+
+
+def report_regressions(regressions, tolerance):
+    if not regressions:
+        print(f"No regressions beyond {tolerance:.0%} against the baseline")
+        return 0
+    print(f"Regressions beyond {tolerance:.0%} against the baseline:")
+    for name, before, after, change in regressions:
+        print(f"  {name}: {before} -> {after} (+{change:.0%})")
+    return 1
@@ -4,15 +4,119 @@ import numpy as np
 import pandas as pd
 from src.Airbnb.logger import logging
 from src.Airbnb.exception import customexception
+from src.Airbnb.utils.utils import DatasetWriter
 from sklearn.model_selection import train_test_split
 from dataclasses import dataclass
 from pathlib import Path
 
+# Explicit dtypes for the listing dump so chunks parse consistently
+INGESTION_DTYPES = {
+    'id': 'int64',
+    'log_price': 'float64',
+    'property_type': 'category',
+    'room_type': 'category',
+    'amenities': 'object',
+    'accommodates': 'Int64',
+    'bathrooms': 'float64',
+    'bed_type': 'category',
+    'cancellation_policy': 'category',
+    'cleaning_fee': 'object',
+    'city': 'category',
+    'description': 'object',
+    'first_review': 'object',
+    'host_has_profile_pic': 'category',
+    'host_identity_verified': 'category',
+    'host_response_rate': 'object',
+    'host_since': 'object',
+    'instant_bookable': 'category',
+    'last_review': 'object',
+    'latitude': 'float64',
+    'longitude': 'float64',
+    'name': 'object',
+    'neighbourhood': 'object',
+    'number_of_reviews': 'Int64',
+    'review_scores_rating': 'float64',
+    'thumbnail_url': 'object',
+    'zipcode': 'object',
+    'bedrooms': 'float64',
+    'beds': 'float64'
+}
+
+
 @dataclass
 class DataIngestionConfig:
+    source_data_path: str = os.path.join("Notebook_Experiments", "Data", "Airbnb_Data.csv")
     raw_data_path: str = os.path.join("Artifacts", "raw_data.csv")
     train_data_path: str = os.path.join("Artifacts", "train_data.csv")
     test_data_path: str = os.path.join("Artifacts", "test_data.csv")
+    test_size: float = 0.2
+    # Streaming mode reads the source in chunks and splits rows by a hash of 'id'
+    streaming: bool = os.environ.get("AIRBNB_STREAMING_INGESTION", "false").lower() == "true"
+    chunk_size: int = int(os.environ.get("AIRBNB_INGESTION_CHUNK_SIZE", "100000"))
+    # Format of the train/test splits: csv, parquet or arrow (Arrow IPC, memory-mapped on read)
+    artifact_format: str = os.environ.get("AIRBNB_ARTIFACT_FORMAT", "csv")
+    # Split by a hash of 'id' in memory too, so a listing stays on the same side as the data grows
+    # and an incremental run never tests on rows the saved model was trained on. false: the
+    # random train_test_split (such runs are never continued incrementally)
+    stable_split: bool = os.environ.get("AIRBNB_STABLE_SPLIT", "true").lower() == "true"
+
+    @property
+    def split_method(self):
+        """'id_hash' when rows are split by is_test_row, 'random' for train_test_split."""
+        return 'id_hash' if self.streaming or self.stable_split else 'random'
+
+    def __post_init__(self):
+        extensions = {'csv': '.csv', 'parquet': '.parquet', 'arrow': '.arrow'}
+        if self.artifact_format not in extensions:
+            raise ValueError(f"AIRBNB_ARTIFACT_FORMAT must be one of {', '.join(extensions)}, "
+                             f"got {self.artifact_format!r}")
+        if self.artifact_format != 'csv':
+            # Fail when the pipeline is set up rather than with an ImportError inside the ingest stage
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise ValueError(f"AIRBNB_ARTIFACT_FORMAT={self.artifact_format} needs pyarrow, which is not "
+                                 f"installed (pip install pyarrow, or use csv)")
+        extension = extensions[self.artifact_format]
+        self.train_data_path = os.path.splitext(self.train_data_path)[0] + extension
+        self.test_data_path = os.path.splitext(self.test_data_path)[0] + extension
+
+
+def is_test_row(ids, test_size):
+    """Deterministic train/test assignment from a hash of the listing id."""
+    hashes = pd.util.hash_pandas_object(ids.astype('int64'), index=False).to_numpy()
+    return (hashes % 10000) < int(round(test_size * 10000))
+
+
+def to_columnar(chunk):
+    """
+    Give a chunk the typed layout stored in Parquet/Arrow splits: categoricals as
+    dictionary columns and host_response_rate ("93%") already parsed to a float.
+    """
+    # Text columns become real strings so values parsed as bools ("True") are stored as text
+    chunk = chunk.astype({col: 'string' if dtype == 'object' else dtype
+                          for col, dtype in INGESTION_DTYPES.items() if col in chunk.columns})
+    if 'host_response_rate' in chunk.columns:
+        chunk['host_response_rate'] = pd.to_numeric(
+            chunk['host_response_rate'].astype('string').str.rstrip('%'), errors='coerce')
+    return chunk
+
+
+def columnar_schema(columns):
+    """Fixed Arrow schema so every appended chunk has identical column types."""
+    import pyarrow as pa
+    arrow_types = {
+        'int64': pa.int64(),
+        'Int64': pa.int64(),
+        'float64': pa.float64(),
+        'category': pa.dictionary(pa.int32(), pa.string()),
+        'object': pa.string()
+    }
+    fields = []
+    for col in columns:
+        dtype = 'float64' if col == 'host_response_rate' else INGESTION_DTYPES.get(col, 'object')
+        fields.append(pa.field(col, arrow_types[dtype]))
+    return pa.schema(fields)
 
 
 class DataIngestion:
@@ -20,10 +124,13 @@ class DataIngestion:
         self.ingestion_config = DataIngestionConfig()
 
     def initiate_data_ingestion(self):
+        if self.ingestion_config.streaming:
+            return self.initiate_streaming_data_ingestion()
+
         logging.info("Data ingestion started")
         try:
             # Use os.path.join for cross-platform compatibility
-            data_path = os.path.join("Notebook_Experiments", "Data", "Airbnb_Data.csv")
+            data_path = self.ingestion_config.source_data_path
             data = pd.read_csv(data_path)
             logging.info(f"Read the Data from {data_path}")
 
@@ -32,11 +139,15 @@ class DataIngestion:
             logging.info("Created the raw data file")
 
             logging.info("Splitting the data into train and test")
-            train_data, test_data = train_test_split(data, test_size=0.2, random_state=42)
+            if self.ingestion_config.stable_split:
+                test_mask = is_test_row(data['id'], self.ingestion_config.test_size)
+                train_data, test_data = data[~test_mask], data[test_mask]
+            else:
+                train_data, test_data = train_test_split(data, test_size=self.ingestion_config.test_size, random_state=42)
             logging.info("Data Splitting is done")
 
-            train_data.to_csv(self.ingestion_config.train_data_path, index=False)
-            test_data.to_csv(self.ingestion_config.test_data_path, index=False)
+            self.write_split(train_data, self.ingestion_config.train_data_path)
+            self.write_split(test_data, self.ingestion_config.test_data_path)
             logging.info("Created the train and test data files")
             logging.info("Data ingestion completed")
 
@@ -46,4 +157,47 @@ class DataIngestion:
             )
         except Exception as e:
             logging.info("Exception occurred while ingesting the data")
-            raise customexception(e, sys)
\ No newline at end of file
+            raise customexception(e, sys)
+
+    def write_split(self, df, file_path):
+        if self.ingestion_config.artifact_format == 'csv':
+            # DatasetWriter starts a new file instead of truncating one the stage cache may share
+            with DatasetWriter(file_path) as writer:
+                writer.write(df)
+            return
+        df = to_columnar(df)
+        with DatasetWriter(file_path, columnar_schema(df.columns)) as writer:
+            writer.write(df)
+
+    def initiate_streaming_data_ingestion(self):
+        logging.info("Streaming data ingestion started")
+        try:
+            data_path = self.ingestion_config.source_data_path
+            train_path = self.ingestion_config.train_data_path
+            test_path = self.ingestion_config.test_data_path
+
+            # The source is read once and never copied to raw_data.csv, so disk and
+            # memory only ever hold one chunk on top of the split outputs
+            header = pd.read_csv(data_path, nrows=0).columns
+            dtypes = {col: dtype for col, dtype in INGESTION_DTYPES.items() if col in header}
+            columnar = self.ingestion_config.artifact_format != 'csv'
+            schema = columnar_schema(header) if columnar else None
+
+            with DatasetWriter(train_path, schema) as train_writer, DatasetWriter(test_path, schema) as test_writer:
+                for chunk in pd.read_csv(data_path, dtype=dtypes, chunksize=self.ingestion_config.chunk_size):
+                    if columnar:
+                        chunk = to_columnar(chunk)
+                    test_mask = is_test_row(chunk['id'], self.ingestion_config.test_size)
+                    train_writer.write(chunk[~test_mask])
+                    test_writer.write(chunk[test_mask])
+                    logging.info(f"Ingested chunk: {train_writer.rows} train rows, {test_writer.rows} test rows so far")
+
+            logging.info(f"Streaming data ingestion completed: {train_writer.rows} train rows, {test_writer.rows} test rows")
+
+            return (
+                train_path,
+                test_path
+            )
+        except Exception as e:
+            logging.info("Exception occurred while streaming the data")
+            raise customexception(e, sys)
@@ -12,11 +12,31 @@ from sklearn.impute import SimpleImputer
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import OrdinalEncoder, StandardScaler
 
-from src.Airbnb.utils.utils import save_object
+from src.Airbnb.utils.utils import save_object, load_object, read_dataset, iter_dataset
+from src.Airbnb.components.Feature_cleaning import clean_listing_features
+from src.Airbnb.components.Streaming_preprocessing import fit_preprocessor, transform_to_matrix, iter_clean_chunks
+from src.Airbnb.pipelines.Feature_schema import FEATURE_DTYPE
+from src.Airbnb.pipelines.Geo_index import GeoIndex, GeoIndexConfig
+from src.Airbnb.pipelines.Amenities_encoder import AmenitiesEncoder, AmenitiesConfig
+
+NUMERICAL_COLS = ['amenities', 'accommodates', 'bathrooms', 'latitude', 'longitude',
+                  'host_response_rate', 'number_of_reviews', 'review_scores_rating', 'bedrooms', 'beds']
+CATEGORICAL_COLS = ['property_type', 'room_type', 'bed_type', 'cancellation_policy',
+                    'cleaning_fee', 'city', 'host_has_profile_pic', 'host_identity_verified', 'instant_bookable']
+TARGET_COLUMN = 'log_price'
+GEO_COLUMNS = ['latitude', 'longitude', TARGET_COLUMN]
+
 
 @dataclass
 class DataTransformationConfig:
     preprocessor_obj_file_path = os.path.join('Artifacts', 'Preprocessor.pkl')
+    # dtype of the train/test matrices (AIRBNB_FEATURE_DTYPE)
+    feature_dtype = FEATURE_DTYPE
+    # Fit and transform chunk by chunk into memory-mapped matrices instead of in memory
+    out_of_core = os.environ.get('AIRBNB_OUT_OF_CORE', 'false').lower() == 'true'
+    chunk_size = int(os.environ.get('AIRBNB_TRANSFORM_CHUNK_SIZE', '100000'))
+    train_matrix_file_path = os.path.join('Artifacts', 'train_matrix.npy')
+    test_matrix_file_path = os.path.join('Artifacts', 'test_matrix.npy')
 
 
 class DataTransformation:
@@ -27,10 +47,8 @@ class DataTransformation:
         try:
             logging.info('Data Transformation initiated')
 
-            numerical_cols = ['amenities', 'accommodates', 'bathrooms', 'latitude', 'longitude', 
-                            'host_response_rate', 'number_of_reviews', 'review_scores_rating', 'bedrooms', 'beds']
-            categorical_cols = ['property_type', 'room_type', 'bed_type', 'cancellation_policy', 
-                              'cleaning_fee', 'city', 'host_has_profile_pic', 'host_identity_verified', 'instant_bookable']
+            numerical_cols = NUMERICAL_COLS
+            categorical_cols = CATEGORICAL_COLS
 
             # Define categories for ordinal encoding - order matters!
             property_type_cat = ['Apartment', 'House', 'Condominium', 'Townhouse', 'Loft', 'Other', 
@@ -92,75 +110,121 @@ class DataTransformation:
             logging.info("Exception occurred in get_data_transformation")
             raise customexception(e, sys)
 
-    def initialize_data_transformation(self, train_path, test_path):
+    def initialize_data_transformation(self, train_path, test_path, reuse_preprocessor=False):
+        if self.data_transformation_config.out_of_core:
+            return self.initialize_out_of_core_transformation(train_path, test_path, reuse_preprocessor)
         try:
-            train_df = pd.read_csv(train_path)
-            test_df = pd.read_csv(test_path)
+            # Only the model inputs and the target are loaded; Parquet/Arrow splits keep their dtypes
+            columns = NUMERICAL_COLS + CATEGORICAL_COLS + [TARGET_COLUMN]
+            train_df = read_dataset(train_path, columns=columns)
+            test_df = read_dataset(test_path, columns=columns)
 
             logging.info("Read train and test data complete")
             logging.info(f'Train Dataframe Head : \n{train_df.head().to_string()}')
             logging.info(f'Test Dataframe Head : \n{test_df.head().to_string()}')
 
-            preprocessing_obj = self.get_data_transformation()
-
-            # Convert host_response_rate - handle NaN values properly
-            def convert_response_rate(x):
-                if pd.isna(x) or str(x).lower() == 'nan' or str(x) == '':
-                    return np.nan
-                try:
-                    return float(str(x).replace('%', ''))
-                except:
-                    return np.nan
-
-            train_df['host_response_rate'] = train_df['host_response_rate'].apply(convert_response_rate)
-            test_df['host_response_rate'] = test_df['host_response_rate'].apply(convert_response_rate)
+            # Vectorized cleaners shared with the serving normaliser
+            train_df = clean_listing_features(train_df)
+            test_df = clean_listing_features(test_df)
 
-            logging.info("Host Response Rate converted to numeric")
+            logging.info("Host Response Rate converted to numeric, amenities counted")
 
-            target_column_name = 'log_price'
+            target_column_name = TARGET_COLUMN
             drop_columns = [target_column_name, 'id', 'name', 'description', 'first_review', 
                           'host_since', 'last_review', 'neighbourhood', 'thumbnail_url', 'zipcode']
 
-            # Handle amenities column - count number of amenities
-            def count_amenities(x):
-                if pd.isna(x) or str(x) == '{}' or str(x) == '':
-                    return 0
-                return len(str(x).split(','))
-
-            train_df['amenities'] = train_df['amenities'].apply(count_amenities)
-            test_df['amenities'] = test_df['amenities'].apply(count_amenities)
-
-            logging.info("Amenities column processed")
-
-            # Convert cleaning_fee to string format expected by encoder
-            train_df['cleaning_fee'] = train_df['cleaning_fee'].astype(str)
-            test_df['cleaning_fee'] = test_df['cleaning_fee'].astype(str)
-
             # Drop columns that aren't needed
-            input_feature_train_df = train_df.drop(columns=drop_columns, axis=1, errors='ignore')
+            input_feature_train_df = train_df.drop(columns=drop_columns, errors='ignore')
             target_feature_train_df = train_df[target_column_name]
 
-            input_feature_test_df = test_df.drop(columns=drop_columns, axis=1, errors='ignore')
+            input_feature_test_df = test_df.drop(columns=drop_columns, errors='ignore')
             target_feature_test_df = test_df[target_column_name]
 
             logging.info(f'Input Feature Train Dataframe columns: {input_feature_train_df.columns.tolist()}')
             logging.info(f'Input Feature Train Dataframe dtypes:\n{input_feature_train_df.dtypes}')
 
-            # Fit and transform
-            input_feature_train_arr = preprocessing_obj.fit_transform(input_feature_train_df)
-            input_feature_test_arr = preprocessing_obj.transform(input_feature_test_df)
+            preprocessing_obj = None
+            if reuse_preprocessor:
+                # Incremental training needs the feature space the saved model was trained on
+                preprocessing_obj = self.load_preprocessor(input_feature_train_df.columns)
+
+            reused = preprocessing_obj is not None
+            if not reused:
+                preprocessing_obj = self.get_data_transformation()
+                preprocessing_obj.fit(input_feature_train_df)
 
             logging.info("Applying preprocessing object on training and testing datasets.")
 
-            train_arr = np.c_[input_feature_train_arr, np.array(target_feature_train_df)]
-            test_arr = np.c_[input_feature_test_arr, np.array(target_feature_test_df)]
+            train_geo = test_geo = None
+            geo_index = self.build_geo_index(lambda: train_df, reuse_index=reuse_preprocessor)
+            if geo_index is not None:
+                # A training listing is not its own neighbour
+                train_geo = geo_index.query_many(train_df['latitude'], train_df['longitude'],
+                                                 exclude=geo_index.row_ids(train_df['latitude'], train_df['longitude'],
+                                                                           train_df[TARGET_COLUMN]))
+                test_geo = geo_index.query_many(test_df['latitude'], test_df['longitude'])
+
+            dtype = self.data_transformation_config.feature_dtype
+            train_arr = transform_with_target(preprocessing_obj, input_feature_train_df, target_feature_train_df, dtype,
+                                              extra=train_geo)
+            test_arr = transform_with_target(preprocessing_obj, input_feature_test_df, target_feature_test_df, dtype,
+                                             extra=test_geo)
+
+            if not reused:
+                save_object(
+                    file_path=self.data_transformation_config.preprocessor_obj_file_path,
+                    obj=preprocessing_obj
+                )
+
+                logging.info("Preprocessing pickle file saved")
 
-            save_object(
-                file_path=self.data_transformation_config.preprocessor_obj_file_path,
-                obj=preprocessing_obj
+            return (
+                train_arr,
+                test_arr
             )
 
-            logging.info("Preprocessing pickle file saved")
+        except Exception as e:
+            logging.info("Exception occurred in initialize_data_transformation")
+            raise customexception(e, sys)
+
+    def initialize_out_of_core_transformation(self, train_path, test_path, reuse_preprocessor=False):
+        """
+        Out-of-core variant of initialize_data_transformation: peak memory is about one
+        chunk instead of several copies of the train split. Returns the train and test
+        matrices (features + target) as read-only memmaps.
+        """
+        try:
+            config = self.data_transformation_config
+            columns = NUMERICAL_COLS + CATEGORICAL_COLS + [TARGET_COLUMN]
+
+            preprocessing_obj = None
+            if reuse_preprocessor:
+                first_chunk = next(iter_clean_chunks(train_path, columns, chunk_size=1))
+                preprocessing_obj = self.load_preprocessor(first_chunk.columns.drop(TARGET_COLUMN))
+
+            reused = preprocessing_obj is not None
+            train_rows = None
+            if not reused:
+                preprocessing_obj, train_rows = fit_preprocessor(
+                    self.get_data_transformation(), train_path, columns, TARGET_COLUMN, config.chunk_size,
+                    work_dir=os.path.dirname(config.train_matrix_file_path)
+                )
+
+            # Coordinates and target only (24 bytes a row), so the index fits in memory
+            geo_index = self.build_geo_index(
+                lambda: pd.concat(iter_dataset(train_path, GEO_COLUMNS, config.chunk_size), ignore_index=True),
+                reuse_index=reuse_preprocessor)
+
+            train_arr = transform_to_matrix(preprocessing_obj, train_path, columns, TARGET_COLUMN,
+                                            config.train_matrix_file_path, config.chunk_size, rows=train_rows,
+                                            dtype=config.feature_dtype, geo_index=geo_index, exclude_self=True)
+            test_arr = transform_to_matrix(preprocessing_obj, test_path, columns, TARGET_COLUMN,
+                                           config.test_matrix_file_path, config.chunk_size, dtype=config.feature_dtype,
+                                           geo_index=geo_index)
+
+            if not reused:
+                save_object(file_path=config.preprocessor_obj_file_path, obj=preprocessing_obj)
+                logging.info("Preprocessing pickle file saved")
 
             return (
                 train_arr,
@@ -168,6 +232,100 @@ class DataTransformation:
             )
 
         except Exception as e:
-            logging.info("Exception occurred in initialize_data_transformation")
+            logging.info("Exception occurred in initialize_out_of_core_transformation")
+            raise customexception(e, sys)
+
+    def initialize_amenities_transformation(self, train_path, test_path, reuse_vocabulary=False):
+        """
+        Bag-of-amenities CSR matrices of the train and test splits, row-aligned with
+        the matrices of initialize_data_transformation. The amenity column is read
+        in chunks; the vocabulary is fitted on the train split and saved to
+        AmenitiesConfig.vocabulary_path, or reused from there with reuse_vocabulary.
+        """
+        try:
+            from scipy import sparse
+            config = self.data_transformation_config
+            amenities_config = AmenitiesConfig()
+
+            def amenity_chunks(file_path):
+                for chunk in iter_dataset(file_path, ['amenities'], config.chunk_size):
+                    yield chunk['amenities']
+
+            encoder = None
+            if reuse_vocabulary and os.path.exists(amenities_config.vocabulary_path):
+                # Incremental training keeps the amenity columns of the saved model
+                encoder = AmenitiesEncoder.load(amenities_config.vocabulary_path)
+            if encoder is None:
+                encoder = AmenitiesEncoder.fit(amenity_chunks(train_path), amenities_config.min_count,
+                                               amenities_config.max_size)
+                encoder.save(amenities_config.vocabulary_path)
+                logging.info(f"Amenity vocabulary of {encoder.size} amenities saved to {amenities_config.vocabulary_path}")
+
+            train_amenities, test_amenities = [
+                sparse.vstack([encoder.transform(column, config.feature_dtype) for column in amenity_chunks(path)],
+                              format='csr')
+                for path in (train_path, test_path)
+            ]
+            logging.info(f"Amenity matrices: train {train_amenities.shape} ({train_amenities.nnz} set), "
+                         f"test {test_amenities.shape} ({test_amenities.nnz} set)")
+            return (
+                train_amenities,
+                test_amenities
+            )
+
+        except Exception as e:
+            logging.info("Exception occurred in initialize_amenities_transformation")
             raise customexception(e, sys)
 
+    def build_geo_index(self, load_train_df, reuse_index=False):
+        """
+        With AIRBNB_GEO_FEATURES, index the train split's coordinates and log
+        prices (load_train_df() returns them) and save it to
+        GeoIndexConfig.index_dir; else None. With reuse_index the saved index is
+        kept if it has the configured k and radius, so an incremental run computes
+        the features its earlier trees were trained on.
+        """
+        geo_config = GeoIndexConfig()
+        if not geo_config.enabled:
+            return None
+        if reuse_index and os.path.exists(geo_config.index_dir):
+            geo_index = GeoIndex.load(geo_config.index_dir)
+            if (geo_index.k, geo_index.radius_km) == (geo_config.k, geo_config.radius_km):
+                logging.info(f"Reusing the geo index of {geo_index.meta['points']} listings in {geo_config.index_dir}")
+                return geo_index
+        train_df = load_train_df()
+        geo_index = GeoIndex.build(train_df['latitude'], train_df['longitude'], train_df[TARGET_COLUMN],
+                                   k=geo_config.k, radius_km=geo_config.radius_km)
+        geo_index.save(geo_config.index_dir)
+        logging.info(f"Geo index of {geo_index.meta['points']} listings saved to {geo_config.index_dir}")
+        return GeoIndex.load(geo_config.index_dir)
+
+    def load_preprocessor(self, columns):
+        """The saved preprocessor if it was fitted on these input columns, else None (refit)."""
+        file_path = self.data_transformation_config.preprocessor_obj_file_path
+        if not os.path.exists(file_path):
+            return None
+        preprocessor = load_object(file_path)
+        fitted_columns = list(getattr(preprocessor, 'feature_names_in_', []))
+        if sorted(fitted_columns) != sorted(columns):
+            logging.info("Saved preprocessor was fitted on different columns, refitting")
+            return None
+        logging.info("Reusing saved preprocessor")
+        return preprocessor
+
+
+def transform_with_target(preprocessor, features, target, dtype, block_rows=65536, extra=None):
+    """
+    preprocessor.transform(features) with the target appended as the last column,
+    written block by block into one preallocated array of dtype (no float64 copy
+    of the whole split). extra columns (the geo features) go before the target.
+    """
+    n_features = len(preprocessor.get_feature_names_out())
+    n_extra = 0 if extra is None else extra.shape[1]
+    matrix = np.empty((len(features), n_features + n_extra + 1), dtype=dtype)
+    for start in range(0, len(features), block_rows):
+        matrix[start:start + block_rows, :n_features] = preprocessor.transform(features.iloc[start:start + block_rows])
+    if n_extra:
+        matrix[:, n_features:-1] = extra
+    matrix[:, -1] = np.asarray(target)
+    return matrix
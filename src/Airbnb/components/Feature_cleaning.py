@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+# Vectorized cleaners for raw listing columns, shared by the training pipeline
+# (DataTransformation) and the serving normaliser so the two cannot drift.
+# String kernels run in pyarrow.compute when pyarrow is installed and fall back
+# to pandas .str methods otherwise; both give the same result.
+
+NUMBER_PATTERN = r'^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$'
+
+
+def _arrow_strings(column):
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError:
+        return None, None
+    return pa.array(column.astype('string'), type=pa.string(), from_pandas=True), pc
+
+
+def clean_response_rate(column):
+    """'93%' / '93' / 93 -> 93.0; missing or unparsable values -> NaN."""
+    if pd.api.types.is_numeric_dtype(column):
+        return column.astype(float)
+
+    strings, pc = _arrow_strings(column)
+    if strings is None:
+        text = column.astype('string').str.replace('%', '', regex=False).str.strip()
+        return pd.to_numeric(text, errors='coerce').astype(float)
+
+    text = pc.utf8_trim_whitespace(pc.replace_substring(strings, '%', ''))
+    valid = pc.match_substring_regex(text, NUMBER_PATTERN)
+    numbers = pc.cast(pc.if_else(valid, text, None), 'float64')
+    return pd.Series(numbers.to_numpy(zero_copy_only=False), index=column.index, dtype=float)
+
+
+def count_amenities(column):
+    """'{TV,Wifi,Kitchen}' -> 3; missing, '' and '{}' -> 0. Numeric columns are already counts."""
+    if pd.api.types.is_numeric_dtype(column):
+        return column
+
+    strings, pc = _arrow_strings(column)
+    if strings is None:
+        text = column.astype('string')
+        counts = text.str.count(',') + 1
+        empty = text.isna() | text.eq('') | text.eq('{}')
+        return counts.mask(empty, 0).astype('int64')
+
+    counts = pc.add(pc.count_substring(strings, ','), 1)
+    empty = pc.or_kleene(pc.is_null(strings), pc.is_in(strings, value_set=pc.cast(['', '{}'], 'string')))
+    counts = pc.if_else(pc.fill_null(empty, True), 0, counts)
+    return pd.Series(np.asarray(counts.to_numpy(zero_copy_only=False), dtype='int64'), index=column.index)
+
+
+def clean_listing_features(df):
+    """Apply the column cleaners in place on a raw listings DataFrame and return it."""
+    if 'host_response_rate' in df.columns:
+        df['host_response_rate'] = clean_response_rate(df['host_response_rate'])
+    if 'amenities' in df.columns:
+        df['amenities'] = count_amenities(df['amenities'])
+    if 'cleaning_fee' in df.columns:
+        # Encoder expects the string form ('True'/'False')
+        df['cleaning_fee'] = df['cleaning_fee'].astype(str)
+    return df
+
@@ -0,0 +1,233 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import numpy as np
+from dataclasses import dataclass
+from src.Airbnb.logger import logging
+from src.Airbnb.exception import customexception
+from src.Airbnb.pipelines.Compact_model import CompactModel, META_FILE, ENCODER_FILE, file_digest
+from src.Airbnb.pipelines.Feature_encoder import compile_encoder
+from src.Airbnb.pipelines.Feature_layout import LAYOUT_KEY
+
+
+@dataclass
+class ModelExportConfig:
+    compact_model_dir: str = os.path.join('Artifacts', 'compact_model')
+    # Largest absolute difference from model.predict accepted by the parity check
+    parity_tolerance: float = 1e-8
+    # Rows densified at a time when the check matrix is sparse (amenity columns)
+    parity_block_rows: int = 4096
+
+
+def compact_model_arrays(model):
+    """(meta, arrays) describing a fitted CatBoost / scikit-learn tree ensemble or linear model."""
+    name = type(model).__name__
+    if name == 'CatBoostRegressor':
+        return _catboost_arrays(model)
+    if name in ('GradientBoostingRegressor', 'RandomForestRegressor', 'ExtraTreesRegressor', 'DecisionTreeRegressor'):
+        return _sklearn_tree_arrays(model)
+    if name in ('LinearRegression', 'Ridge', 'Lasso', 'ElasticNet'):
+        coef = np.asarray(model.coef_, dtype=np.float64).ravel()
+        meta = {'kind': 'linear', 'n_features': len(coef), 'intercept': float(model.intercept_)}
+        return meta, {'coef': coef}
+    raise ValueError(f"Compact export does not support {name}")
+
+
+def export_compact_model(model, X_check, config: ModelExportConfig = None, preprocessor=None, source_files=None,
+                         feature_layout=None):
+    """
+    Write model to config.compact_model_dir as .npy arrays + meta.json, after
+    checking that CompactModel reproduces model.predict on X_check. Returns the
+    largest absolute difference; raises ValueError when it exceeds the tolerance.
+
+    With a preprocessor, its compiled FastFeatureEncoder is saved alongside as
+    encoder.json. feature_layout (Feature_layout.build_feature_layout) records
+    the model inputs, including the geo and amenity blocks appended after the
+    encoded ones, and is saved in meta.json. X_check may be a scipy sparse
+    matrix. source_files (the pickles the export was made from) are
+    recorded by digest so a loader can tell when the export is stale.
+    """
+    config = config or ModelExportConfig()
+    try:
+        meta, arrays = compact_model_arrays(model)
+        meta['source'] = type(model).__name__
+        meta['arrays'] = sorted(arrays)
+        meta['source_digests'] = {os.path.basename(path): file_digest(path) for path in source_files or []}
+        encoder = compile_encoder(preprocessor) if preprocessor is not None else None
+        if feature_layout is not None:
+            if feature_layout['n_features'] != meta['n_features']:
+                raise ValueError(f"Feature layout has {feature_layout['n_features']} columns, "
+                                 f"model expects {meta['n_features']}")
+            meta[LAYOUT_KEY] = feature_layout
+        encoded_features = feature_layout['blocks'][0]['width'] if feature_layout is not None else meta['n_features']
+        if encoder is not None and encoder.n_features != encoded_features:
+            raise ValueError(f"Encoder produces {encoder.n_features} features, model expects {encoded_features}")
+
+        compact = CompactModel(meta, arrays)
+        if hasattr(X_check, 'tocsr'):
+            expected = np.asarray(model.predict(X_check), dtype=np.float64).ravel()
+            X_check = X_check.tocsr()
+            block = config.parity_block_rows
+            actual = np.concatenate([compact.predict(np.asarray(X_check[start:start + block].toarray(), dtype=np.float64))
+                                     for start in range(0, X_check.shape[0], block)] or [np.empty(0)])
+        else:
+            X_check = np.asarray(X_check, dtype=np.float64)
+            expected = np.asarray(model.predict(X_check), dtype=np.float64).ravel()
+            actual = compact.predict(X_check)
+        max_diff = float(np.max(np.abs(expected - actual))) if X_check.shape[0] else 0.0
+        if not max_diff <= config.parity_tolerance:
+            raise ValueError(f"Compact model differs from {meta['source']}.predict by {max_diff}")
+        meta['parity'] = {'rows': int(X_check.shape[0]), 'max_abs_diff': max_diff}
+
+        # Build next to the target and swap it in, so readers never see a partial export
+        parent = os.path.dirname(os.path.abspath(config.compact_model_dir))
+        os.makedirs(parent, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix='.compact_model_', dir=parent)
+        for array_name, array in arrays.items():
+            np.save(os.path.join(staging, f'{array_name}.npy'), np.ascontiguousarray(array))
+        if encoder is not None:
+            encoder.save(os.path.join(staging, ENCODER_FILE))
+        with open(os.path.join(staging, META_FILE), 'w') as file_obj:
+            json.dump(meta, file_obj, indent=2)
+        if os.path.exists(config.compact_model_dir):
+            shutil.rmtree(config.compact_model_dir)
+        os.replace(staging, config.compact_model_dir)
+
+        size = sum(array.nbytes for array in arrays.values())
+        logging.info(f"Exported {meta['source']} as compact '{meta['kind']}' model to {config.compact_model_dir} "
+                     f"({size / 1024:.0f} KiB, parity max diff {max_diff:.2e} on {X_check.shape[0]} rows)")
+        return max_diff
+
+    except Exception as e:
+        logging.info('Exception occured during compact model export')
+        raise customexception(e, sys)
+
+
+def _catboost_arrays(model):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        json_path = os.path.join(tmp_dir, 'model.json')
+        model.save_model(json_path, format='json')
+        with open(json_path) as file_obj:
+            exported = json.load(file_obj)
+
+    float_features = exported['features_info'].get('float_features', [])
+    if exported['features_info'].get('categorical_features'):
+        raise ValueError("Compact export does not support CatBoost categorical features")
+    nan_true = {feature['feature_index']: feature.get('nan_value_treatment') == 'AsTrue' for feature in float_features}
+
+    trees = exported['oblivious_trees']
+    depth = max([len(tree['splits']) for tree in trees] + [1])
+    n_trees = len(trees)
+    split_feature = np.zeros((n_trees, depth), dtype=np.int32)
+    # Padding levels compare against +inf, so they always add a 0 bit
+    split_border = np.full((n_trees, depth), np.inf, dtype=np.float32)
+    nan_as_true = np.zeros((n_trees, depth), dtype=bool)
+    leaf_values = np.zeros((n_trees, 2 ** depth), dtype=np.float64)
+
+    for t, tree in enumerate(trees):
+        for level, split in enumerate(tree['splits']):
+            if split['split_type'] != 'FloatFeature':
+                raise ValueError(f"Compact export does not support {split['split_type']} splits")
+            split_feature[t, level] = split['float_feature_index']
+            split_border[t, level] = split['border']
+            nan_as_true[t, level] = nan_true.get(split['float_feature_index'], False)
+        values = tree['leaf_values']
+        leaf_values[t, :len(values)] = values
+
+    scale, bias = exported['scale_and_bias']
+    meta = {
+        'kind': 'oblivious',
+        'n_features': len(float_features),
+        'scale': float(scale),
+        'bias': float(bias[0]) if bias else 0.0,
+        'nan_as_true': bool(nan_as_true.any())
+    }
+    arrays = {'split_feature': split_feature, 'split_border': split_border, 'leaf_values': leaf_values}
+    if meta['nan_as_true']:
+        arrays['nan_as_true'] = nan_as_true
+    return meta, arrays
+
+
+def _sklearn_tree_arrays(model):
+    name = type(model).__name__
+    if name == 'GradientBoostingRegressor':
+        estimators = [stage[0] for stage in model.estimators_]
+        if model.init_ == 'zero':
+            init = 0.0
+        elif type(model.init_).__name__ == 'DummyRegressor':
+            init = float(np.ravel(model.init_.constant_)[0])
+        else:
+            raise ValueError("Compact export only supports GradientBoostingRegressor with the default init")
+        meta = {'aggregation': 'sum', 'init': init, 'learning_rate': float(model.learning_rate)}
+    elif name == 'DecisionTreeRegressor':
+        estimators = [model]
+        meta = {'aggregation': 'mean'}
+    else:
+        estimators = list(model.estimators_)
+        meta = {'aggregation': 'mean'}
+
+    if any(est.tree_.n_outputs != 1 for est in estimators):
+        raise ValueError("Compact export only supports single-output trees")
+
+    n_trees = len(estimators)
+    max_nodes = max(est.tree_.node_count for est in estimators)
+    feature = np.zeros((n_trees, max_nodes), dtype=np.int32)
+    threshold = np.zeros((n_trees, max_nodes), dtype=np.float64)
+    # Child ids are stored as positions in the flattened (trees x nodes) table
+    index_dtype = np.int32 if n_trees * max_nodes < 2 ** 31 else np.int64
+    left = np.zeros((n_trees, max_nodes), dtype=index_dtype)
+    right = np.zeros((n_trees, max_nodes), dtype=index_dtype)
+    value = np.zeros((n_trees, max_nodes), dtype=np.float64)
+
+    for t, est in enumerate(estimators):
+        tree = est.tree_
+        n = tree.node_count
+        nodes = np.arange(n)
+        offset = t * max_nodes
+        is_leaf = tree.children_left == -1
+        feature[t, :n] = np.where(is_leaf, 0, tree.feature)
+        threshold[t, :n] = np.where(is_leaf, np.inf, tree.threshold)
+        left[t, :n] = np.where(is_leaf, nodes, tree.children_left) + offset
+        right[t, :n] = np.where(is_leaf, nodes, tree.children_right) + offset
+        value[t, :n] = tree.value[:, 0, 0]
+
+    meta.update({
+        'kind': 'tree',
+        'n_features': int(estimators[0].n_features_in_),
+        'max_depth': int(max(est.tree_.max_depth for est in estimators))
+    })
+    return meta, {'feature': feature, 'threshold': threshold, 'left': left, 'right': right, 'value': value}
+
+
+if __name__ == "__main__":
+    # Export an existing Artifacts/Model.pkl, checking parity on the saved test split
+    import argparse
+    from src.Airbnb.utils.utils import load_object, read_dataset
+    from src.Airbnb.components.Feature_cleaning import clean_listing_features
+    from src.Airbnb.pipelines.Feature_layout import read_feature_layout
+
+    parser = argparse.ArgumentParser(description="Export a trained model for the NumPy evaluator")
+    parser.add_argument("--model", default=os.path.join('Artifacts', 'Model.pkl'))
+    parser.add_argument("--preprocessor", default=os.path.join('Artifacts', 'Preprocessor.pkl'))
+    parser.add_argument("--test-data", default=os.path.join('Artifacts', 'test_data.csv'))
+    parser.add_argument("--metrics", default=os.path.join('Artifacts', 'training_metrics.json'),
+                        help="training metrics holding the model's feature layout")
+    parser.add_argument("--output", default=ModelExportConfig.compact_model_dir)
+    args = parser.parse_args()
+
+    model = load_object(args.model)
+    preprocessor = load_object(args.preprocessor)
+    layout = read_feature_layout(args.metrics, args.model)
+    if os.path.exists(args.test_data) and (layout is None or len(layout['blocks']) == 1):
+        test_df = clean_listing_features(read_dataset(args.test_data, columns=list(preprocessor.feature_names_in_)))
+        X_check = preprocessor.transform(test_df)
+    else:
+        # No test split on disk (or it lacks the geo / amenity columns): check parity on random rows in the scaled feature space
+        n_features = compact_model_arrays(model)[0]['n_features']
+        X_check = np.random.default_rng(0).normal(size=(2000, n_features))
+    max_diff = export_compact_model(model, X_check, ModelExportConfig(compact_model_dir=args.output),
+                                    preprocessor=preprocessor, source_files=[args.model, args.preprocessor],
+                                    feature_layout=layout)
+    print(f"Exported {args.model} to {args.output} (parity max abs diff {max_diff:.2e} on {len(X_check)} rows)")
@@ -0,0 +1,174 @@
+import os
+import sys
+import time
+import pickle
+import hashlib
+import tempfile
+import numpy as np
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from src.Airbnb.logger import logging, pool_log_initializer
+from src.Airbnb.exception import customexception
+from sklearn.metrics import r2_score
+
+# Estimator parameters that control threading or logging only; they do not
+# change the fitted model, so they are left out of the cache key
+RUNTIME_PARAMS = ('n_jobs', 'thread_count', 'verbose', 'silent')
+THREAD_PARAMS = ('n_jobs', 'thread_count')
+
+
+@dataclass
+class ModelSelectionConfig:
+    # Total CPU cores shared by all candidate fits (workers x threads per worker)
+    cores: int = int(os.environ.get("AIRBNB_SELECTION_CORES", "0")) or (os.cpu_count() or 1)
+    # Fitted candidates and their scores, keyed on data fingerprint + hyperparameters
+    cache_dir: str = os.path.join('Artifacts', 'model_selection')
+    use_cache: bool = os.environ.get("AIRBNB_SELECTION_CACHE", "true").lower() == "true"
+
+
+@dataclass
+class CandidateResult:
+    name: str
+    score: float
+    fit_seconds: float
+    model: object
+    cached: bool = False
+
+
+class ModelSelection:
+    """
+    Fits a dict of candidate models in parallel and scores them with R² on the
+    test split.
+
+    The train/test matrices are written once to .npy files and memory-mapped by
+    every worker instead of being pickled to each process. Worker count and
+    per-model threads are sized so the whole bake-off stays within the core
+    budget. A fitted candidate is cached on disk, so a re-run with the same data
+    only fits the candidates whose hyperparameters changed.
+    """
+
+    def __init__(self, config: ModelSelectionConfig = None):
+        self.config = config or ModelSelectionConfig()
+
+    def run(self, models, X_train, y_train, X_test, y_test):
+        try:
+            arrays = {
+                'X_train': np.ascontiguousarray(X_train),
+                'y_train': np.ascontiguousarray(y_train),
+                'X_test': np.ascontiguousarray(X_test),
+                'y_test': np.ascontiguousarray(y_test)
+            }
+            fingerprint = data_fingerprint(arrays)
+
+            results, pending = {}, {}
+            for name, model in models.items():
+                key = candidate_key(model, fingerprint)
+                cached = self._load_cached(key)
+                if cached is not None:
+                    logging.info(f'Model selection: {name} loaded from cache (R2 {cached.score:.4f})')
+                    results[name] = CandidateResult(name, cached.score, cached.fit_seconds, cached.model, cached=True)
+                else:
+                    pending[name] = (model, key)
+
+            if pending:
+                workers = max(1, min(self.config.cores, len(pending)))
+                threads = max(1, self.config.cores // workers)
+                logging.info(f'Model selection: fitting {len(pending)} candidates on {workers} workers x {threads} threads')
+                for name, (score, fit_seconds, model) in self._fit_pending(pending, arrays, workers, threads).items():
+                    result = CandidateResult(name, score, fit_seconds, model)
+                    self._save_cached(pending[name][1], result)
+                    results[name] = result
+                    logging.info(f'Model selection: {name} R2 {score:.4f} in {fit_seconds:.2f}s')
+
+            # Keep the caller's candidate order
+            return {name: results[name] for name in models}
+
+        except Exception as e:
+            logging.info('Exception occured during model selection')
+            raise customexception(e, sys)
+
+    def _fit_pending(self, pending, arrays, workers, threads):
+        with tempfile.TemporaryDirectory(prefix='model_selection_') as shared_dir:
+            paths = {}
+            for array_name, array in arrays.items():
+                paths[array_name] = os.path.join(shared_dir, f'{array_name}.npy')
+                np.save(paths[array_name], array)
+
+            if workers == 1:
+                return {name: fit_candidate(model, paths, threads) for name, (model, _) in pending.items()}
+
+            fitted = {}
+            # Workers append to this process's log file rather than opening their own
+            with ProcessPoolExecutor(max_workers=workers, **pool_log_initializer()) as pool:
+                futures = {pool.submit(fit_candidate, model, paths, threads): name
+                           for name, (model, _) in pending.items()}
+                for future in as_completed(futures):
+                    fitted[futures[future]] = future.result()
+            return fitted
+
+    def _cache_path(self, key):
+        return os.path.join(self.config.cache_dir, f'{key}.pkl')
+
+    def _load_cached(self, key):
+        if not self.config.use_cache or not os.path.exists(self._cache_path(key)):
+            return None
+        try:
+            with open(self._cache_path(key), 'rb') as file_obj:
+                return pickle.load(file_obj)
+        except Exception as e:
+            logging.info(f'Model selection: ignoring unreadable cache entry {key}: {e}')
+            return None
+
+    def _save_cached(self, key, result):
+        if not self.config.use_cache:
+            return
+        os.makedirs(self.config.cache_dir, exist_ok=True)
+        # Write then rename so an interrupted run never leaves a truncated entry
+        tmp_path = self._cache_path(key) + '.tmp'
+        with open(tmp_path, 'wb') as file_obj:
+            pickle.dump(result, file_obj)
+        os.replace(tmp_path, self._cache_path(key))
+
+
+def fit_candidate(model, paths, threads):
+    """Fit one candidate on the memory-mapped split and return (R², fit seconds, fitted model)."""
+    from threadpoolctl import threadpool_limits
+
+    data = {array_name: np.load(path, mmap_mode='r') for array_name, path in paths.items()}
+    params = model.get_params()
+    thread_params = {param: threads for param in THREAD_PARAMS if param in params}
+    if type(model).__module__.startswith('catboost'):
+        # CatBoost only lists explicitly set parameters
+        thread_params['thread_count'] = threads
+    if thread_params:
+        model.set_params(**thread_params)
+
+    with threadpool_limits(limits=threads):
+        start = time.perf_counter()
+        model.fit(data['X_train'], data['y_train'])
+        fit_seconds = time.perf_counter() - start
+        score = r2_score(data['y_test'], model.predict(data['X_test']))
+    return float(score), fit_seconds, model
+
+
+def data_fingerprint(arrays):
+    digest = hashlib.sha256()
+    for array_name in sorted(arrays):
+        array = arrays[array_name]
+        digest.update(f'{array_name}:{array.dtype.str}:{array.shape}'.encode())
+        digest.update(memoryview(array).cast('B'))
+    return digest.hexdigest()
+
+
+def candidate_key(model, fingerprint):
+    """Cache key from the data fingerprint, estimator class, library version and hyperparameters."""
+    cls = type(model)
+    package = sys.modules.get(cls.__module__.split('.')[0])
+    params = {param: value for param, value in model.get_params().items() if param not in RUNTIME_PARAMS}
+    description = repr((
+        fingerprint,
+        f'{cls.__module__}.{cls.__qualname__}',
+        getattr(package, '__version__', ''),
+        sorted(params.items())
+    ))
+    return hashlib.sha256(description.encode()).hexdigest()[:24]
@@ -1,27 +1,116 @@
 import os
 import sys
+import json
+import time
 import numpy as np
 import pandas as pd
 from dataclasses import dataclass
 from src.Airbnb.logger import logging
+from scipy import sparse
 from catboost import CatBoostRegressor
-from src.Airbnb.utils.utils import save_object
+from src.Airbnb.utils.utils import save_object, load_object
 from src.Airbnb.exception import customexception
+from src.Airbnb.components.Model_export import export_compact_model
+from src.Airbnb.pipelines.Price_grid import build_price_grid
+from src.Airbnb.pipelines.Model_registry import artifacts_version
+from src.Airbnb.pipelines.Feature_schema import FEATURE_DTYPE
+from src.Airbnb.pipelines.Geo_index import GeoIndexConfig, index_digest
+from src.Airbnb.pipelines.Amenities_encoder import AmenitiesConfig
+from src.Airbnb.pipelines.Feature_layout import LAYOUT_KEY, build_feature_layout, load_feature_blocks
+from src.Airbnb.components.Training_watermark import (
+    row_hashes, sparse_row_hashes, file_digest, column_stats, drift_score, load_watermark, save_watermark
+)
 from sklearn.metrics import r2_score
 
 
-@dataclass 
+def _optional(name, cast):
+    value = os.environ.get(name, '')
+    return cast(value) if value else None
+
+
+@dataclass
 class ModelTrainerConfig:
     trained_model_file_path = os.path.join('Artifacts','Model.pkl')
-    
-    
+    training_metrics_file_path = os.path.join('Artifacts','training_metrics.json')
+    # CatBoost settings; None leaves CatBoost's own default
+    iterations = int(os.environ.get('AIRBNB_CATBOOST_ITERATIONS', '1000'))
+    learning_rate = _optional('AIRBNB_CATBOOST_LEARNING_RATE', float)
+    thread_count = int(os.environ.get('AIRBNB_CATBOOST_THREADS', '-1'))
+    border_count = _optional('AIRBNB_CATBOOST_BORDER_COUNT', int)
+    used_ram_limit = _optional('AIRBNB_CATBOOST_RAM_LIMIT', str)
+    # Stop when the validation RMSE has not improved for this many iterations (0 disables)
+    early_stopping_rounds = int(os.environ.get('AIRBNB_EARLY_STOPPING_ROUNDS', '50'))
+    # Share of the train split held out as the early-stopping eval set, so the
+    # reported test R2 stays unbiased
+    eval_fraction = float(os.environ.get('AIRBNB_EVAL_FRACTION', '0.1'))
+    # Stop training after this many seconds (0 disables)
+    max_training_seconds = float(os.environ.get('AIRBNB_MAX_TRAINING_SECONDS', '0'))
+    # Also write the trees as Artifacts/compact_model for the NumPy evaluator
+    compact_export = os.environ.get('AIRBNB_EXPORT_COMPACT_MODEL', 'true').lower() == 'true'
+    # Also precompute Artifacts/price_grid for the SearchForm's coarse queries
+    price_grid = os.environ.get('AIRBNB_BUILD_PRICE_GRID', 'true').lower() == 'true'
+    preprocessor_file_path = os.path.join('Artifacts','Preprocessor.pkl')
+    # Rows already trained on and the reference statistics of the last run
+    watermark_file_path = os.path.join('Artifacts','training_watermark.json')
+    trained_rows_file_path = os.path.join('Artifacts','trained_rows.npy')
+    # Continue from the saved CatBoost model on new/changed rows only
+    incremental = os.environ.get('AIRBNB_INCREMENTAL_TRAINING', 'false').lower() == 'true'
+    incremental_iterations = int(os.environ.get('AIRBNB_INCREMENTAL_ITERATIONS', '100'))
+    # Continue with a fraction of the base model's learning rate so a small batch of new rows does not overfit
+    incremental_learning_rate_scale = float(os.environ.get('AIRBNB_INCREMENTAL_LR_SCALE', '0.1'))
+    # Full retrain when any feature (or the target) of the new rows shifts by more
+    # than this many reference standard deviations, or new rows exceed this share
+    drift_threshold = float(os.environ.get('AIRBNB_DRIFT_THRESHOLD', '0.5'))
+    max_new_fraction = float(os.environ.get('AIRBNB_MAX_NEW_FRACTION', '0.5'))
+    # Full retrain when the continued model scores this much worse than the previous one on the test split
+    max_score_drop = float(os.environ.get('AIRBNB_MAX_SCORE_DROP', '0.01'))
+
+
+class TrainingMonitor:
+    """CatBoost callback recording wall time per iteration and enforcing the training time budget."""
+
+    def __init__(self, max_seconds=0):
+        self.max_seconds = max_seconds
+        self.stopped_by_time = False
+        self.restart()
+
+    def restart(self):
+        self.iteration_seconds = []
+        self.start = self.last = time.perf_counter()
+
+    def after_iteration(self, info):
+        now = time.perf_counter()
+        self.iteration_seconds.append(now - self.last)
+        self.last = now
+        if self.max_seconds and now - self.start >= self.max_seconds:
+            self.stopped_by_time = True
+            return False
+        return True
+
+    @property
+    def total_seconds(self):
+        return self.last - self.start
+
+
 class ModelTrainer:
     def __init__(self):
         self.model_trainer_config = ModelTrainerConfig()
-    
-    def initate_model_training(self,train_array,test_array):
+
+    def initate_model_training(self,train_array,test_array,incremental=None,train_amenities=None,test_amenities=None,
+                               split_method=None):
+        """
+        Train CatBoost on the transformed matrices (features + target). With the
+        bag-of-amenities CSR matrices, their columns are appended after the dense
+        features and the model is fitted on the sparse result. split_method is
+        DataIngestionConfig.split_method of the splits (None: unknown); it is
+        recorded in the watermark, and only 'id_hash' runs are continued incrementally.
+        """
         try:
             logging.info('Splitting Dependent and Independent variables from train and test data')
+            # No copy when the transform stage already produced FEATURE_DTYPE (memory-mapped) arrays;
+            # the slices below and the eval split then stay in that dtype
+            train_array = np.asarray(train_array, dtype=FEATURE_DTYPE)
+            test_array = np.asarray(test_array, dtype=FEATURE_DTYPE)
             X_train, y_train, X_test, y_test = (
                 train_array[:,:-1],
                 train_array[:,-1],
@@ -29,22 +118,253 @@ class ModelTrainer:
                 test_array[:,-1]
             )
 
-            # Use only CatBoost model for reduced memory footprint
-            model = CatBoostRegressor(verbose=False)
-            
-            logging.info('Training CatBoost model')
-            model.fit(X_train, y_train)
-            
+            if incremental is None:
+                incremental = self.model_trainer_config.incremental
+
+            config = self.model_trainer_config
+            preprocessor = load_object(config.preprocessor_file_path)
+            encoded_features = len(preprocessor.get_feature_names_out())
+            # Columns after the preprocessor's: the geo features, then the amenity columns
+            geo_features = train_array.shape[1] - 1 - encoded_features
+
+            # Rows are identified by their input columns and target only: the geo features of
+            # a listing change whenever neighbours are added
+            hashes = row_hashes(train_array, columns=list(range(encoded_features)) + [-1])
+            if train_amenities is not None:
+                X_train = with_amenities(X_train, train_amenities)
+                X_test = with_amenities(X_test, test_amenities)
+                hashes = hashes ^ sparse_row_hashes(train_amenities)
+
+            monitor = TrainingMonitor(self.model_trainer_config.max_training_seconds)
+            model, mode, eval_rows = None, 'full', 0
+            if incremental:
+                model = self.incremental_training(train_array, X_train, X_test, y_test, hashes, monitor,
+                                                  geo_features > 0, split_method)
+                if model is not None:
+                    mode = 'incremental'
+
+            if model is None:
+                model = CatBoostRegressor(**self.catboost_params())
+                monitor = TrainingMonitor(self.model_trainer_config.max_training_seconds)
+                fit_params = {'callbacks': [monitor]}
+
+                early_stopping_rounds = self.model_trainer_config.early_stopping_rounds
+                if early_stopping_rounds > 0:
+                    # Stable holdout chosen by row hash, so reruns evaluate on the same rows
+                    eval_mask = (hashes % 1000) < int(self.model_trainer_config.eval_fraction * 1000)
+                    X_fit, y_fit = X_train, y_train
+                    if eval_mask.any() and not eval_mask.all():
+                        eval_rows = int(eval_mask.sum())
+                        X_fit, y_fit = X_train[~eval_mask], y_train[~eval_mask]
+                        eval_set = (X_train[eval_mask], y_train[eval_mask])
+                    else:
+                        eval_set = (X_test, y_test)
+                    fit_params.update(eval_set=eval_set, early_stopping_rounds=early_stopping_rounds,
+                                      use_best_model=True)
+                else:
+                    X_fit, y_fit = X_train, y_train
+
+                logging.info(f'Training CatBoost model with {self.catboost_params()}')
+                model.fit(X_fit, y_fit, **fit_params)
+
             # Evaluate model
             y_test_pred = model.predict(X_test)
             test_score = r2_score(y_test, y_test_pred)
-            
+
             print(f'CatBoost Model R2 Score: {test_score}')
             print('\n====================================================================================\n')
-            logging.info(f'CatBoost Model R2 Score: {test_score}')
+            logging.info(f'CatBoost Model R2 Score ({mode} training): {test_score}')
+
+            # Recorded with the model so serving loads the same geo index and vocabulary in the same order
+            layout = build_feature_layout(encoded_features,
+                                          GeoIndexConfig().index_dir if geo_features else None,
+                                          AmenitiesConfig().vocabulary_path if train_amenities is not None else None)
+            if layout['n_features'] != X_train.shape[1]:
+                raise ValueError(f"Feature layout has {layout['n_features']} columns, the model was trained on "
+                                 f"{X_train.shape[1]}")
 
             save_object(file_path=self.model_trainer_config.trained_model_file_path, obj=model)
-          
+            self.update_watermark(train_array, X_train, hashes, mode, test_score, geo_features > 0, split_method)
+            self.save_training_metrics(model, monitor, mode, test_score, eval_rows, layout)
+
+            if config.compact_export:
+                try:
+                    # Parity with model.predict is checked on the test split before the export is written
+                    export_compact_model(model, X_test, preprocessor=preprocessor,
+                                         source_files=[config.trained_model_file_path, config.preprocessor_file_path],
+                                         feature_layout=layout)
+                except Exception as e:
+                    logging.info(f'Compact model export skipped, serving falls back to Model.pkl: {e}')
+
+            if config.price_grid:
+                try:
+                    artifact_paths = [config.preprocessor_file_path, config.trained_model_file_path]
+                    geo_index, amenities = load_feature_blocks(layout, model, encoded_features)
+                    grid = build_price_grid(model, preprocessor, artifact_paths,
+                                            version=artifacts_version(artifact_paths), geo_index=geo_index,
+                                            amenities=amenities)
+                    logging.info(f'Price grid written: {grid.size} cells {grid.shape}')
+                except Exception as e:
+                    logging.info(f'Price grid skipped, SearchForm queries use the model: {e}')
+
         except Exception as e:
             logging.info('Exception occured at Model Training')
-            raise customexception(e,sys)
\ No newline at end of file
+            raise customexception(e,sys)
+
+    def catboost_params(self):
+        config = self.model_trainer_config
+        params = {'verbose': False, 'iterations': config.iterations, 'thread_count': config.thread_count}
+        optional = {
+            'learning_rate': config.learning_rate,
+            'border_count': config.border_count,
+            'used_ram_limit': config.used_ram_limit
+        }
+        params.update({name: value for name, value in optional.items() if value is not None})
+        return params
+
+    def save_training_metrics(self, model, monitor, mode, test_score, eval_rows, layout):
+        config = self.model_trainer_config
+        iteration_ms = np.asarray(monitor.iteration_seconds) * 1000.0
+        best_iteration = model.get_best_iteration()
+        if monitor.stopped_by_time:
+            stopped_by = 'time_limit'
+        elif mode == 'full' and len(iteration_ms) < config.iterations:
+            stopped_by = 'early_stopping'
+        else:
+            stopped_by = 'iterations'
+
+        metrics = {
+            'mode': mode,
+            'test_r2': float(test_score),
+            'iterations_run': int(len(iteration_ms)),
+            'best_iteration': None if best_iteration is None else int(best_iteration),
+            'best_score': model.get_best_score(),
+            'tree_count': int(model.tree_count_),
+            'stopped_by': stopped_by,
+            'eval_rows': eval_rows,
+            'training_seconds': round(monitor.total_seconds, 3) if len(iteration_ms) else 0.0,
+            'iteration_ms': {
+                'mean': round(float(iteration_ms.mean()), 3) if len(iteration_ms) else None,
+                'p50': round(float(np.percentile(iteration_ms, 50)), 3) if len(iteration_ms) else None,
+                'p95': round(float(np.percentile(iteration_ms, 95)), 3) if len(iteration_ms) else None,
+                'max': round(float(iteration_ms.max()), 3) if len(iteration_ms) else None
+            },
+            'params': {name: value for name, value in model.get_params().items() if name != 'callbacks'},
+            # Model inputs, for serving; model_digest ties them to this run's Model.pkl
+            LAYOUT_KEY: layout,
+            'model_digest': file_digest(config.trained_model_file_path)
+        }
+        logging.info(f"CatBoost training: {metrics['iterations_run']} iterations in {metrics['training_seconds']}s "
+                     f"({metrics['iteration_ms']['mean']} ms/iteration), best iteration {metrics['best_iteration']}, "
+                     f"stopped by {stopped_by}")
+
+        os.makedirs(os.path.dirname(config.training_metrics_file_path), exist_ok=True)
+        tmp_path = config.training_metrics_file_path + '.tmp'
+        with open(tmp_path, 'w') as file_obj:
+            json.dump(metrics, file_obj, indent=2, default=str)
+        os.replace(tmp_path, config.training_metrics_file_path)
+
+    def incremental_training(self, train_array, X_train, X_test, y_test, hashes, monitor, geo_used=False,
+                             split_method=None):
+        """
+        Continue boosting the saved CatBoost model on the rows not seen by the last
+        run. Returns None when a full retrain is needed instead. X_train/X_test are
+        the model inputs (with the amenity columns when those are used).
+        """
+        config = self.model_trainer_config
+        watermark, trained_rows = load_watermark(config.watermark_file_path, config.trained_rows_file_path)
+        if watermark is None or not os.path.exists(config.trained_model_file_path):
+            logging.info('Incremental training: no previous run recorded, falling back to full retrain')
+            return None
+
+        # A random split moves rows the saved model was trained on into the test split, which
+        # would inflate the test R2 the max_score_drop gate compares against the previous model's
+        if split_method != 'id_hash' or watermark.get('split_method') != split_method:
+            logging.info(f"Incremental training: split by {split_method}, last run by {watermark.get('split_method')} "
+                         f"(both must be id_hash), falling back to full retrain")
+            return None
+
+        previous = load_object(config.trained_model_file_path)
+        if not isinstance(previous, CatBoostRegressor):
+            logging.info(f'Incremental training: saved model is {type(previous).__name__}, falling back to full retrain')
+            return None
+
+        # Schema: same preprocessor, geo index, vocabulary and feature width as the model was trained with
+        n_features = X_train.shape[1]
+        if (watermark.get('preprocessor_digest') != file_digest(config.preprocessor_file_path)
+                or watermark.get('geo_index_digest') != geo_index_digest(geo_used)
+                or watermark.get('amenities_digest') != amenities_digest(sparse.issparse(X_train))
+                or watermark.get('n_features') != n_features
+                or len(previous.feature_names_) != n_features):
+            logging.info('Incremental training: schema or preprocessor changed, falling back to full retrain')
+            return None
+
+        new_rows = ~np.isin(hashes, trained_rows)
+        n_new = int(new_rows.sum())
+        if n_new == 0:
+            logging.info('Incremental training: no new or changed rows, keeping the current model')
+            return previous
+        if n_new > config.max_new_fraction * len(train_array):
+            logging.info(f'Incremental training: {n_new} of {len(train_array)} rows are new, falling back to full retrain')
+            return None
+
+        score, column = drift_score(watermark['reference'], train_array[new_rows])
+        if score > config.drift_threshold:
+            logging.info(f'Incremental training: drift {score:.3f} on column {column} exceeds '
+                         f'{config.drift_threshold}, falling back to full retrain')
+            return None
+
+        params = previous.get_params()
+        params['iterations'] = config.incremental_iterations
+        params['learning_rate'] = previous.learning_rate_ * config.incremental_learning_rate_scale
+        model = CatBoostRegressor(**params)
+
+        logging.info(f'Incremental training: continuing from {previous.tree_count_} trees on {n_new} new rows '
+                     f'(drift {score:.3f})')
+        start = time.perf_counter()
+        monitor.restart()
+        model.fit(X_train[new_rows], train_array[new_rows, -1], init_model=previous, callbacks=[monitor])
+        logging.info(f'Incremental training finished in {time.perf_counter() - start:.2f}s, {model.tree_count_} trees')
+
+        previous_score = r2_score(y_test, previous.predict(X_test))
+        new_score = r2_score(y_test, model.predict(X_test))
+        if new_score < previous_score - config.max_score_drop:
+            logging.info(f'Incremental training: test R2 fell from {previous_score:.4f} to {new_score:.4f}, '
+                         f'falling back to full retrain')
+            return None
+        return model
+
+    def update_watermark(self, train_array, X_train, hashes, mode, test_score, geo_used=False, split_method=None):
+        config = self.model_trainer_config
+        watermark = {
+            'mode': mode,
+            'trained_at': pd.Timestamp.now(tz='UTC').isoformat(),
+            'rows': int(len(train_array)),
+            'n_features': int(X_train.shape[1]),
+            'split_method': split_method,
+            'preprocessor_digest': file_digest(config.preprocessor_file_path),
+            'geo_index_digest': geo_index_digest(geo_used),
+            'amenities_digest': amenities_digest(sparse.issparse(X_train)),
+            'test_r2': float(test_score),
+            'reference': column_stats(train_array)
+        }
+        if mode == 'incremental':
+            # Rows trained on in earlier runs stay in the model's trees
+            _, trained_rows = load_watermark(config.watermark_file_path, config.trained_rows_file_path)
+            hashes = np.concatenate([trained_rows, hashes])
+        save_watermark(config.watermark_file_path, config.trained_rows_file_path, watermark, hashes)
+
+
+def with_amenities(X, amenities):
+    """Dense features with the amenity CSR columns appended, as CSR (the amenity columns are never densified)."""
+    return sparse.hstack([sparse.csr_matrix(X), amenities], format='csr', dtype=X.dtype)
+
+
+def geo_index_digest(used):
+    """Digest of the geo index when the model uses the geo features, else None."""
+    return index_digest(GeoIndexConfig().index_dir) if used else None
+
+
+def amenities_digest(used):
+    """Digest of the amenity vocabulary when the model uses the amenity columns, else None."""
+    return file_digest(AmenitiesConfig().vocabulary_path) if used else None
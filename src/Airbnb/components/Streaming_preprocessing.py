@@ -0,0 +1,246 @@
+import os
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+from collections import Counter
+from src.Airbnb.logger import logging
+from src.Airbnb.exception import customexception
+from src.Airbnb.utils.utils import iter_dataset, dataset_rows
+from src.Airbnb.components.Feature_cleaning import clean_listing_features
+
+# Out-of-core fitting and application of the DataTransformation preprocessor.
+# The train split is read once in chunks to collect per-column statistics
+# (numeric count/mean/M2/min/max, category counts); numeric values are spilled
+# to a float64 scratch file so the medians can be found exactly with two
+# bounded passes over it. The statistics are written into the ColumnTransformer
+# from get_data_transformation, so the saved Preprocessor.pkl is the same kind
+# of object the in-memory fit produces. Splits are then transformed chunk by
+# chunk into a preallocated .npy matrix (features [+ geo features] + target).
+
+MEDIAN_BINS = 4096
+
+
+def iter_clean_chunks(file_path, columns, chunk_size):
+    for chunk in iter_dataset(file_path, columns=columns, chunk_size=chunk_size):
+        if len(chunk):
+            yield clean_listing_features(chunk)
+
+
+class NumericStats:
+    """Count, mean, M2, min and max of the non-NaN values of each column, merged chunk by chunk."""
+
+    def __init__(self, n_columns):
+        self.rows = 0
+        self.count = np.zeros(n_columns, dtype=np.int64)
+        self.mean = np.zeros(n_columns)
+        self.m2 = np.zeros(n_columns)
+        self.min = np.full(n_columns, np.inf)
+        self.max = np.full(n_columns, -np.inf)
+
+    def update(self, values):
+        present = ~np.isnan(values)
+        count = present.sum(axis=0)
+        mean = np.where(present, values, 0.0).sum(axis=0) / np.maximum(count, 1)
+        m2 = (np.where(present, values - mean, 0.0) ** 2).sum(axis=0)
+        # Chan et al. pairwise update
+        total = self.count + count
+        share = np.divide(count, total, out=np.zeros(len(total)), where=total > 0)
+        delta = mean - self.mean
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * share
+        self.mean = self.mean + delta * share
+        self.count = total
+        self.min = np.minimum(self.min, np.where(present, values, np.inf).min(axis=0))
+        self.max = np.maximum(self.max, np.where(present, values, -np.inf).max(axis=0))
+        self.rows += len(values)
+
+    def imputed_moments(self, fill):
+        """Mean and variance of each column once its NaN are replaced by fill."""
+        missing = self.rows - self.count
+        delta = fill - self.mean
+        mean = self.mean + delta * missing / self.rows
+        m2 = self.m2 + delta ** 2 * self.count * missing / self.rows
+        return mean, m2 / self.rows
+
+
+def exact_medians(spill, stats, chunk_size, bins=MEDIAN_BINS):
+    """
+    Median of the non-NaN values of each column of spill (rows x columns), equal
+    to the one SimpleImputer computes. A histogram pass finds the bins holding the
+    middle ranks; a second pass counts the distinct values inside those bins only.
+    """
+    n_columns = spill.shape[1]
+    width = np.where(stats.max > stats.min, stats.max - stats.min, 1.0)
+
+    def present_bins(block, j):
+        column = block[:, j]
+        column = column[~np.isnan(column)]
+        index = ((column - stats.min[j]) / width[j] * bins).astype(np.int64)
+        return column, np.minimum(index, bins - 1)
+
+    histogram = np.zeros((n_columns, bins), dtype=np.int64)
+    for start in range(0, len(spill), chunk_size):
+        block = spill[start:start + chunk_size]
+        for j in range(n_columns):
+            histogram[j] += np.bincount(present_bins(block, j)[1], minlength=bins)
+    cumulative = histogram.cumsum(axis=1)
+    ranks = np.stack([(stats.count - 1) // 2, stats.count // 2], axis=1)
+    target_bins = [[int(np.searchsorted(cumulative[j], rank, side='right')) for rank in ranks[j]]
+                   for j in range(n_columns)]
+
+    values = [Counter() for _ in range(n_columns)]
+    for start in range(0, len(spill), chunk_size):
+        block = spill[start:start + chunk_size]
+        for j in range(n_columns):
+            column, index = present_bins(block, j)
+            unique, counts = np.unique(column[np.isin(index, target_bins[j])], return_counts=True)
+            values[j].update(dict(zip(unique.tolist(), counts.tolist())))
+
+    medians = np.empty(n_columns)
+    for j in range(n_columns):
+        unique = np.array(sorted(values[j]))
+        counts = np.cumsum([values[j][value] for value in unique])
+        first_rank = cumulative[j][target_bins[j][0]] - histogram[j][target_bins[j][0]]
+        middle = [unique[np.searchsorted(counts, rank - first_rank, side='right')] for rank in ranks[j]]
+        medians[j] = (middle[0] + middle[1]) / 2.0
+    return medians
+
+
+def _pipeline_steps(preprocessor, name):
+    for transformer_name, pipeline, columns in preprocessor.transformers:
+        if transformer_name == name:
+            return pipeline.named_steps, list(columns)
+    raise ValueError(f"Preprocessor has no {name} transformer")
+
+
+def _set_scaler(scaler, mean, var, constant, rows):
+    scaler.mean_ = mean
+    scaler.var_ = var
+    scale = np.sqrt(var)
+    scale[constant] = 1.0
+    scaler.scale_ = scale
+    scaler.n_samples_seen_ = rows
+
+
+def fit_preprocessor(preprocessor, file_path, columns, target_column, chunk_size, work_dir=None):
+    """
+    Fit the unfitted ColumnTransformer from DataTransformation.get_data_transformation
+    in one streaming pass over file_path. Returns (preprocessor, rows).
+    """
+    try:
+        num_steps, numerical_cols = _pipeline_steps(preprocessor, 'num_pipeline')
+        cat_steps, categorical_cols = _pipeline_steps(preprocessor, 'cat_pipeline')
+        encoder = cat_steps['ordinalencoder']
+        codes = [{value: i for i, value in enumerate(categories)} for categories in encoder.categories]
+
+        numeric = NumericStats(len(numerical_cols))
+        category_counts = [Counter() for _ in categorical_cols]
+        feature_columns = None
+        os.makedirs(work_dir or '.', exist_ok=True)
+        with tempfile.TemporaryDirectory(prefix='.transform_', dir=work_dir) as scratch:
+            spill_path = os.path.join(scratch, 'numeric.f64')
+            with open(spill_path, 'wb') as spill_file:
+                for chunk in iter_clean_chunks(file_path, columns, chunk_size):
+                    if feature_columns is None:
+                        feature_columns = [col for col in chunk.columns if col != target_column]
+                    values = chunk[numerical_cols].to_numpy(dtype=np.float64)
+                    numeric.update(values)
+                    spill_file.write(values.tobytes())
+                    for counter, col in zip(category_counts, categorical_cols):
+                        counter.update(chunk[col].value_counts(dropna=True).to_dict())
+
+            if numeric.rows == 0:
+                raise ValueError(f"{file_path} has no rows")
+            empty = [col for col, count in zip(numerical_cols, numeric.count) if count == 0]
+            if empty:
+                raise ValueError(f"Numeric columns without any values: {empty}")
+            spill = np.memmap(spill_path, dtype=np.float64, mode='r', shape=(numeric.rows, len(numerical_cols)))
+            medians = exact_medians(spill, numeric, chunk_size)
+            del spill
+
+        rows = numeric.rows
+        modes = []
+        cat_mean, cat_var, cat_constant = [], [], []
+        for col, counter, code in zip(categorical_cols, category_counts, codes):
+            if not counter:
+                raise ValueError(f"Categorical column without any values: {col}")
+            # Ties go to the smallest value, as in SimpleImputer(strategy='most_frequent')
+            top = max(counter.values())
+            mode = min(value for value, count in counter.items() if count == top)
+            modes.append(mode)
+            unknown = [value for value in counter if value not in code]
+            if unknown:
+                logging.info(f"Out-of-core fit: {col} has {len(unknown)} values outside the encoder vocabulary")
+
+            code_counts = Counter()
+            for value, count in counter.items():
+                code_counts[code.get(value, encoder.unknown_value)] += count
+            code_counts[code.get(mode, encoder.unknown_value)] += rows - sum(counter.values())
+            encoded = np.array(list(code_counts), dtype=np.float64)
+            weights = np.array(list(code_counts.values()), dtype=np.float64)
+            mean = (encoded * weights).sum() / rows
+            cat_mean.append(mean)
+            cat_var.append((weights * (encoded - mean) ** 2).sum() / rows)
+            cat_constant.append(len(code_counts) == 1)
+
+        # Fit on a one-row frame to build the fitted attributes, then replace the statistics
+        template = {col: [0.0] for col in numerical_cols}
+        template.update({col: [categories[0]] for col, categories in zip(categorical_cols, encoder.categories)})
+        preprocessor.fit(pd.DataFrame(template)[feature_columns])
+
+        num_fitted = preprocessor.named_transformers_['num_pipeline'].named_steps
+        num_fitted['imputer'].statistics_ = medians
+        num_mean, num_var = numeric.imputed_moments(medians)
+        _set_scaler(num_fitted['scaler'], num_mean, num_var, numeric.min == numeric.max, rows)
+
+        cat_fitted = preprocessor.named_transformers_['cat_pipeline'].named_steps
+        cat_fitted['imputer'].statistics_ = np.array(modes, dtype=object)
+        _set_scaler(cat_fitted['scaler'], np.array(cat_mean), np.array(cat_var), np.array(cat_constant), rows)
+
+        logging.info(f"Out-of-core fit of the preprocessor on {rows} rows in chunks of {chunk_size}")
+        return preprocessor, rows
+    except Exception as e:
+        logging.info('Exception occurred in out-of-core preprocessor fit')
+        raise customexception(e, sys)
+
+
+def transform_to_matrix(preprocessor, file_path, columns, target_column, output_path, chunk_size, rows=None,
+                        dtype=np.float32, geo_index=None, exclude_self=False):
+    """
+    Transform file_path chunk by chunk into a .npy matrix of dtype at output_path
+    whose last column is the target. Returns it memory-mapped read-only.
+
+    With a geo_index its features are written before the target; exclude_self
+    when the index holds the rows of file_path, so a row is not its own neighbour.
+    """
+    try:
+        if rows is None:
+            rows = dataset_rows(file_path)
+        n_features = len(preprocessor.get_feature_names_out())
+        n_geo = 0 if geo_index is None else len(geo_index.meta['features'])
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        tmp_path = output_path + '.tmp'
+        matrix = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dtype, shape=(rows, n_features + n_geo + 1))
+        offset = 0
+        for chunk in iter_clean_chunks(file_path, columns, chunk_size):
+            end = offset + len(chunk)
+            if end > rows:
+                raise ValueError(f"{file_path} has more than the expected {rows} rows")
+            matrix[offset:end, :n_features] = preprocessor.transform(chunk.drop(columns=[target_column]))
+            if n_geo:
+                exclude = geo_index.row_ids(chunk['latitude'], chunk['longitude'],
+                                            chunk[target_column]) if exclude_self else None
+                matrix[offset:end, n_features:-1] = geo_index.query_many(chunk['latitude'], chunk['longitude'],
+                                                                         exclude=exclude)
+            matrix[offset:end, -1] = chunk[target_column].to_numpy()
+            offset = end
+        if offset != rows:
+            raise ValueError(f"{file_path} has {offset} rows, expected {rows}")
+        matrix.flush()
+        del matrix
+        os.replace(tmp_path, output_path)
+        logging.info(f"Wrote {rows} x {n_features + n_geo + 1} {np.dtype(dtype).name} matrix to {output_path}")
+        return np.load(output_path, mmap_mode='r')
+    except Exception as e:
+        logging.info('Exception occurred in out-of-core transform')
+        raise customexception(e, sys)
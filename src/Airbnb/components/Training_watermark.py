@@ -0,0 +1,93 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from src.Airbnb.pipelines.Compact_model import file_digest
+
+# State kept between training runs so the next run can continue from the saved
+# model. It records the rows the model has already seen (as row hashes of the
+# preprocessed train matrix), the preprocessor it was trained with, and reference
+# feature statistics used to detect drift in new rows.
+
+
+# Rows per block when scanning a (possibly memory-mapped) train matrix
+BLOCK_ROWS = 65536
+
+
+def row_hashes(array, columns=None):
+    """
+    uint64 content hash per row of a 2D array (features and target), or of the
+    given columns of it. Rows are hashed as float32, so the hashes (and the eval
+    holdout chosen from them) do not depend on AIRBNB_FEATURE_DTYPE.
+    """
+    columns = slice(None) if columns is None else columns
+    return np.concatenate([
+        pd.util.hash_pandas_object(pd.DataFrame(np.asarray(array[start:start + BLOCK_ROWS][:, columns],
+                                                           dtype=np.float32)),
+                                   index=False).to_numpy()
+        for start in range(0, max(len(array), 1), BLOCK_ROWS)
+    ])
+
+
+def sparse_row_hashes(matrix):
+    """
+    uint64 hash per row of a 0/1 CSR matrix (the amenity columns), from the set
+    of its non-zero columns; combined with row_hashes by XOR.
+    """
+    column_hashes = pd.util.hash_array(np.asarray(matrix.indices, dtype=np.int64))
+    # Sum per row (mod 2**64) through a cumulative sum, so empty rows need no special case
+    cumulative = np.concatenate([np.zeros(1, dtype=np.uint64), np.cumsum(column_hashes, dtype=np.uint64)])
+    sums = cumulative[matrix.indptr[1:]] - cumulative[matrix.indptr[:-1]]
+    return pd.util.hash_array(sums)
+
+
+def column_stats(array):
+    """Per-column mean and standard deviation, ignoring NaN; read in row blocks."""
+    count = np.zeros(array.shape[1])
+    total = np.zeros(array.shape[1])
+    for start in range(0, len(array), BLOCK_ROWS):
+        block = np.asarray(array[start:start + BLOCK_ROWS], dtype=np.float64)
+        count += (~np.isnan(block)).sum(axis=0)
+        total += np.nansum(block, axis=0)
+    mean = total / np.where(count > 0, count, np.nan)
+    squares = np.zeros(array.shape[1])
+    for start in range(0, len(array), BLOCK_ROWS):
+        block = np.asarray(array[start:start + BLOCK_ROWS], dtype=np.float64)
+        squares += np.nansum((block - mean) ** 2, axis=0)
+    return {
+        'mean': mean.tolist(),
+        'std': np.sqrt(squares / np.where(count > 0, count, np.nan)).tolist()
+    }
+
+
+def drift_score(reference, array):
+    """
+    Largest standardized mean shift of any column of array against the reference
+    statistics: |mean_new - mean_ref| / std_ref. Returns (score, column index).
+    """
+    ref_mean = np.asarray(reference['mean'], dtype=float)
+    ref_std = np.asarray(reference['std'], dtype=float)
+    shift = np.abs(np.nanmean(array, axis=0) - ref_mean) / np.where(ref_std > 0, ref_std, 1.0)
+    column = int(np.nanargmax(shift))
+    return float(shift[column]), column
+
+
+def load_watermark(watermark_path, rows_path):
+    """(watermark dict, sorted trained row hashes), or (None, None) when there is no previous run."""
+    if not (os.path.exists(watermark_path) and os.path.exists(rows_path)):
+        return None, None
+    with open(watermark_path) as file_obj:
+        watermark = json.load(file_obj)
+    return watermark, np.load(rows_path)
+
+
+def save_watermark(watermark_path, rows_path, watermark, hashes):
+    os.makedirs(os.path.dirname(watermark_path) or '.', exist_ok=True)
+    # New files swapped in, never rewritten in place (the stage cache may hardlink them)
+    with open(rows_path + '.tmp', 'wb') as file_obj:
+        np.save(file_obj, np.unique(hashes))
+    os.replace(rows_path + '.tmp', rows_path)
+    tmp_path = watermark_path + '.tmp'
+    with open(tmp_path, 'w') as file_obj:
+        json.dump(watermark, file_obj, indent=2)
+    os.replace(tmp_path, watermark_path)
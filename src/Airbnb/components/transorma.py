@@ -7,6 +7,7 @@ from dataclasses import dataclass
 from src.Airbnb.logger import logging
 from src.Airbnb.utils.utils import save_object
 from src.Airbnb.exception import customexception
+from src.Airbnb.components.Feature_cleaning import count_amenities
 from sklearn.preprocessing import LabelEncoder,StandardScaler
 
 
@@ -52,17 +53,9 @@ class DataTransformation:
                 test_df[col] = test_df[col].fillna((test_df[col].median()))
             logging.info("Null values imputed with median")
 
-            # Handling Amenities Column in Training Data
-            amenities_count_train = []
-            for i in train_df["amenities"]:
-                amenities_count_train.append(len(i))
-            train_df["amenities"] = amenities_count_train
-
-            # Handling Amenities Column in Testing Data
-            amenities_count_test = []
-            for i in test_df["amenities"]:
-                amenities_count_test.append(len(i))
-            test_df["amenities"] = amenities_count_test
+            # Handling Amenities Column in Training and Testing Data (number of amenities, not characters)
+            train_df["amenities"] = count_amenities(train_df["amenities"])
+            test_df["amenities"] = count_amenities(test_df["amenities"])
 
             logging.info("Amenities column handled")
 
@@ -1,18 +1,266 @@
 import os
+import sys
+import json
+import glob
+import queue
+import atexit
+import zlib
 import logging
-from datetime import datetime 
+import multiprocessing
+import contextvars
+import logging.handlers
+from datetime import datetime, timezone
 
-LOG_FILE = f"{datetime.now().strftime('%Y_%m_%d_%H_%M_%S')}.log"
+# Records are put on a bounded in-memory queue by the calling thread and written
+# by a background listener thread, so logging.info never does disk I/O in the
+# request path. When the queue is full records are dropped (and counted) rather
+# than blocking. Callers keep using `from src.Airbnb.logger import logging`.
 
-log_path = os.path.join(os.getcwd(), "logs")
+LOG_DIR = os.environ.get("AIRBNB_LOG_DIR", os.path.join(os.getcwd(), "logs"))
+# json (one object per line) or text (the previous "[time] line name - level - message" format)
+LOG_FORMAT = os.environ.get("AIRBNB_LOG_FORMAT", "json").lower()
+# Share of request-scoped INFO/DEBUG records that are kept; sampled per request id,
+# so a request keeps all of its records or none. Warnings, errors, records logged
+# while an exception is being handled (the `except ...: logging.info(...)` failure
+# path) and records logged with extra={"always_log": True} are always kept.
+LOG_SAMPLE_RATE = float(os.environ.get("AIRBNB_LOG_SAMPLE_RATE", "1.0"))
+LOG_MAX_BYTES = int(os.environ.get("AIRBNB_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.environ.get("AIRBNB_LOG_BACKUP_COUNT", "3"))
+# Log files (including rotated ones) kept in LOG_DIR; when a process opens its log
+# file, the oldest ones of processes that have exited are removed
+LOG_MAX_FILES = int(os.environ.get("AIRBNB_LOG_MAX_FILES", "20"))
+LOG_QUEUE_SIZE = int(os.environ.get("AIRBNB_LOG_QUEUE_SIZE", "10000"))
 
-os.makedirs(log_path, exist_ok=True)
 
-LOG_FILEPATH = os.path.join(log_path, LOG_FILE)
+def log_file_path():
+    # One file per process start; the pid keeps gunicorn workers from sharing (and racing to rotate) a file
+    return os.path.join(LOG_DIR, f"{datetime.now().strftime('%Y_%m_%d_%H_%M_%S')}_{os.getpid()}.log")
 
-logging.basicConfig(level = logging.INFO, 
-                    filename = LOG_FILEPATH, 
-                    format = "[%(asctime)s] %(lineno)d %(name)s - %(levelname)s - %(message)s")
+
+LOG_FILEPATH = log_file_path()
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+
+def set_request_id(request_id):
+    """Tag records logged from the current context with request_id. Returns a token for reset_request_id."""
+    return request_id_var.set(request_id)
+
+
+def reset_request_id(token):
+    request_id_var.reset(token)
+
+
+class RequestContextFilter(logging.Filter):
+    """Adds request_id and samples request-scoped INFO/DEBUG records."""
+
+    def __init__(self, sample_rate):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        request_id = request_id_var.get()
+        record.request_id = request_id
+        if request_id is None or record.levelno > logging.INFO or self.sample_rate >= 1.0:
+            return True
+        if getattr(record, "always_log", False) or record.exc_info or sys.exc_info()[0] is not None:
+            # Handler filters run in the calling thread, so sys.exc_info() is the caller's exception
+            return True
+        return zlib.crc32(str(request_id).encode()) < self.sample_rate * 0x100000000
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "line": record.lineno,
+            "message": record.getMessage(),
+            "process": record.process,
+            "thread": record.threadName
+        }
+        if getattr(record, "request_id", None) is not None:
+            entry["request_id"] = record.request_id
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Only the listener reads the record after this, so resolve the message and
+        # traceback in place instead of the default format-and-copy
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _writer_pid(path):
+    # <time>_<pid>.log, .log.1, ...
+    try:
+        return int(os.path.basename(path).split(".log")[0].rsplit("_", 1)[1])
+    except (IndexError, ValueError):
+        return None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _prune_log_files(log_dir, keep):
+    # Files of live processes (e.g. sibling gunicorn workers) are never removed
+    files = sorted(glob.glob(os.path.join(log_dir, "*.log*")), key=os.path.getmtime)
+    excess = len(files) - keep
+    for path in files:
+        if excess <= 0:
+            break
+        pid = _writer_pid(path)
+        if pid is not None and (pid == os.getpid() or _pid_alive(pid)):
+            continue
+        try:
+            os.remove(path)
+            excess -= 1
+        except OSError:
+            pass
+
+
+class ProcessLogHandler(logging.Handler):
+    """
+    Writes records to the log file of this process, opened on the first record.
+    Workers of a multiprocessing pool given parent_log_path (by a fork, or by
+    init_worker_logging) append to that file instead (without rotating it), so
+    they add no files of their own.
+    """
+
+    def __init__(self, log_path, parent_log_path=None):
+        super().__init__()
+        self.log_path = log_path
+        self.parent_log_path = parent_log_path
+        self.target = None
+
+    def _open(self):
+        try:
+            os.makedirs(LOG_DIR, exist_ok=True)
+            if self.parent_log_path and multiprocessing.parent_process() is not None:
+                return logging.FileHandler(self.parent_log_path)
+            _prune_log_files(LOG_DIR, max(LOG_MAX_FILES - 1, 0))
+            return logging.handlers.RotatingFileHandler(self.log_path, maxBytes=LOG_MAX_BYTES,
+                                                        backupCount=LOG_BACKUP_COUNT)
+        except OSError:
+            # Read-only filesystem (e.g. serverless): log to stderr instead
+            return logging.StreamHandler(sys.stderr)
+
+    def use_parent_log(self, parent_log_path):
+        # Under the handler lock, which the listener thread holds while emitting
+        with self.lock:
+            if self.target is not None:
+                self.target.close()
+                self.target = None
+            self.parent_log_path = parent_log_path
+
+    def emit(self, record):
+        if self.target is None:
+            self.target = self._open()
+            self.target.setFormatter(self.formatter)
+        self.target.emit(record)
+
+    def close(self):
+        if self.target is not None:
+            self.target.close()
+        super().close()
+
+
+def _output_handler(log_path, parent_log_path=None):
+    handler = ProcessLogHandler(log_path, parent_log_path)
+    if LOG_FORMAT == "text":
+        handler.setFormatter(logging.Formatter("[%(asctime)s] %(lineno)d %(name)s - %(levelname)s - %(message)s"))
+    else:
+        handler.setFormatter(JsonFormatter())
+    return handler
+
+
+queue_handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+queue_handler.addFilter(RequestContextFilter(LOG_SAMPLE_RATE))
+output_handler = _output_handler(LOG_FILEPATH)
+listener = logging.handlers.QueueListener(queue_handler.queue, output_handler, respect_handler_level=True)
+# Whether this process's listener thread is running (a forked child inherits True but not the thread)
+_listener_started = False
+
+
+def _start_listener():
+    global _listener_started
+    listener.start()
+    _listener_started = True
+
+
+def _stop_listener():
+    # Flush queued records on interpreter exit
+    global _listener_started
+    if _listener_started:
+        _listener_started = False
+        listener.stop()
+
+
+logging.root.setLevel(logging.INFO)
+logging.root.addHandler(queue_handler)
+_start_listener()
+atexit.register(_stop_listener)
+
+
+def init_worker_logging(parent_log_path):
+    """Pool initializer: append this worker's records to parent_log_path instead of opening a file."""
+    output_handler.use_parent_log(parent_log_path)
+
+
+def pool_log_initializer():
+    """
+    initializer/initargs for a ProcessPoolExecutor whose workers should log to
+    this process's file: ProcessPoolExecutor(max_workers=n, **pool_log_initializer()).
+    """
+    return {'initializer': init_worker_logging, 'initargs': (LOG_FILEPATH,)}
+
+
+def _restart_listener():
+    # The listener thread does not survive a fork (gunicorn --preload); without it
+    # the child's queue would fill up and every record would be dropped. Nothing is
+    # opened here: a gunicorn worker gets its own file on its first record, a
+    # ProcessPoolExecutor worker appends to its parent's
+    global listener, output_handler, LOG_FILEPATH, _listener_started
+    parent_log_path, LOG_FILEPATH = LOG_FILEPATH, log_file_path()
+    queue_handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+    output_handler = _output_handler(LOG_FILEPATH, parent_log_path)
+    listener = logging.handlers.QueueListener(queue_handler.queue, output_handler, respect_handler_level=True)
+    _listener_started = False
+    _start_listener()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_listener)
 
 if __name__ == "__main__":
-    logging.info("This is a test log message")
\ No newline at end of file
+    logging.info("This is a test log message")
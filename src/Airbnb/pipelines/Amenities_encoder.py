@@ -0,0 +1,151 @@
+import os
+import json
+import numpy as np
+from dataclasses import dataclass
+
+# Bag-of-amenities features: one 0/1 column per amenity in a vocabulary fitted
+# on the train split (amenities on fewer than min_count listings are pruned).
+# Training parses the raw '{TV,"Wireless Internet",...}' strings column-wise
+# (pyarrow.compute when installed, pandas .str otherwise) and builds a scipy CSR
+# matrix, which CatBoost consumes without densifying. Serving encodes a
+# request's amenity list (Feature_schema.AMENITY_LIST) with one dict lookup per
+# amenity. The vocabulary is a JSON file; the serving side needs NumPy and json
+# only, so api/index.py can use it without pandas or scipy.
+
+VOCABULARY_FILE = 'amenities.json'
+
+
+@dataclass
+class AmenitiesConfig:
+    vocabulary_path: str = os.path.join('Artifacts', VOCABULARY_FILE)
+    # Training: append the bag-of-amenities columns (serving follows the model)
+    enabled: bool = os.environ.get("AIRBNB_AMENITY_FEATURES", "false").lower() == "true"
+    # Amenities on fewer train listings than this get no column
+    min_count: int = int(os.environ.get("AIRBNB_AMENITY_MIN_COUNT", "20"))
+    # Most frequent amenities kept (0: no limit)
+    max_size: int = int(os.environ.get("AIRBNB_AMENITY_MAX_SIZE", "0"))
+
+
+def split_amenities(column):
+    """
+    Parse a column of raw amenity lists into (rows, codes, names): for every
+    amenity mentioned, the position of its row and its code in names (the
+    distinct amenity names of the column). Missing values, '' and '{}'
+    contribute nothing; numeric values (legacy counts) are not lists and
+    contribute nothing either.
+    """
+    import pandas as pd
+
+    if pd.api.types.is_numeric_dtype(column):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), []
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError:
+        pa = None
+
+    if pa is not None:
+        strings = pa.array(column.astype('string'), type=pa.string(), from_pandas=True)
+        if isinstance(strings, pa.ChunkedArray):
+            # pyarrow-backed columns (e.g. a streamed Arrow split) come back in several chunks
+            strings = strings.combine_chunks()
+        lists = pc.split_pattern(pc.utf8_trim(strings, characters='{}'), pattern=',')
+        lengths = pc.fill_null(pc.list_value_length(lists), 0).to_numpy(zero_copy_only=False)
+        names = pc.utf8_trim(pc.utf8_trim_whitespace(pc.list_flatten(lists)), characters='"')
+        # Dictionary-encoded, so only the distinct names become Python strings
+        encoded = pc.dictionary_encode(pc.utf8_trim_whitespace(names))
+        codes = encoded.indices.to_numpy(zero_copy_only=False).astype(np.int64)
+        uniques = encoded.dictionary.to_pylist()
+    else:
+        lists = column.astype('string').str.strip('{}').str.split(',')
+        lengths = lists.str.len().fillna(0).to_numpy(dtype=np.int64)
+        names = lists.explode().dropna().str.strip().str.strip('"').str.strip()
+        codes, uniques = pd.factorize(names.to_numpy(dtype=object))
+        uniques = list(uniques)
+
+    rows = np.repeat(np.arange(len(column)), np.asarray(lengths, dtype=np.int64))
+    if '' in uniques:
+        keep = codes != uniques.index('')
+        rows, codes = rows[keep], codes[keep]
+    return rows, codes, uniques
+
+
+class AmenitiesEncoder:
+    def __init__(self, vocabulary):
+        self.vocabulary = list(vocabulary)
+        self.index = {name: i for i, name in enumerate(self.vocabulary)}
+        self.size = len(self.vocabulary)
+
+    @classmethod
+    def fit(cls, columns, min_count=20, max_size=0):
+        """
+        Vocabulary of the amenities on at least min_count listings of the raw
+        amenity columns (chunks of one split), most frequent first.
+        """
+        from collections import Counter
+        from scipy import sparse
+        counts = Counter()
+        for column in columns:
+            rows, codes, names = split_amenities(column)
+            if len(codes) == 0:
+                continue
+            # Listings per amenity: a name repeated within a listing counts once
+            pairs = sparse.csr_matrix((np.ones(len(codes), dtype=np.int8), (rows, codes)),
+                                      shape=(len(column), len(names)))
+            pairs.sum_duplicates()
+            listings = np.bincount(pairs.indices, minlength=len(names))
+            counts.update({name: count for name, count in zip(names, listings.tolist()) if name})
+        ranked = sorted((name for name, count in counts.items() if count >= min_count),
+                        key=lambda name: (-counts[name], name))
+        return cls(ranked[:max_size] if max_size else ranked)
+
+    def transform(self, column, dtype=np.float32):
+        """(len(column), size) scipy CSR matrix with 1 where a listing has the amenity."""
+        from scipy import sparse
+
+        rows, codes, names = split_amenities(column)
+        # Column of each distinct name (-1: not in the vocabulary)
+        columns = np.array([self.index.get(name, -1) for name in names] + [-1], dtype=np.int64)[codes]
+        known = columns >= 0
+        matrix = sparse.csr_matrix((np.ones(int(known.sum()), dtype=dtype), (rows[known], columns[known])),
+                                   shape=(len(column), self.size))
+        matrix.sum_duplicates()
+        matrix.data[:] = 1
+        return matrix
+
+    def encode(self, names):
+        """Sorted column indices of a list of amenity names; unknown names are ignored."""
+        if not isinstance(names, (list, tuple, set)):
+            # None: amenities were given as a count
+            return []
+        return sorted({self.index[name] for name in names if name in self.index})
+
+    def encode_many(self, name_lists, dtype=np.float32):
+        """Dense (n, size) 0/1 array for a list of amenity name lists."""
+        matrix = np.zeros((len(name_lists), self.size), dtype=dtype)
+        for i, names in enumerate(name_lists):
+            matrix[i, self.encode(names)] = 1
+        return matrix
+
+    def feature_names(self):
+        return [f'amenity__{name}' for name in self.vocabulary]
+
+    def save(self, file_path):
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+        tmp_path = file_path + '.tmp'
+        with open(tmp_path, 'w') as file_obj:
+            json.dump({'vocabulary': self.vocabulary}, file_obj, indent=2)
+        os.replace(tmp_path, file_path)
+
+    @classmethod
+    def load(cls, file_path):
+        with open(file_path) as file_obj:
+            return cls(json.load(file_obj)['vocabulary'])
+
+
+def append_amenity_features(X, name_lists, amenities):
+    """X with the amenity columns appended (X itself when amenities is None)."""
+    if amenities is None:
+        return X
+    X = np.asarray(X)
+    return np.hstack([X, amenities.encode_many(name_lists, dtype=X.dtype)])
@@ -0,0 +1,133 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+# Pure-NumPy evaluator for tree ensembles exported by
+# src.Airbnb.components.Model_export. It needs neither catboost nor
+# scikit-learn at serving time, and the tree arrays are memory-mapped, so
+# loading a model costs a few page faults instead of an unpickle.
+
+META_FILE = 'meta.json'
+# Compiled FastFeatureEncoder exported next to the model (optional)
+ENCODER_FILE = 'encoder.json'
+
+
+def file_digest(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file_obj:
+        for block in iter(lambda: file_obj.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def is_current(model_dir, source_files):
+    """
+    True if model_dir holds an export made from the given pickles. Pickles that
+    do not exist are ignored, so a deployment can ship the compact export alone.
+    """
+    try:
+        with open(os.path.join(model_dir, META_FILE)) as file_obj:
+            digests = json.load(file_obj).get('source_digests', {})
+    except (OSError, ValueError):
+        return False
+    for path in source_files:
+        if os.path.exists(path) and digests.get(os.path.basename(path)) != file_digest(path):
+            return False
+    return True
+
+
+class CompactModel:
+    """
+    Loaded compact model. Supported kinds:
+
+    - 'oblivious': CatBoost symmetric trees. Every level of a tree tests the same
+      (feature, border) pair, so the leaf index is the bit pattern of its depth
+      comparisons.
+    - 'tree': scikit-learn regression trees (GradientBoosting / RandomForest),
+      walked level by level for the whole batch at once.
+    - 'linear': coefficients and intercept.
+    """
+
+    def __init__(self, meta, arrays):
+        self.meta = meta
+        self.arrays = arrays
+        self.kind = meta['kind']
+        self.n_features = meta['n_features']
+        self.batch_size = meta.get('batch_size', 1024)
+
+    @classmethod
+    def load(cls, model_dir, mmap=True):
+        with open(os.path.join(model_dir, META_FILE)) as file_obj:
+            meta = json.load(file_obj)
+        arrays = {name: np.load(os.path.join(model_dir, f'{name}.npy'), mmap_mode='r' if mmap else None)
+                  for name in meta['arrays']}
+        return cls(meta, arrays)
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got {X.shape[1]}")
+
+        if self.kind == 'linear':
+            return X @ self.arrays['coef'] + self.meta['intercept']
+
+        evaluate = self._predict_oblivious if self.kind == 'oblivious' else self._predict_tree
+        if len(X) <= self.batch_size:
+            return evaluate(X)
+        # Bound the (rows x trees x depth) intermediates
+        return np.concatenate([evaluate(X[start:start + self.batch_size])
+                               for start in range(0, len(X), self.batch_size)])
+
+    def _predict_oblivious(self, X):
+        split_feature = self.arrays['split_feature']
+        split_border = self.arrays['split_border']
+        leaf_values = self.arrays['leaf_values']
+        n_trees, depth = split_feature.shape
+
+        # CatBoost compares float32 feature values with float32 borders
+        X = X.astype(np.float32)
+        nan_as_true = self.arrays.get('nan_as_true') if self.meta.get('nan_as_true') else None
+        leaf = np.zeros((len(X), n_trees), dtype=np.int32)
+        for level in range(depth):
+            values = np.take(X, split_feature[:, level], axis=1)
+            bits = values > split_border[:, level]
+            if nan_as_true is not None:
+                bits |= np.isnan(values) & nan_as_true[:, level]
+            leaf |= bits.view(np.uint8).astype(np.int32) << level
+
+        # Flat index into the (trees x leaves) table
+        leaf += np.arange(n_trees) * leaf_values.shape[1]
+        raw = np.take(leaf_values, leaf).sum(axis=1)
+        return self.meta['scale'] * raw + self.meta['bias']
+
+    def _predict_tree(self, X):
+        feature = self.arrays['feature']
+        threshold = self.arrays['threshold']
+        left = self.arrays['left']
+        right = self.arrays['right']
+        value = self.arrays['value']
+        n_trees = feature.shape[0]
+
+        # scikit-learn trees evaluate float32 inputs against float64 thresholds
+        X = X.astype(np.float32).astype(np.float64)
+        # Node ids (and the exported child ids) index the flattened (trees x nodes)
+        # tables, so every lookup is a single np.take
+        feature, threshold, value = feature.ravel(), threshold.ravel(), value.ravel()
+        left, right = left.ravel(), right.ravel()
+        offsets = np.arange(n_trees) * self.arrays['feature'].shape[1]
+        row_offsets = (np.arange(len(X)) * X.shape[1])[:, None]
+        flat_X = X.ravel()
+
+        node = np.broadcast_to(offsets, (len(X), n_trees)).copy()
+        # Leaves point at themselves, so walking max_depth levels ends on every row's leaf
+        for _ in range(self.meta['max_depth']):
+            go_left = np.take(flat_X, row_offsets + np.take(feature, node)) <= np.take(threshold, node)
+            node = np.where(go_left, np.take(left, node), np.take(right, node))
+
+        leaf_sum = np.take(value, node).sum(axis=1)
+        if self.meta['aggregation'] == 'mean':
+            return leaf_sum / n_trees
+        return self.meta['init'] + self.meta['learning_rate'] * leaf_sum
@@ -0,0 +1,219 @@
+import math
+import json
+import numpy as np
+from src.Airbnb.pipelines.Feature_schema import NUMERICAL_COLUMNS, FEATURE_DTYPE, normalise_records
+
+
+class FastFeatureEncoder:
+    """
+    Compiled replacement for preprocessor.transform on plain dict records.
+
+    The fitted statistics (imputer fill values, scaler means/scales and encoder
+    category tables) are read out of the ColumnTransformer once; encoding a
+    record is then a handful of dict lookups and float operations writing into
+    a preallocated NumPy row. Output matches preprocessor.transform exactly.
+    """
+
+    def __init__(self, numeric_blocks, ordinal_blocks, onehot_blocks, n_features, dtype=np.float64):
+        # numeric_blocks: [(offset, columns, fill, mean, scale)]
+        # ordinal_blocks: [(offset, columns, fill, tables, unknown)]
+        # onehot_blocks: [(offset, columns, fill, tables, ignore_unknown)]
+        self.numeric_blocks = numeric_blocks
+        self.ordinal_blocks = ordinal_blocks
+        self.onehot_blocks = onehot_blocks
+        self.n_features = n_features
+        self.dtype = np.dtype(dtype)
+
+    @classmethod
+    def from_preprocessor(cls, preprocessor, dtype=np.float64):
+        """Compile a fitted ColumnTransformer (imputer/scaler/ordinal/one-hot pipelines)."""
+        numeric_blocks, ordinal_blocks, onehot_blocks = [], [], []
+        offset = 0
+
+        for name, transformer, columns in preprocessor.transformers_:
+            if name == 'remainder':
+                if transformer != 'drop':
+                    raise ValueError("FastFeatureEncoder only supports remainder='drop'")
+                continue
+            columns = [str(col) for col in columns]
+            steps = [step for _, step in transformer.steps] if hasattr(transformer, 'steps') else [transformer]
+            kinds = [type(step).__name__ for step in steps]
+            n = len(columns)
+
+            fill = [None] * n
+            if kinds and kinds[0] == 'SimpleImputer':
+                imputer = steps.pop(0)
+                kinds.pop(0)
+                if len(imputer.statistics_) != n:
+                    raise ValueError(f"Imputer in '{name}' drops empty features")
+                fill = [_to_python(value) for value in imputer.statistics_]
+
+            if kinds == ['StandardScaler'] or kinds == []:
+                mean, scale = _scaler_params(steps[0] if steps else None, n)
+                fill = [math.nan if value is None else float(value) for value in fill]
+                numeric_blocks.append((offset, columns, fill, mean, scale))
+                offset += n
+
+            elif kinds in (['OrdinalEncoder'], ['OrdinalEncoder', 'StandardScaler']):
+                encoder = steps[0]
+                mean, scale = _scaler_params(steps[1] if len(steps) > 1 else None, n)
+                if encoder.handle_unknown == 'use_encoded_value':
+                    unknown = [(float(encoder.unknown_value) - mean[j]) / scale[j] for j in range(n)]
+                else:
+                    unknown = [None] * n
+                tables = []
+                for j, categories in enumerate(encoder.categories_):
+                    # Scaled value per category, computed with the same float64 operations as the scaler
+                    tables.append({_to_python(cat): (float(code) - mean[j]) / scale[j]
+                                   for code, cat in enumerate(categories)})
+                ordinal_blocks.append((offset, columns, fill, tables, unknown))
+                offset += n
+
+            elif kinds == ['OneHotEncoder']:
+                encoder = steps[0]
+                if encoder.drop_idx_ is not None or getattr(encoder, '_infrequent_enabled', False):
+                    raise ValueError("FastFeatureEncoder does not support dropped or infrequent categories")
+                tables = []
+                for categories in encoder.categories_:
+                    tables.append({_to_python(cat): offset + k for k, cat in enumerate(categories)})
+                    offset += len(categories)
+                onehot_blocks.append((None, columns, fill, tables, encoder.handle_unknown != 'error'))
+
+            else:
+                raise ValueError(f"Unsupported pipeline in '{name}': {kinds}")
+
+        return cls(numeric_blocks, ordinal_blocks, onehot_blocks, offset, dtype)
+
+    def to_dict(self):
+        """JSON-serialisable form; category tables are stored as [category, value] pairs to keep their types."""
+        return {
+            'n_features': self.n_features,
+            'dtype': self.dtype.name,
+            'numeric_blocks': [list(block) for block in self.numeric_blocks],
+            'ordinal_blocks': [[offset, columns, fill, [list(table.items()) for table in tables], unknown]
+                               for offset, columns, fill, tables, unknown in self.ordinal_blocks],
+            'onehot_blocks': [[offset, columns, fill, [list(table.items()) for table in tables], ignore_unknown]
+                              for offset, columns, fill, tables, ignore_unknown in self.onehot_blocks]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        numeric_blocks = [tuple(block) for block in data['numeric_blocks']]
+        ordinal_blocks = [(offset, columns, fill, [dict(map(tuple, table)) for table in tables], unknown)
+                          for offset, columns, fill, tables, unknown in data['ordinal_blocks']]
+        onehot_blocks = [(offset, columns, fill, [dict(map(tuple, table)) for table in tables], ignore_unknown)
+                         for offset, columns, fill, tables, ignore_unknown in data['onehot_blocks']]
+        return cls(numeric_blocks, ordinal_blocks, onehot_blocks, data['n_features'], np.dtype(data['dtype']))
+
+    def save(self, file_path):
+        with open(file_path, 'w') as file_obj:
+            json.dump(self.to_dict(), file_obj)
+
+    @classmethod
+    def load(cls, file_path):
+        """Load a saved encoder; needs neither scikit-learn nor pandas."""
+        with open(file_path) as file_obj:
+            return cls.from_dict(json.load(file_obj))
+
+    @property
+    def handles_unknown(self):
+        """True if unknown categories are encoded rather than rejected."""
+        ordinal = all(value is not None for block in self.ordinal_blocks for value in block[4])
+        onehot = all(block[4] for block in self.onehot_blocks)
+        return ordinal and onehot
+
+    def categories(self):
+        """Known categories per categorical input column."""
+        known = {}
+        for _, columns, _, tables, _ in self.ordinal_blocks + self.onehot_blocks:
+            for col, table in zip(columns, tables):
+                known[col] = list(table)
+        return known
+
+    def _fill_row(self, record, row):
+        for offset, columns, fill, mean, scale in self.numeric_blocks:
+            for j, col in enumerate(columns):
+                value = record.get(col)
+                x = math.nan if value is None else float(value)
+                if x != x:
+                    x = fill[j]
+                row[offset + j] = (x - mean[j]) / scale[j]
+
+        for offset, columns, fill, tables, unknown in self.ordinal_blocks:
+            for j, col in enumerate(columns):
+                value = _category(record.get(col), fill[j])
+                encoded = tables[j].get(value, unknown[j])
+                if encoded is None:
+                    raise ValueError(f"Found unknown category {value!r} in column '{col}'")
+                row[offset + j] = encoded
+
+        for _, columns, fill, tables, ignore_unknown in self.onehot_blocks:
+            for j, col in enumerate(columns):
+                value = _category(record.get(col), fill[j])
+                position = tables[j].get(value)
+                if position is not None:
+                    row[position] = 1.0
+                elif not ignore_unknown:
+                    raise ValueError(f"Found unknown category {value!r} in column '{col}'")
+
+    def encode(self, record):
+        """Encode one record into a (1, n_features) array."""
+        row = np.zeros((1, self.n_features), dtype=self.dtype)
+        self._fill_row(record, row[0])
+        return row
+
+    def encode_many(self, records):
+        """Encode a list of records into a (n, n_features) array."""
+        matrix = np.zeros((len(records), self.n_features), dtype=self.dtype)
+        for i, record in enumerate(records):
+            self._fill_row(record, matrix[i])
+        return matrix
+
+    def check_parity(self, preprocessor, frame):
+        """True if encoding the rows of frame matches preprocessor.transform exactly."""
+        expected = np.asarray(preprocessor.transform(frame), dtype=self.dtype)
+        actual = self.encode_many(frame.to_dict(orient='records'))
+        return expected.shape == actual.shape and np.array_equal(expected, actual)
+
+
+def compile_encoder(preprocessor, dtype=FEATURE_DTYPE):
+    """
+    Compile the fast single-row encoder and verify it against preprocessor.transform
+    (cast to dtype) on rows covering every known category plus missing values.
+    Raises ValueError when the two disagree.
+    """
+    encoder = FastFeatureEncoder.from_preprocessor(preprocessor, dtype)
+    categories = encoder.categories()
+    width = max([len(values) for values in categories.values()] + [1])
+    records = [{}]
+    for k in range(width):
+        record = {col: values[k % len(values)] for col, values in categories.items()}
+        record.update({col: (k + 1) * 1.5 for col in NUMERICAL_COLUMNS})
+        records.append(record)
+    if encoder.handles_unknown:
+        records.append({col: 'unknown' for col in categories})
+    frame, _ = normalise_records(records)
+    if not encoder.check_parity(preprocessor, frame):
+        raise ValueError("Fast feature encoder does not match the preprocessor")
+    return encoder
+
+
+def _scaler_params(scaler, n):
+    if scaler is None:
+        return [0.0] * n, [1.0] * n
+    if type(scaler).__name__ != 'StandardScaler':
+        raise ValueError(f"Unsupported scaler: {type(scaler).__name__}")
+    mean = [0.0] * n if scaler.mean_ is None else [float(v) for v in scaler.mean_]
+    scale = [1.0] * n if scaler.scale_ is None else [float(v) for v in scaler.scale_]
+    return mean, scale
+
+
+def _to_python(value):
+    # np.str_/np.float64 -> str/float so lookups hash like plain request values
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _category(value, fill):
+    if value is None or (isinstance(value, float) and value != value):
+        return fill
+    return value
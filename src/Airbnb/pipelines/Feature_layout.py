@@ -0,0 +1,92 @@
+import os
+import json
+from src.Airbnb.pipelines.Compact_model import file_digest
+from src.Airbnb.pipelines.Geo_index import GEO_FEATURES, GeoIndex, GeoIndexConfig, index_digest, model_feature_count
+from src.Airbnb.pipelines.Amenities_encoder import AmenitiesEncoder, AmenitiesConfig
+
+# The model's input columns as recorded at training time: its blocks in order
+# (the preprocessor's output, then the geo features, then the amenity columns),
+# their widths and the digests of the geo index and amenity vocabulary they were
+# built from. It is written to training_metrics.json (with the digest of the
+# Model.pkl it describes) and to the compact model's meta.json. Serving loads the
+# geo index and vocabulary from it and checks them against their digests, so a
+# stale amenities.json or geo_index is an error rather than a guess from column
+# counts. NumPy and json only, so api/index.py can use it without pandas.
+
+LAYOUT_KEY = 'feature_layout'
+BLOCK_ORDER = ['preprocessor', 'geo', 'amenities']
+
+
+def build_feature_layout(encoded_features, geo_index_dir=None, vocabulary_path=None):
+    """
+    Layout of a model trained on the preprocessor's encoded_features columns,
+    followed by the geo features of the index in geo_index_dir and the amenity
+    columns of the vocabulary in vocabulary_path (None: block not used).
+    """
+    blocks = [{'name': 'preprocessor', 'width': int(encoded_features)}]
+    if geo_index_dir is not None:
+        blocks.append({'name': 'geo', 'width': len(GEO_FEATURES), 'features': list(GEO_FEATURES),
+                       'digest': index_digest(geo_index_dir)})
+    if vocabulary_path is not None:
+        blocks.append({'name': 'amenities', 'width': AmenitiesEncoder.load(vocabulary_path).size,
+                       'digest': file_digest(vocabulary_path)})
+    return {'blocks': blocks, 'n_features': sum(block['width'] for block in blocks)}
+
+
+def read_feature_layout(training_metrics_path, model_path):
+    """The layout recorded in training_metrics.json, or None when it is missing or was written for another Model.pkl."""
+    try:
+        with open(training_metrics_path) as file_obj:
+            metrics = json.load(file_obj)
+    except (OSError, ValueError):
+        return None
+    layout = metrics.get(LAYOUT_KEY)
+    if layout is None or not os.path.exists(model_path) or metrics.get('model_digest') != file_digest(model_path):
+        return None
+    return layout
+
+
+def load_feature_blocks(layout, model, encoded_features, geo_config: GeoIndexConfig = None,
+                        amenities_config: AmenitiesConfig = None):
+    """
+    (geo_index, amenities) the model was trained with, each None when its block
+    is not in the layout. Raises when the layout does not match the model or the
+    preprocessor, or the index / vocabulary on disk is not the recorded one.
+    Without a layout (artifacts from before it was recorded) the model must take
+    the encoded features only.
+    """
+    geo_config = geo_config or GeoIndexConfig()
+    amenities_config = amenities_config or AmenitiesConfig()
+    expected = model_feature_count(model)
+    if layout is None:
+        if expected is not None and expected != encoded_features:
+            raise ValueError(f"Model expects {expected} features, the preprocessor produces {encoded_features} "
+                             f"and no feature layout was recorded")
+        return None, None
+
+    blocks = {block['name']: block for block in layout['blocks']}
+    names = [block['name'] for block in layout['blocks']]
+    if names != [name for name in BLOCK_ORDER if name in blocks]:
+        raise ValueError(f"Unsupported feature block order {names}")
+    if blocks['preprocessor']['width'] != encoded_features:
+        raise ValueError(f"Feature layout records {blocks['preprocessor']['width']} encoded features, "
+                         f"the preprocessor produces {encoded_features}")
+    if expected is not None and expected != layout['n_features']:
+        raise ValueError(f"Model expects {expected} features, its feature layout records {layout['n_features']}")
+
+    geo_index = amenities = None
+    if 'geo' in blocks:
+        if blocks['geo']['features'] != GEO_FEATURES:
+            raise ValueError(f"Model was trained with geo features {blocks['geo']['features']}, serving computes {GEO_FEATURES}")
+        if index_digest(geo_config.index_dir) != blocks['geo']['digest']:
+            raise ValueError(f"Geo index in {geo_config.index_dir} is not the one the model was trained with")
+        geo_index = GeoIndex.load(geo_config.index_dir)
+    if 'amenities' in blocks:
+        path = amenities_config.vocabulary_path
+        if not os.path.exists(path) or file_digest(path) != blocks['amenities']['digest']:
+            raise ValueError(f"Amenity vocabulary {path} is not the one the model was trained with")
+        amenities = AmenitiesEncoder.load(path)
+        if amenities.size != blocks['amenities']['width']:
+            raise ValueError(f"Amenity vocabulary has {amenities.size} names, the layout records "
+                             f"{blocks['amenities']['width']}")
+    return geo_index, amenities
@@ -0,0 +1,261 @@
+import os
+import math
+
+# numpy, pandas and the vectorized cleaners are imported inside normalise_records:
+# the single-record path below is plain Python, which keeps serverless cold
+# starts (api/index.py) free of the pandas import.
+
+# dtype of the transformed feature matrices, from training through inference.
+# float32 halves their memory; the tree models compare features in float32 anyway
+FEATURE_DTYPE = os.environ.get("AIRBNB_FEATURE_DTYPE", "float32")
+
+# Column order must match the order used during training
+NUMERICAL_COLUMNS = ['amenities', 'accommodates', 'bathrooms', 'latitude', 'longitude',
+                     'host_response_rate', 'number_of_reviews', 'review_scores_rating', 'bedrooms', 'beds']
+CATEGORICAL_COLUMNS = ['property_type', 'room_type', 'bed_type', 'cancellation_policy',
+                       'cleaning_fee', 'city', 'host_has_profile_pic', 'host_identity_verified', 'instant_bookable']
+FEATURE_COLUMNS = NUMERICAL_COLUMNS + CATEGORICAL_COLUMNS
+
+# Normalised records also carry the request's amenity names (sorted tuple), or
+# None when amenities was given as a count; used by the amenity vocabulary encoder
+AMENITY_LIST = 'amenity_list'
+
+# Numerical inputs that are truncated to whole numbers
+INTEGER_COLUMNS = {'amenities', 'accommodates', 'host_response_rate', 'number_of_reviews',
+                   'review_scores_rating', 'bedrooms', 'beds'}
+
+# Values used when a field is missing from the request
+DEFAULTS = {
+    'amenities': 0,
+    'accommodates': 1,
+    'bathrooms': 1.0,
+    'latitude': 0.0,
+    'longitude': 0.0,
+    'host_response_rate': 100,
+    'number_of_reviews': 0,
+    'review_scores_rating': 90,
+    'bedrooms': 1,
+    'beds': 1,
+    'property_type': 'Apartment',
+    'room_type': 'Entire home/apt',
+    'bed_type': 'Real Bed',
+    'cancellation_policy': 'flexible',
+    'cleaning_fee': '1',
+    'city': 'NYC',
+    'host_has_profile_pic': '1',
+    'host_identity_verified': '1',
+    'instant_bookable': '0'
+}
+
+# Map form values to expected data format
+CLEANING_FEE_MAP = {'1': 'True', '0': 'False', 'True': 'True', 'False': 'False'}
+FLAG_MAP = {'1': 't', '0': 'f', 't': 't', 'f': 'f', 'True': 't', 'False': 'f'}
+
+# Map city names to match training data
+CITY_MAP = {
+    'Boston': 'Boston',
+    'Chicago': 'Chicago',
+    'Washington, D.C.': 'DC',
+    'DC': 'DC',
+    'Los Angeles': 'LA',
+    'LA': 'LA',
+    'New York': 'NYC',
+    'NYC': 'NYC',
+    'San Francisco': 'SF',
+    'SF': 'SF'
+}
+
+# Map room types to match training data
+ROOM_TYPE_MAP = {
+    'Shared Room': 'Shared room',
+    'Private Room': 'Private room',
+    'Entire Home/Apt': 'Entire home/apt',
+    'Shared room': 'Shared room',
+    'Private room': 'Private room',
+    'Entire home/apt': 'Entire home/apt'
+}
+
+# Map cancellation policy to match training data
+CANCELLATION_MAP = {
+    'Flexible': 'flexible',
+    'Moderate': 'moderate',
+    'Strict': 'strict',
+    'Super strict': 'super_strict_30',
+    'Advanced Super Strict': 'super_strict_60',
+    'flexible': 'flexible',
+    'moderate': 'moderate',
+    'strict': 'strict',
+    'super_strict_30': 'super_strict_30',
+    'super_strict_60': 'super_strict_60'
+}
+
+# (mapping, fallback) per categorical column; a fallback of None keeps unmapped values as they are
+CATEGORICAL_MAPS = {
+    'room_type': (ROOM_TYPE_MAP, None),
+    'cancellation_policy': (CANCELLATION_MAP, None),
+    'cleaning_fee': (CLEANING_FEE_MAP, 'True'),
+    'city': (CITY_MAP, None),
+    'host_has_profile_pic': (FLAG_MAP, 't'),
+    'host_identity_verified': (FLAG_MAP, 't'),
+    'instant_bookable': (FLAG_MAP, 'f')
+}
+
+
+def _is_blank(column):
+    return column.isna() | column.astype(str).str.strip().eq('')
+
+
+def _blank(value):
+    if value is None:
+        return True
+    if isinstance(value, float):
+        return value != value
+    return isinstance(value, str) and not value.strip()
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return float('nan')
+
+
+def response_rate_value(value):
+    """Single-value counterpart of Feature_cleaning.clean_response_rate."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    try:
+        return float(str(value).replace('%', '').strip())
+    except ValueError:
+        return float('nan')
+
+
+def amenities_count_value(value):
+    """A count (or numeric string) passes through; an amenity list is counted like Feature_cleaning.count_amenities."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    if isinstance(value, (list, tuple)):
+        return len(value)
+    text = str(value)
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    if text in ('', '{}'):
+        return 0
+    return text.count(',') + 1
+
+
+def amenity_names(value):
+    """
+    Amenity names of a JSON list or a '{TV,"Wireless Internet"}' / 'TV,Wifi'
+    string, as a sorted tuple; None for counts and blanks.
+    """
+    if isinstance(value, (list, tuple)):
+        names = [str(name) for name in value]
+    elif isinstance(value, str) and not _blank(value) and not math.isfinite(_number(value)):
+        names = value.strip().strip('{}').split(',')
+    else:
+        return None
+    return tuple(sorted({name.strip().strip('"').strip() for name in names} - {''}))
+
+
+# Scalar parser per numerical column; anything that yields NaN is invalid
+NUMBER_PARSERS = {col: _number for col in NUMERICAL_COLUMNS}
+NUMBER_PARSERS['host_response_rate'] = response_rate_value
+NUMBER_PARSERS['amenities'] = amenities_count_value
+
+
+def normalise_record(raw, strict=False):
+    """
+    Validate and normalise one request (JSON dict, form or CustomData fields) into a
+    dict keyed by FEATURE_COLUMNS, in the column order the preprocessor expects.
+
+    Missing fields take DEFAULTS. Invalid numbers raise ValueError when strict,
+    otherwise they fall back to the default as well. amenities may be a count or
+    a list; the list is kept under AMENITY_LIST.
+    """
+    record = {}
+    for col in NUMERICAL_COLUMNS:
+        value = raw.get(col)
+        if _blank(value):
+            record[col] = DEFAULTS[col]
+            continue
+        number = NUMBER_PARSERS[col](value)
+        if not math.isfinite(number):
+            if strict:
+                raise ValueError(f"Invalid value for '{col}': {value!r}")
+            number = DEFAULTS[col]
+        record[col] = int(number) if col in INTEGER_COLUMNS else float(number)
+
+    for col in CATEGORICAL_COLUMNS:
+        value = raw.get(col)
+        value = DEFAULTS[col] if _blank(value) else str(value)
+        if col in CATEGORICAL_MAPS:
+            mapping, fallback = CATEGORICAL_MAPS[col]
+            value = mapping.get(value, value if fallback is None else fallback)
+        record[col] = value
+    record[AMENITY_LIST] = amenity_names(raw.get('amenities'))
+    return record
+
+
+def normalise_records(records):
+    """
+    Validate and normalise a list of request records column-wise.
+
+    Returns a DataFrame with FEATURE_COLUMNS and AMENITY_LIST (one row per
+    record, same index as the input list) and a dict of {row index: error message} for rows that
+    could not be normalised.
+    """
+    import numpy as np
+    import pandas as pd
+    from src.Airbnb.components.Feature_cleaning import clean_response_rate, count_amenities
+
+    errors = {}
+    rows = []
+    for i, record in enumerate(records):
+        if isinstance(record, dict):
+            rows.append(record)
+        else:
+            errors[i] = 'Record must be a JSON object'
+            rows.append({})
+
+    raw = pd.DataFrame(rows, columns=FEATURE_COLUMNS, dtype=object)
+    features = {}
+
+    for col in NUMERICAL_COLUMNS:
+        column = raw[col]
+        blank = _is_blank(column)
+        if col == 'host_response_rate':
+            # Accepts 93, "93" and "93%"
+            values = clean_response_rate(column.where(~blank))
+        elif col == 'amenities':
+            # Accepts a count, a '{TV,Wifi}' / 'TV,Wifi' amenity list or a JSON list
+            is_list = column.map(lambda value: isinstance(value, (list, tuple)))
+            scalar = column.where(~blank & ~is_list)
+            values = pd.to_numeric(scalar, errors='coerce')
+            text = scalar.where(values.isna())
+            values = values.fillna(count_amenities(text).where(text.notna()))
+            values = values.fillna(column[is_list].map(len))
+            features[AMENITY_LIST] = column.map(amenity_names)
+        else:
+            values = pd.to_numeric(column.where(~blank), errors='coerce')
+        invalid = ~np.isfinite(values.astype(float)) & ~blank
+        for i in invalid[invalid].index:
+            errors.setdefault(i, f"Invalid value for '{col}': {column[i]!r}")
+        values = values.where(~invalid).fillna(DEFAULTS[col]).astype(float)
+        if col in INTEGER_COLUMNS:
+            values = np.trunc(values)
+        features[col] = values
+
+    for col in CATEGORICAL_COLUMNS:
+        column = raw[col]
+        blank = _is_blank(column)
+        values = column.where(~blank, DEFAULTS[col]).astype(str)
+        if col in CATEGORICAL_MAPS:
+            mapping, fallback = CATEGORICAL_MAPS[col]
+            mapped = values.map(mapping)
+            values = mapped.fillna(values if fallback is None else fallback)
+        features[col] = values
+
+    return pd.DataFrame(features, columns=FEATURE_COLUMNS + [AMENITY_LIST]), errors
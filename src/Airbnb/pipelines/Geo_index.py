@@ -0,0 +1,302 @@
+import os
+import json
+import math
+import hashlib
+import numpy as np
+from dataclasses import dataclass
+
+# Location features from a spatial index over the training listings: the median
+# log price of the k nearest listings and the number of listings within
+# radius_km. Listings are bucketed into a lat/lon grid whose cells are about
+# radius_km wide and stored sorted by cell, so a lookup is a few searchsorted
+# calls plus haversine distances to the listings in the surrounding cells; the
+# ring of cells searched grows until the k nearest are guaranteed to be inside
+# it. Locations far from every listing are answered from the distances to the
+# occupied cells' centres instead. Arrays are .npy files memory-mapped at serve
+# time; NumPy and json only, so api/index.py can use the index without pandas.
+# Longitude does not wrap at +-180.
+
+GEO_FEATURES = ['geo_knn_log_price', 'geo_density']
+META_FILE = 'meta.json'
+ARRAYS = ['cell_keys', 'cell_start', 'lat', 'lon', 'value', 'row_id']
+EARTH_RADIUS_KM = 6371.0088
+# Beyond this many rings of cells the search switches to the cell centres
+MAX_RING = 64
+
+
+@dataclass
+class GeoIndexConfig:
+    index_dir: str = os.path.join('Artifacts', 'geo_index')
+    # Training: add GEO_FEATURES to the feature matrices (serving follows the model)
+    enabled: bool = os.environ.get("AIRBNB_GEO_FEATURES", "false").lower() == "true"
+    k: int = int(os.environ.get("AIRBNB_GEO_K", "10"))
+    radius_km: float = float(os.environ.get("AIRBNB_GEO_RADIUS_KM", "1.0"))
+
+
+class GeoIndex:
+    def __init__(self, meta, arrays):
+        self.meta = meta
+        self.arrays = arrays
+        self.k = meta['k']
+        self.radius_km = meta['radius_km']
+        self.cell_deg = meta['cell_deg']
+        self.lat_cells = meta['lat_cells']
+        self.lon_cells = meta['lon_cells']
+        self.cell_rad = math.radians(self.cell_deg)
+        self._centres = None
+
+    @classmethod
+    def build(cls, latitudes, longitudes, values, k=10, radius_km=1.0):
+        """Index the listings with finite coordinates and value; row_id is the position in the inputs."""
+        lat = np.asarray(latitudes, dtype=np.float64)
+        lon = np.asarray(longitudes, dtype=np.float64)
+        value = np.asarray(values, dtype=np.float64)
+        keep = np.isfinite(lat) & np.isfinite(lon) & np.isfinite(value)
+        row_id = np.flatnonzero(keep)
+        lat, lon, value = lat[keep], lon[keep], value[keep]
+        if len(lat) == 0:
+            raise ValueError("No listings with coordinates to index")
+
+        cell_deg = radius_km / math.radians(EARTH_RADIUS_KM)
+        meta = {'k': int(k), 'radius_km': float(radius_km), 'cell_deg': cell_deg,
+                'lat_cells': int(math.ceil(180.0 / cell_deg)) + 1,
+                'lon_cells': int(math.ceil(360.0 / cell_deg)) + 1,
+                'points': int(len(lat)), 'features': GEO_FEATURES}
+        index = cls(meta, {})
+        keys = index._cell_keys(*index._cells(lat, lon))
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        cell_keys, first = np.unique(keys, return_index=True)
+        index.arrays = {
+            'cell_keys': cell_keys,
+            'cell_start': np.append(first, len(keys)).astype(np.int64),
+            'lat': np.radians(lat[order]),
+            'lon': np.radians(lon[order]),
+            'value': value[order],
+            'row_id': row_id[order].astype(np.int64)
+        }
+        return index
+
+    def save(self, index_dir):
+        # Build next to the target and swap it in, so readers never see a partial index
+        import shutil
+        import tempfile
+        parent = os.path.dirname(os.path.abspath(index_dir))
+        os.makedirs(parent, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix='.geo_index_', dir=parent)
+        for name in ARRAYS:
+            np.save(os.path.join(staging, f'{name}.npy'), self.arrays[name])
+        with open(os.path.join(staging, META_FILE), 'w') as file_obj:
+            json.dump(self.meta, file_obj, indent=2)
+        if os.path.exists(index_dir):
+            shutil.rmtree(index_dir)
+        os.replace(staging, index_dir)
+
+    @classmethod
+    def load(cls, index_dir, mmap=True):
+        with open(os.path.join(index_dir, META_FILE)) as file_obj:
+            meta = json.load(file_obj)
+        arrays = {name: np.load(os.path.join(index_dir, f'{name}.npy'), mmap_mode='r' if mmap else None)
+                  for name in ARRAYS}
+        return cls(meta, arrays)
+
+    def row_ids(self, latitudes, longitudes, values):
+        """
+        row_id of the indexed listing with exactly these coordinates and value, per
+        row, or -1; the exclude argument of query_many for rows of a split the index
+        was built from (or, in incremental runs, reused for). Needs pandas.
+        """
+        import pandas as pd
+        key = ['lat', 'lon', 'value']
+        points = pd.DataFrame({'lat': np.asarray(self.arrays['lat']), 'lon': np.asarray(self.arrays['lon']),
+                               'value': np.asarray(self.arrays['value']), 'row_id': np.asarray(self.arrays['row_id'])})
+        # Identical listings have identical neighbours, so excluding either one is the same
+        points = points.drop_duplicates(key)
+        rows = pd.DataFrame({'lat': np.radians(np.asarray(latitudes, dtype=np.float64)),
+                             'lon': np.radians(np.asarray(longitudes, dtype=np.float64)),
+                             'value': np.asarray(values, dtype=np.float64)})
+        return rows.merge(points, how='left', on=key)['row_id'].fillna(-1).to_numpy(dtype=np.int64)
+
+    def _cells(self, lat, lon):
+        lat_cell = np.clip(np.floor((np.asarray(lat) + 90.0) / self.cell_deg), 0, self.lat_cells - 1)
+        lon_cell = np.clip(np.floor((np.asarray(lon) + 180.0) / self.cell_deg), 0, self.lon_cells - 1)
+        return lat_cell.astype(np.int64), lon_cell.astype(np.int64)
+
+    def _cell_keys(self, lat_cell, lon_cell):
+        return lat_cell * self.lon_cells + lon_cell
+
+    def _candidates(self, lat_cell, lon_cell, ring):
+        """Positions of the listings in the (2 ring + 1)^2 cells around a cell."""
+        rows = np.arange(max(lat_cell - ring, 0), min(lat_cell + ring, self.lat_cells - 1) + 1)
+        low = self._cell_keys(rows, max(lon_cell - ring, 0))
+        high = self._cell_keys(rows, min(lon_cell + ring, self.lon_cells - 1))
+        cell_keys, cell_start = self.arrays['cell_keys'], self.arrays['cell_start']
+        starts = cell_start[np.searchsorted(cell_keys, low, side='left')]
+        ends = cell_start[np.searchsorted(cell_keys, high, side='right')]
+        spans = [np.arange(start, end) for start, end in zip(starts.tolist(), ends.tolist()) if end > start]
+        return np.concatenate(spans) if spans else np.empty(0, dtype=np.int64)
+
+    def _covered_km(self, lat_cell, ring):
+        """Distance from any point of the centre cell that is guaranteed to lie inside the ring."""
+        edge = max(abs(-90.0 + (lat_cell - ring) * self.cell_deg), abs(-90.0 + (lat_cell + ring + 1) * self.cell_deg))
+        across = math.asin(min(1.0, math.cos(math.radians(min(edge, 90.0))) * math.sin(min(ring * self.cell_rad, math.pi / 2))))
+        return EARTH_RADIUS_KM * min(ring * self.cell_rad, across)
+
+    def query(self, latitude, longitude):
+        """GEO_FEATURES of one location."""
+        return self.query_many([latitude], [longitude])[0]
+
+    def query_many(self, latitudes, longitudes, exclude=None):
+        """
+        (n, 2) array of GEO_FEATURES; NaN for missing coordinates. exclude holds,
+        per query, a row_id that must not count as its own neighbour (training
+        rows querying the index built from them), or -1.
+        """
+        lat = np.asarray(latitudes, dtype=np.float64).ravel()
+        lon = np.asarray(longitudes, dtype=np.float64).ravel()
+        exclude = np.full(len(lat), -1, dtype=np.int64) if exclude is None else np.asarray(exclude, dtype=np.int64)
+        features = np.full((len(lat), len(GEO_FEATURES)), np.nan)
+        valid = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+        if len(valid) == 0:
+            return features
+        lat_cell, lon_cell = self._cells(lat[valid], lon[valid])
+        keys = self._cell_keys(lat_cell, lon_cell)
+        order = np.argsort(keys, kind='stable')
+        boundaries = np.flatnonzero(np.diff(keys[order])) + 1
+        for group in np.split(order, boundaries):
+            self._query_cell(int(lat_cell[group[0]]), int(lon_cell[group[0]]), valid[group], lat, lon, exclude, features)
+        return features
+
+    def _query_cell(self, lat_cell, lon_cell, queries, lat, lon, exclude, features):
+        # Smallest ring that holds every listing within radius_km, then doubled until it holds the k nearest
+        ring = 1
+        while self._covered_km(lat_cell, ring) < self.radius_km and ring < MAX_RING:
+            ring += 1
+        pending = queries
+        while len(pending) and ring <= MAX_RING:
+            candidates = self._candidates(lat_cell, lon_cell, ring)
+            pending = self._score(pending, candidates, lat, lon, exclude, features, self._covered_km(lat_cell, ring))
+            ring *= 2
+        for query in pending:
+            self._score(np.array([query]), self._far_candidates(lat[query], lon[query]), lat, lon, exclude, features)
+
+    def _score(self, pending, candidates, lat, lon, exclude, features, covered_km=None):
+        """
+        Fill features for the pending queries whose k nearest listings are within
+        covered_km (all of them when None); returns the queries left pending.
+        """
+        k = min(self.k, len(candidates))
+        if k == 0:
+            return pending
+        distance = self._haversine_km(lat[pending], lon[pending], candidates)
+        distance[self.arrays['row_id'][candidates][None, :] == exclude[pending][:, None]] = np.inf
+        nearest = np.argpartition(distance, k - 1, axis=1)[:, :k]
+        near = np.take_along_axis(distance, nearest, axis=1)
+        if covered_km is None:
+            done = np.ones(len(pending), dtype=bool)
+        else:
+            done = near.max(axis=1) <= covered_km
+        if done.any():
+            values = np.asarray(self.arrays['value'])[candidates[nearest[done]]]
+            near = near[done]
+            if np.isfinite(near).all():
+                features[pending[done], 0] = np.median(values, axis=1)
+            else:
+                # Fewer than k other listings in the whole index
+                features[pending[done], 0] = np.nanmedian(np.where(np.isfinite(near), values, np.nan), axis=1)
+            features[pending[done], 1] = (distance[done] <= self.radius_km).sum(axis=1)
+        return pending[~done]
+
+    def _far_candidates(self, lat, lon):
+        """
+        Listings that can be among the k nearest of (or within radius_km of) a
+        location far from the data: every listing lies within one cell width of
+        its cell centre, so the cells whose centres are close enough are searched.
+        """
+        if self._centres is None:
+            cell_keys = np.asarray(self.arrays['cell_keys'])
+            centre_lat = -90.0 + (cell_keys // self.lon_cells + 0.5) * self.cell_deg
+            centre_lon = -180.0 + (cell_keys % self.lon_cells + 0.5) * self.cell_deg
+            self._centres = (np.radians(centre_lat), np.radians(centre_lon), np.diff(self.arrays['cell_start']))
+        centre_lat, centre_lon, counts = self._centres
+        a = (np.sin((centre_lat - math.radians(lat)) / 2.0) ** 2
+             + math.cos(math.radians(lat)) * np.cos(centre_lat) * np.sin((centre_lon - math.radians(lon)) / 2.0) ** 2)
+        distance = 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        slack = EARTH_RADIUS_KM * self.cell_rad
+        order = np.argsort(distance)
+        # One spare listing in case the query is itself indexed
+        enough = min(int(np.searchsorted(np.cumsum(counts[order]), self.k + 1)), len(order) - 1)
+        bound = max(distance[order[enough]] + slack, self.radius_km)
+        cells = np.flatnonzero(distance - slack <= bound)
+        cell_start = self.arrays['cell_start']
+        return np.concatenate([np.arange(cell_start[c], cell_start[c + 1]) for c in cells.tolist()])
+
+    def _haversine_km(self, lat, lon, candidates):
+        lat1 = np.radians(lat)[:, None]
+        lon1 = np.radians(lon)[:, None]
+        lat2 = np.asarray(self.arrays['lat'])[candidates][None, :]
+        lon2 = np.asarray(self.arrays['lon'])[candidates][None, :]
+        a = np.sin((lat2 - lat1) / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2
+        return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def index_digest(index_dir):
+    """sha256 over the files of a saved index, or None when there is none."""
+    if not os.path.exists(os.path.join(index_dir, META_FILE)):
+        return None
+    digest = hashlib.sha256()
+    for name in [META_FILE] + [f'{name}.npy' for name in ARRAYS]:
+        with open(os.path.join(index_dir, name), 'rb') as file_obj:
+            for block in iter(lambda: file_obj.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def model_feature_count(model):
+    """Number of input columns a fitted model (or CompactModel) expects, or None."""
+    # An unpickled CatBoostRegressor reports n_features_in_ 0; its feature_names_ are kept
+    names = getattr(model, 'feature_names_', None)
+    if names:
+        return len(names)
+    for attribute in ('n_features_in_', 'n_features'):
+        count = getattr(model, attribute, None)
+        if count:
+            return int(count)
+    return None
+
+
+def append_geo_features(X, latitudes, longitudes, geo_index):
+    """X with GEO_FEATURES appended (X itself when geo_index is None)."""
+    if geo_index is None:
+        return X
+    X = np.asarray(X)
+    extra = geo_index.query_many(latitudes, longitudes)
+    return np.hstack([X, extra.astype(X.dtype)])
+
+
+if __name__ == "__main__":
+    # Build the index from a train split and time single lookups
+    import time
+    import argparse
+    from src.Airbnb.utils.utils import read_dataset
+
+    parser = argparse.ArgumentParser(description="Build the geospatial index from a train split")
+    parser.add_argument("--train", default=os.path.join('Artifacts', 'train_data.csv'))
+    parser.add_argument("--output", default=GeoIndexConfig.index_dir)
+    parser.add_argument("--k", type=int, default=GeoIndexConfig.k)
+    parser.add_argument("--radius-km", type=float, default=GeoIndexConfig.radius_km)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    df = read_dataset(args.train, columns=['latitude', 'longitude', 'log_price'])
+    GeoIndex.build(df['latitude'], df['longitude'], df['log_price'], args.k, args.radius_km).save(args.output)
+    index = GeoIndex.load(args.output)
+    sample = df.dropna().sample(min(args.lookups, len(df.dropna())), random_state=0)
+    seconds = []
+    for lat, lon in zip(sample['latitude'], sample['longitude']):
+        start = time.perf_counter()
+        index.query(lat, lon)
+        seconds.append(time.perf_counter() - start)
+    ms = np.asarray(seconds) * 1000.0
+    print(f"Indexed {index.meta['points']} listings in {len(index.arrays['cell_keys'])} cells to {args.output}; "
+          f"lookup p50 {np.percentile(ms, 50):.3f} ms, p99 {np.percentile(ms, 99):.3f} ms")
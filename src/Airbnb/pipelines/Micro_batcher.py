@@ -0,0 +1,173 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from src.Airbnb.logger import logging
+from src.Airbnb.pipelines.Runtime_metrics import get_metrics
+
+
+@dataclass
+class MicroBatcherConfig:
+    enabled: bool = os.environ.get("AIRBNB_MICROBATCH", "false").lower() == "true"
+    # A batch is flushed when it reaches max_batch_size rows or max_wait_ms after its first row
+    max_batch_size: int = int(os.environ.get("AIRBNB_MICROBATCH_MAX_ROWS", "256"))
+    max_wait_ms: float = float(os.environ.get("AIRBNB_MICROBATCH_WAIT_MS", "2"))
+    # predict() gives up this long after the wait window, so a stuck batch never hangs a request thread
+    timeout_ms: float = float(os.environ.get("AIRBNB_MICROBATCH_TIMEOUT_MS", "5000"))
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-row predictions into one batched call.
+
+    Request threads submit a record and block on a Future; a background thread
+    drains the queue for up to max_wait_ms (or max_batch_size rows), runs
+    predict_fn once on the whole batch and fans the results back out. Every
+    Future of a batch is resolved, with an exception if nothing else.
+    """
+
+    def __init__(self, predict_fn, config: MicroBatcherConfig = None):
+        self.predict_fn = predict_fn
+        self.config = config or MicroBatcherConfig()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+        self.batches_total = 0
+        self.rows_total = 0
+        self.errors_total = 0
+        self.last_batch_size = 0
+        self.max_batch_size_seen = 0
+        self.wait_seconds_total = 0.0
+        self.max_wait_seconds = 0.0
+        self.predict_seconds_total = 0.0
+
+    def _ensure_worker(self):
+        # Threads do not survive a fork, so each gunicorn worker starts its own
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+            self._thread.start()
+
+    def submit(self, record) -> Future:
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((record, future, time.perf_counter()))
+        return future
+
+    def predict(self, record, timeout=None):
+        """Log price of one record; raises concurrent.futures.TimeoutError after timeout seconds."""
+        if timeout is None:
+            timeout = (self.config.max_wait_ms + self.config.timeout_ms) / 1000.0
+        future = self.submit(record)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            # The worker skips it if the batch has not been scored yet
+            future.cancel()
+            raise
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.config.max_wait_ms / 1000.0
+        while len(batch) < self.config.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                logging.info(f"Micro-batch of {len(batch)} rows failed: {e}")
+            finally:
+                for _, future, _ in batch:
+                    _resolve(future, exception=RuntimeError("Micro-batch ended without a prediction for this row"))
+
+    def _run_batch(self, batch):
+        records = [record for record, _, _ in batch]
+        started = time.perf_counter()
+        try:
+            predictions = self.predict_fn(records)
+            if len(predictions) != len(batch):
+                raise ValueError(f"predict_fn returned {len(predictions)} predictions for {len(batch)} rows")
+            values = [float(prediction) for prediction in predictions]
+        except Exception as e:
+            logging.info(f"Micro-batch of {len(batch)} rows failed, retrying row by row: {e}")
+            self.errors_total += 1
+            self._record(batch, started, failed=True)
+            self._run_rows(batch)
+            return
+        self._record(batch, started)
+
+        for (_, future, _), value in zip(batch, values):
+            _resolve(future, value)
+
+    def _run_rows(self, batch):
+        # Isolate the failing record so it does not fail its neighbours
+        for record, future, _ in batch:
+            if future.done():
+                continue
+            try:
+                _resolve(future, float(self.predict_fn([record])[0]))
+            except Exception as e:
+                _resolve(future, exception=e)
+
+    def _record(self, batch, started, failed=False):
+        finished = time.perf_counter()
+        waits = [started - enqueued for _, _, enqueued in batch]
+        metrics = get_metrics()
+        if metrics is not None:
+            metrics.microbatch_ran(len(batch), waits, self._queue.qsize(), failed)
+        self.batches_total += 1
+        self.rows_total += len(batch)
+        self.last_batch_size = len(batch)
+        self.max_batch_size_seen = max(self.max_batch_size_seen, len(batch))
+        self.wait_seconds_total += sum(waits)
+        self.max_wait_seconds = max(self.max_wait_seconds, max(waits))
+        self.predict_seconds_total += finished - started
+
+    def stats(self):
+        batches = max(self.batches_total, 1)
+        rows = max(self.rows_total, 1)
+        return {
+            "queue_depth": self._queue.qsize(),
+            "batches_total": self.batches_total,
+            "rows_total": self.rows_total,
+            "errors_total": self.errors_total,
+            "last_batch_size": self.last_batch_size,
+            "mean_batch_size": round(self.rows_total / batches, 2),
+            "max_batch_size": self.max_batch_size_seen,
+            "mean_wait_ms": round(self.wait_seconds_total / rows * 1000.0, 3),
+            "max_wait_ms": round(self.max_wait_seconds * 1000.0, 3),
+            "mean_predict_ms": round(self.predict_seconds_total / batches * 1000.0, 3)
+        }
+
+
+def _resolve(future, value=None, exception=None):
+    """Set a Future's result (or exception) unless it is already done or was cancelled by a timed-out caller."""
+    if future.done():
+        return
+    try:
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(value)
+    except InvalidStateError:
+        pass
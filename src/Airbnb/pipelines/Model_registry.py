@@ -0,0 +1,170 @@
+import os
+import sys
+import time
+import hashlib
+import threading
+from dataclasses import dataclass
+from src.Airbnb.logger import logging
+from src.Airbnb.utils.utils import load_object
+from src.Airbnb.exception import customexception
+from src.Airbnb.pipelines.Feature_encoder import compile_encoder
+from src.Airbnb.pipelines.Runtime_metrics import get_metrics
+from src.Airbnb.pipelines.Feature_layout import read_feature_layout, load_feature_blocks
+
+
+@dataclass
+class ModelRegistryConfig:
+    preprocessor_path: str = os.path.join("Artifacts", "Preprocessor.pkl")
+    model_path: str = os.path.join("Artifacts", "Model.pkl")
+    # Holds the feature layout (geo / amenity blocks) the model was trained with
+    training_metrics_path: str = os.path.join("Artifacts", "training_metrics.json")
+    # Seconds between two mtime/size checks of the artifact files
+    check_interval: float = float(os.environ.get("AIRBNB_MODEL_CHECK_INTERVAL", "5"))
+
+
+@dataclass(frozen=True)
+class LoadedArtifacts:
+    preprocessor: object
+    model: object
+    # Compiled single-row encoder, None when it does not reproduce the preprocessor
+    encoder: object
+    version: str
+    loaded_at: float
+    load_seconds: float
+    # Spatial index for models trained with the geo features, else None
+    geo_index: object = None
+    # Amenity vocabulary for models trained with the amenity columns, else None
+    amenities: object = None
+
+
+class ModelRegistry:
+    """
+    Loads Preprocessor.pkl and Model.pkl once per process and shares them across
+    requests. The artifact files are polled (mtime/size, then content hash) and a
+    new version is swapped in atomically, so a retrained model is picked up
+    without restarting gunicorn. Artifacts that fail to load are not retried
+    until one of the files changes again.
+    """
+
+    def __init__(self, config: ModelRegistryConfig = None):
+        self.config = config or ModelRegistryConfig()
+        self._lock = threading.Lock()
+        self._current = None
+        self._stat_signature = None
+        # Signature of artifacts that failed to load, and the error
+        self._failed_signature = None
+        self._failed_error = None
+        self._last_check = 0.0
+
+    def _stat(self):
+        signature = []
+        for path in (self.config.preprocessor_path, self.config.model_path):
+            st = os.stat(path)
+            signature.append((st.st_mtime_ns, st.st_size))
+        # Written after Model.pkl, with the feature layout; may not exist (older artifacts)
+        try:
+            st = os.stat(self.config.training_metrics_path)
+            signature.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            signature.append(None)
+        return tuple(signature)
+
+    def _fingerprint(self):
+        return artifacts_version([self.config.preprocessor_path, self.config.model_path])
+
+    def _load(self, version):
+        start = time.perf_counter()
+        preprocessor = load_object(self.config.preprocessor_path)
+        model = load_object(self.config.model_path)
+        encoder = load_encoder(preprocessor)
+        encoded_features = encoder.n_features if encoder is not None else len(preprocessor.get_feature_names_out())
+        layout = read_feature_layout(self.config.training_metrics_path, self.config.model_path)
+        geo_index, amenities = load_feature_blocks(layout, model, encoded_features)
+        load_seconds = time.perf_counter() - start
+        logging.info(f"Model registry loaded artifacts version {version} in {load_seconds:.3f}s",
+                     extra={"always_log": True})
+        metrics = get_metrics()
+        if metrics is not None:
+            metrics.model_loaded(version, load_seconds)
+        return LoadedArtifacts(
+            preprocessor=preprocessor,
+            model=model,
+            encoder=encoder,
+            version=version,
+            loaded_at=time.time(),
+            load_seconds=load_seconds,
+            geo_index=geo_index,
+            amenities=amenities
+        )
+
+    def _refresh(self):
+        # Called with the lock held
+        signature = self._stat()
+        if self._current is not None and signature == self._stat_signature:
+            return
+        if signature == self._failed_signature:
+            # Same broken files as last time: no re-hash, re-unpickle or new log line
+            if self._current is None:
+                raise self._failed_error
+            return
+        try:
+            version = self._fingerprint()
+            if self._current is None or version != self._current.version:
+                self._current = self._load(version)
+        except Exception as e:
+            self._failed_signature, self._failed_error = signature, e
+            raise
+        self._stat_signature = signature
+        self._failed_signature = self._failed_error = None
+
+    def get(self) -> LoadedArtifacts:
+        current = self._current
+        now = time.monotonic()
+        if current is not None and now - self._last_check < self.config.check_interval:
+            return current
+
+        with self._lock:
+            if self._current is not None and now - self._last_check < self.config.check_interval:
+                return self._current
+            self._last_check = now
+            try:
+                self._refresh()
+            except Exception as e:
+                if self._current is None:
+                    raise customexception(e, sys)
+                # Half-written or broken artifacts: keep serving the loaded version
+                logging.info(f"Model registry reload failed, keeping version {self._current.version}: {e}",
+                             extra={"always_log": True})
+            return self._current
+
+
+def artifacts_version(paths):
+    """Short content hash of the artifact files, used as the model version."""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as file_obj:
+            for block in iter(lambda: file_obj.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+def load_encoder(preprocessor):
+    """Compiled fast-path encoder, or None when it cannot reproduce the preprocessor."""
+    try:
+        return compile_encoder(preprocessor)
+    except Exception as e:
+        logging.info(f"Fast feature encoder unavailable, using preprocessor.transform: {e}")
+        return None
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ModelRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry()
+    return _registry
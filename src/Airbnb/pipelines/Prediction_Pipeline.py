@@ -1,30 +1,218 @@
 import os
-import numpy as np
 import sys
+import threading
+import numpy as np
 import pandas as pd
+from dataclasses import dataclass
 from src.Airbnb.logger import logging
-from src.Airbnb.utils.utils import load_object
 from src.Airbnb.exception import customexception
+from src.Airbnb.pipelines.Model_registry import get_registry
+from src.Airbnb.pipelines.Feature_schema import (
+    FEATURE_COLUMNS, FEATURE_DTYPE, AMENITY_LIST, normalise_record, normalise_records
+)
+from src.Airbnb.pipelines.Micro_batcher import MicroBatcher, MicroBatcherConfig
+from src.Airbnb.pipelines.Prediction_cache import PredictionCache, get_cache
+from src.Airbnb.pipelines.Runtime_metrics import get_metrics, timed_stage
+from src.Airbnb.pipelines.Price_grid import PriceGrid, PriceGridConfig
+from src.Airbnb.pipelines.Geo_index import append_geo_features
+from src.Airbnb.pipelines.Amenities_encoder import append_amenity_features
+
+
+@dataclass
+class PredictPipelineConfig:
+    # Rows transformed and scored per vectorized call in predict_many
+    batch_chunk_size: int = int(os.environ.get("AIRBNB_BATCH_CHUNK_SIZE", "4096"))
 
 
 class PredictPipeline:
     def __init__(self):
-        pass
+        self.registry = get_registry()
+        self.predict_pipeline_config = PredictPipelineConfig()
     
     def predict(self, features):
         try:
-            preprocessor_path = os.path.join("Artifacts", "Preprocessor.pkl")
-            model_path = os.path.join("Artifacts", "Model.pkl")
-            preprocessor = load_object(preprocessor_path)
-            model = load_object(model_path)
-            logging.info('Preprocessor and Model Pickle files loaded')
-            scaled_data = preprocessor.transform(features)
+            # Artifacts are loaded once per process and shared between requests
+            artifacts = self.registry.get()
+            with timed_stage('transform'):
+                scaled_data = transform_features(artifacts.preprocessor, features, artifacts)
             logging.info('Data Scaled')
-            pred = model.predict(scaled_data)
+            with timed_stage('predict'):
+                pred = artifacts.model.predict(scaled_data)
+            count_rows(len(pred))
             return pred
         except Exception as e:
             raise customexception(e, sys)
 
+    def predict_record(self, record):
+        """
+        Score one normalised record (CustomData.get_data_as_dict) and return its log price.
+        Answers SearchForm-style queries from the precomputed price grid and
+        repeated rows from the prediction cache, and goes through the
+        micro-batcher when AIRBNB_MICROBATCH is enabled.
+        """
+        try:
+            grid = get_price_grid(self.registry.get().version)
+            if grid is not None:
+                log_price = grid.lookup(record)
+                if log_price is not None:
+                    count_grid_hit()
+                    return log_price
+
+            cache = get_cache()
+            if cache is not None:
+                version = self.registry.get().version
+                key = PredictionCache.make_key(record)
+                cached = cache.get(key, version)
+                if cached is not None:
+                    return cached
+
+            batcher = get_batcher()
+            if batcher is not None:
+                log_price = batcher.predict(record)
+            else:
+                log_price = float(self.predict_records([record])[0])
+
+            if cache is not None:
+                cache.put(key, version, log_price)
+            return log_price
+        except Exception as e:
+            raise customexception(e, sys)
+
+    def predict_records(self, records):
+        """
+        Score a list of normalised records with one model.predict call.
+        Uses the compiled encoder instead of building a DataFrame when available.
+        """
+        artifacts = self.registry.get()
+        with timed_stage('transform'):
+            if artifacts.encoder is not None:
+                scaled_data = append_extra_features(artifacts.encoder.encode_many(records),
+                                                    [record['latitude'] for record in records],
+                                                    [record['longitude'] for record in records],
+                                                    [record.get(AMENITY_LIST) for record in records], artifacts)
+            else:
+                frame = pd.DataFrame(records, columns=FEATURE_COLUMNS + [AMENITY_LIST])
+                scaled_data = transform_features(artifacts.preprocessor, frame, artifacts)
+        with timed_stage('predict'):
+            pred = artifacts.model.predict(scaled_data)
+        count_rows(len(records))
+        return pred
+
+    def predict_many(self, records):
+        """
+        Score a list of raw request records in vectorized chunks.
+
+        Returns an array of log prices (NaN for rows that failed) and a dict of
+        {row index: error message}. A failing row never fails the whole batch.
+        """
+        try:
+            with timed_stage('normalise'):
+                features, errors = normalise_records(records)
+            valid_index = np.array([i for i in range(len(features)) if i not in errors], dtype=int)
+            log_prices = np.full(len(features), np.nan)
+
+            artifacts = self.registry.get()
+            chunk_size = max(1, self.predict_pipeline_config.batch_chunk_size)
+            for start in range(0, len(valid_index), chunk_size):
+                chunk_index = valid_index[start:start + chunk_size]
+                try:
+                    chunk = features.iloc[chunk_index]
+                    with timed_stage('transform'):
+                        scaled_chunk = transform_features(artifacts.preprocessor, chunk, artifacts)
+                    with timed_stage('predict'):
+                        log_prices[chunk_index] = artifacts.model.predict(scaled_chunk)
+                    count_rows(len(chunk_index))
+                except Exception:
+                    # Isolate the offending rows instead of failing the whole chunk
+                    for i in chunk_index:
+                        try:
+                            row = features.iloc[[i]]
+                            scaled_row = transform_features(artifacts.preprocessor, row, artifacts)
+                            log_prices[i] = artifacts.model.predict(scaled_row)[0]
+                        except Exception as row_error:
+                            errors[int(i)] = str(row_error)
+
+            logging.info(f'Batch scored: {len(features)} rows, {len(errors)} errors')
+            return log_prices, errors
+        except Exception as e:
+            raise customexception(e, sys)
+
+
+def transform_features(preprocessor, frame, artifacts=None):
+    # Same dtype policy and columns as the matrices the model was trained on
+    scaled = np.asarray(preprocessor.transform(frame), dtype=FEATURE_DTYPE)
+    amenity_lists = frame[AMENITY_LIST].tolist() if AMENITY_LIST in frame.columns else [None] * len(frame)
+    return append_extra_features(scaled, frame['latitude'], frame['longitude'], amenity_lists, artifacts)
+
+
+def append_extra_features(scaled, latitudes, longitudes, amenity_lists, artifacts=None):
+    """The geo and amenity columns the loaded model was trained with, after the encoded ones."""
+    if artifacts is None:
+        return scaled
+    scaled = append_geo_features(scaled, latitudes, longitudes, artifacts.geo_index)
+    return append_amenity_features(scaled, amenity_lists, artifacts.amenities)
+
+
+def count_rows(n):
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.rows.inc(amount=n)
+
+
+def count_grid_hit():
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.grid_hits.inc()
+
+
+_price_grid = None
+_price_grid_checked = None
+_price_grid_lock = threading.Lock()
+
+
+def get_price_grid(version):
+    """
+    The price grid built for artifacts `version`, or None when it is disabled,
+    missing or was built for another model. Re-read from disk once per new version.
+    """
+    global _price_grid, _price_grid_checked
+    if _price_grid is not None and _price_grid.version == version:
+        return _price_grid
+    if _price_grid_checked == version:
+        return None
+    with _price_grid_lock:
+        if _price_grid_checked != version:
+            config = PriceGridConfig()
+            grid = None
+            if config.enabled and os.path.exists(config.grid_dir):
+                try:
+                    grid = PriceGrid.load(config.grid_dir)
+                except Exception as e:
+                    logging.info(f"Price grid unavailable: {e}")
+            if grid is not None and grid.version != version:
+                logging.info(f"Price grid was built for version {grid.version}, serving {version}; not used")
+                grid = None
+            _price_grid = grid
+            _price_grid_checked = version
+    return _price_grid if _price_grid is not None and _price_grid.version == version else None
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher():
+    """Process-wide MicroBatcher, or None when micro-batching is disabled."""
+    global _batcher
+    if _batcher is None:
+        config = MicroBatcherConfig()
+        if not config.enabled:
+            return None
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = MicroBatcher(PredictPipeline().predict_records, config)
+    return _batcher
+
 
 class CustomData:
     def __init__(self,
@@ -68,79 +256,18 @@ class CustomData:
         self.bedrooms = bedrooms
         self.beds = beds
 
+    def get_data_as_dict(self):
+        try:
+            # Shared normaliser: mapping tables are built once at import and the
+            # keys come back in the column order used during training
+            return normalise_record(vars(self), strict=True)
+        except Exception as e:
+            logging.info('Exception Occurred in prediction pipeline')
+            raise customexception(e, sys)
+
     def get_data_as_dataframe(self):
         try:
-            # Map form values to expected data format
-            cleaning_fee_map = {'1': 'True', '0': 'False', 'True': 'True', 'False': 'False'}
-            host_pic_map = {'1': 't', '0': 'f', 't': 't', 'f': 'f'}
-            host_verified_map = {'1': 't', '0': 'f', 't': 't', 'f': 'f'}
-            instant_book_map = {'1': 't', '0': 'f', 't': 't', 'f': 'f'}
-            
-            # Map city names to match training data
-            city_map = {
-                'Boston': 'Boston',
-                'Chicago': 'Chicago',
-                'Washington, D.C.': 'DC',
-                'DC': 'DC',
-                'Los Angeles': 'LA',
-                'LA': 'LA',
-                'New York': 'NYC',
-                'NYC': 'NYC',
-                'San Francisco': 'SF',
-                'SF': 'SF'
-            }
-            
-            # Map room types to match training data
-            room_type_map = {
-                'Shared Room': 'Shared room',
-                'Private Room': 'Private room',
-                'Entire Home/Apt': 'Entire home/apt',
-                'Shared room': 'Shared room',
-                'Private room': 'Private room',
-                'Entire home/apt': 'Entire home/apt'
-            }
-            
-            # Map cancellation policy to match training data
-            cancellation_map = {
-                'Flexible': 'flexible',
-                'Moderate': 'moderate',
-                'Strict': 'strict',
-                'Super strict': 'super_strict_30',
-                'Advanced Super Strict': 'super_strict_60',
-                'flexible': 'flexible',
-                'moderate': 'moderate',
-                'strict': 'strict',
-                'super_strict_30': 'super_strict_30',
-                'super_strict_60': 'super_strict_60'
-            }
-            
-            # Column order must match the order used during training
-            # Numerical: amenities, accommodates, bathrooms, latitude, longitude, host_response_rate, number_of_reviews, review_scores_rating, bedrooms, beds
-            # Categorical: property_type, room_type, bed_type, cancellation_policy, cleaning_fee, city, host_has_profile_pic, host_identity_verified, instant_bookable
-            
-            custom_data_input_dict = {
-                'amenities': [self.amenities],
-                'accommodates': [self.accommodates],
-                'bathrooms': [self.bathrooms],
-                'latitude': [self.latitude],
-                'longitude': [self.longitude],
-                'host_response_rate': [self.host_response_rate],
-                'number_of_reviews': [self.number_of_reviews],
-                'review_scores_rating': [self.review_scores_rating],
-                'bedrooms': [self.bedrooms],
-                'beds': [self.beds],
-                'property_type': [self.property_type],
-                'room_type': [room_type_map.get(self.room_type, self.room_type)],
-                'bed_type': [self.bed_type],
-                'cancellation_policy': [cancellation_map.get(self.cancellation_policy, self.cancellation_policy)],
-                'cleaning_fee': [cleaning_fee_map.get(str(self.cleaning_fee), 'True')],
-                'city': [city_map.get(self.city, self.city)],
-                'host_has_profile_pic': [host_pic_map.get(str(self.host_has_profile_pic), 't')],
-                'host_identity_verified': [host_verified_map.get(str(self.host_identity_verified), 't')],
-                'instant_bookable': [instant_book_map.get(str(self.instant_bookable), 'f')]
-            }
-            
-            df = pd.DataFrame(custom_data_input_dict)
+            df = pd.DataFrame([self.get_data_as_dict()], columns=FEATURE_COLUMNS)
             logging.info('Dataframe Gathered')
             return df
         except Exception as e:
@@ -0,0 +1,115 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from src.Airbnb.pipelines.Feature_schema import FEATURE_COLUMNS, AMENITY_LIST
+
+
+@dataclass
+class PredictionCacheConfig:
+    # Maximum number of cached predictions, 0 disables the cache
+    max_size: int = int(os.environ.get("AIRBNB_CACHE_SIZE", "10000"))
+    # Seconds a cached prediction stays valid, 0 means no expiry
+    ttl_seconds: float = float(os.environ.get("AIRBNB_CACHE_TTL", "0"))
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache of log-price predictions keyed on the normalised feature row.
+    Entries are dropped when the model version changes.
+    """
+
+    def __init__(self, config: PredictionCacheConfig = None):
+        self.config = config or PredictionCacheConfig()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(record):
+        key = []
+        for col in FEATURE_COLUMNS:
+            value = record.get(col)
+            # 2, 2.0 and "2" all describe the same listing
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                value = float(value)
+            elif value is not None:
+                value = str(value)
+            key.append(value)
+        # Same count, different amenities
+        key.append(record.get(AMENITY_LIST))
+        return tuple(key)
+
+    def _check_version(self, version):
+        # Called with the lock held
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def get(self, key, version):
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, version, value):
+        if self.config.max_size <= 0:
+            return
+        expires_at = time.monotonic() + self.config.ttl_seconds if self.config.ttl_seconds > 0 else None
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.config.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.config.max_size,
+            "ttl_seconds": self.config.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "model_version": self._version
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide PredictionCache, or None when AIRBNB_CACHE_SIZE is 0."""
+    global _cache
+    if _cache is None:
+        config = PredictionCacheConfig()
+        if config.max_size <= 0:
+            return None
+        with _cache_lock:
+            if _cache is None:
+                _cache = PredictionCache(config)
+    return _cache
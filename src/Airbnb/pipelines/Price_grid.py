@@ -0,0 +1,147 @@
+import os
+import json
+import itertools
+import numpy as np
+from dataclasses import dataclass
+from src.Airbnb.pipelines.Feature_schema import FEATURE_COLUMNS, FEATURE_DTYPE, AMENITY_LIST, normalise_record
+from src.Airbnb.pipelines.Compact_model import META_FILE, file_digest
+
+# Precomputed log prices for the coarse queries of the frontend SearchForm:
+# a request that only sets city, property type, room type and guest count (every
+# other field at its default) is answered by an array lookup instead of the
+# model. The grid is built offline from the fitted artifacts and stored as a
+# .npy array (memory-mapped at serve time) plus meta.json with its axes and the
+# digests of the pickles it was scored with. NumPy and json only, so
+# api/index.py can use it without pandas.
+
+GRID_FILE = 'grid.npy'
+# Categorical axes, in array order; the last axis is accommodates = 1..max_accommodates
+CATEGORICAL_AXES = ['city', 'property_type', 'room_type']
+
+
+@dataclass
+class PriceGridConfig:
+    grid_dir: str = os.path.join('Artifacts', 'price_grid')
+    enabled: bool = os.environ.get("AIRBNB_PRICE_GRID", "true").lower() == "true"
+    max_accommodates: int = int(os.environ.get("AIRBNB_PRICE_GRID_MAX_GUESTS", "16"))
+
+
+class PriceGrid:
+    def __init__(self, meta, grid):
+        self.meta = meta
+        self.grid = grid
+        self.version = meta.get('version')
+        self.axes = [{value: i for i, value in enumerate(meta['axes'][col])} for col in CATEGORICAL_AXES]
+        self.max_accommodates = meta['max_accommodates']
+        # Every column outside the grid axes must equal the base (default) record
+        base = meta['base_record']
+        self.fixed = [(col, base[col]) for col in FEATURE_COLUMNS if col not in CATEGORICAL_AXES + ['accommodates']]
+
+    @classmethod
+    def load(cls, grid_dir, mmap=True):
+        with open(os.path.join(grid_dir, META_FILE)) as file_obj:
+            meta = json.load(file_obj)
+        return cls(meta, np.load(os.path.join(grid_dir, GRID_FILE), mmap_mode='r' if mmap else None))
+
+    def lookup(self, record):
+        """Log price of a normalised record, or None when it is outside the grid."""
+        for col, value in self.fixed:
+            if record[col] != value:
+                return None
+        accommodates = record['accommodates']
+        if not 1 <= accommodates <= self.max_accommodates:
+            return None
+        index = []
+        for col, axis in zip(CATEGORICAL_AXES, self.axes):
+            position = axis.get(record[col])
+            if position is None:
+                return None
+            index.append(position)
+        return float(self.grid[index[0], index[1], index[2], accommodates - 1])
+
+
+def grid_records(axes, max_accommodates):
+    """Normalised records for every grid cell, in C order of the grid array."""
+    base = normalise_record({})
+    records = []
+    for values in itertools.product(*[axes[col] for col in CATEGORICAL_AXES], range(1, max_accommodates + 1)):
+        record = dict(base)
+        record.update(zip(CATEGORICAL_AXES + ['accommodates'], values))
+        records.append(record)
+    return base, records
+
+
+def build_price_grid(model, preprocessor, source_files, version=None, config: PriceGridConfig = None, geo_index=None,
+                     amenities=None):
+    """
+    Score every grid cell in one batch and write grid.npy + meta.json to
+    config.grid_dir. The axes are the categories the preprocessor was fitted
+    on; the base record is normalise_record({}), i.e. the request DEFAULTS.
+    geo_index and amenities are passed when the model was trained with the geo
+    and amenity features (the base record has no amenity list).
+    """
+    import pandas as pd
+    import shutil
+    import tempfile
+    from src.Airbnb.pipelines.Feature_encoder import FastFeatureEncoder
+    from src.Airbnb.pipelines.Geo_index import append_geo_features
+    from src.Airbnb.pipelines.Amenities_encoder import append_amenity_features
+
+    config = config or PriceGridConfig()
+    known = FastFeatureEncoder.from_preprocessor(preprocessor).categories()
+    axes = {col: sorted(known[col]) for col in CATEGORICAL_AXES}
+    base, records = grid_records(axes, config.max_accommodates)
+
+    frame = pd.DataFrame(records, columns=FEATURE_COLUMNS)
+    features = np.asarray(preprocessor.transform(frame), dtype=FEATURE_DTYPE)
+    features = append_geo_features(features, frame['latitude'], frame['longitude'], geo_index)
+    features = append_amenity_features(features, [record[AMENITY_LIST] for record in records], amenities)
+    log_prices = np.asarray(model.predict(features), dtype=np.float64)
+    grid = log_prices.reshape([len(axes[col]) for col in CATEGORICAL_AXES] + [config.max_accommodates])
+
+    meta = {
+        'axes': axes,
+        'max_accommodates': config.max_accommodates,
+        'base_record': base,
+        'version': version,
+        'source_digests': {os.path.basename(path): file_digest(path) for path in source_files},
+        'cells': int(grid.size)
+    }
+    # Build next to the target and swap it in, so readers never see a partial grid
+    parent = os.path.dirname(os.path.abspath(config.grid_dir))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='.price_grid_', dir=parent)
+    np.save(os.path.join(staging, GRID_FILE), grid)
+    with open(os.path.join(staging, META_FILE), 'w') as file_obj:
+        json.dump(meta, file_obj, indent=2)
+    if os.path.exists(config.grid_dir):
+        shutil.rmtree(config.grid_dir)
+    os.replace(staging, config.grid_dir)
+    return grid
+
+
+if __name__ == "__main__":
+    # Build the grid for the artifacts in Artifacts/
+    import argparse
+    from src.Airbnb.utils.utils import load_object
+    from src.Airbnb.pipelines.Model_registry import ModelRegistryConfig, artifacts_version
+    from src.Airbnb.pipelines.Feature_layout import read_feature_layout, load_feature_blocks
+
+    parser = argparse.ArgumentParser(description="Precompute SearchForm prices for the current model")
+    parser.add_argument("--model", default=ModelRegistryConfig.model_path)
+    parser.add_argument("--preprocessor", default=ModelRegistryConfig.preprocessor_path)
+    parser.add_argument("--metrics", default=ModelRegistryConfig.training_metrics_path,
+                        help="training metrics holding the model's feature layout")
+    parser.add_argument("--output", default=PriceGridConfig.grid_dir)
+    parser.add_argument("--max-guests", type=int, default=PriceGridConfig.max_accommodates)
+    args = parser.parse_args()
+
+    model, preprocessor = load_object(args.model), load_object(args.preprocessor)
+    encoded_features = len(preprocessor.get_feature_names_out())
+    geo_index, amenities = load_feature_blocks(read_feature_layout(args.metrics, args.model), model, encoded_features)
+    grid = build_price_grid(model, preprocessor, [args.model, args.preprocessor],
+                            version=artifacts_version([args.preprocessor, args.model]),
+                            config=PriceGridConfig(grid_dir=args.output, max_accommodates=args.max_guests),
+                            geo_index=geo_index,
+                            amenities=amenities)
+    print(f"Wrote {grid.size} prices {grid.shape} to {args.output}")
@@ -0,0 +1,213 @@
+import os
+import sys
+import glob
+import hmac
+import time
+import random
+import itertools
+import cProfile
+import threading
+from collections import Counter
+from dataclasses import dataclass
+
+# Opt-in profiling of the prediction endpoints. A request is profiled with
+# cProfile when it carries the admin token (X-Profile-Token header or
+# ?profile_token=) or is picked by AIRBNB_PROFILE_SAMPLE_RATE; the stats are
+# dumped to AIRBNB_PROFILE_DIR as .prof files (open with pstats or snakeviz).
+# POST /admin/profile starts a time-boxed sampling profile of the whole worker
+# and writes collapsed stacks (.folded, for flamegraph.pl / speedscope).
+# With no token and a zero sample rate no hooks are installed at all.
+
+
+@dataclass
+class RequestProfilerConfig:
+    token: str = os.environ.get("AIRBNB_PROFILE_TOKEN", "")
+    # Share of requests profiled without a token
+    sample_rate: float = float(os.environ.get("AIRBNB_PROFILE_SAMPLE_RATE", "0"))
+    output_dir: str = os.environ.get("AIRBNB_PROFILE_DIR", "profiles")
+    # Profile files kept in output_dir; the oldest are removed
+    max_files: int = int(os.environ.get("AIRBNB_PROFILE_MAX_FILES", "200"))
+    # Upper bound on a /admin/profile session
+    max_seconds: float = float(os.environ.get("AIRBNB_PROFILE_MAX_SECONDS", "120"))
+
+    @property
+    def enabled(self):
+        return bool(self.token) or self.sample_rate > 0
+
+
+class StackSampler:
+    """
+    Samples the stacks of every thread (except its own) every interval seconds
+    for a fixed duration and writes them in collapsed-stack format.
+    """
+
+    def __init__(self, path, seconds, interval):
+        self.path = path
+        self.seconds = seconds
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        deadline = time.monotonic() + self.seconds
+        while time.monotonic() < deadline:
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+        self._write()
+
+    def _write(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as file_obj:
+            for stack, count in self.stacks.most_common():
+                file_obj.write(f"{stack} {count}\n")
+        os.replace(tmp_path, self.path)
+
+
+class RequestProfiler:
+    def __init__(self, config: RequestProfilerConfig = None):
+        self.config = config or RequestProfilerConfig()
+        # cProfile hooks are per thread, but one request at a time keeps the
+        # overhead (and the output) bounded; busy requests are simply not profiled
+        self._request_lock = threading.Lock()
+        self._sampler = None
+        self._sampler_lock = threading.Lock()
+        self._sequence = itertools.count()
+
+    def authorised(self, token):
+        if not (self.config.token and token):
+            return False
+        return hmac.compare_digest(token.encode(), self.config.token.encode())
+
+    def should_profile(self, token):
+        if self.authorised(token):
+            return True
+        return self.config.sample_rate > 0 and random.random() < self.config.sample_rate
+
+    def start_request(self):
+        """A running cProfile.Profile, or None when another request is being profiled."""
+        if not self._request_lock.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except Exception:
+            self._request_lock.release()
+            return None
+        return profile
+
+    def finish_request(self, profile, name):
+        """Stop profile, dump it and return the file path."""
+        try:
+            profile.disable()
+        finally:
+            self._request_lock.release()
+        path = self._new_path(name, ".prof")
+        profile.dump_stats(path)
+        return path
+
+    def start_sampling(self, seconds, interval):
+        """Start a time-boxed StackSampler; returns (path, seconds) or None if one is running."""
+        seconds = min(max(seconds, 0.1), self.config.max_seconds)
+        interval = max(interval, 0.001)
+        with self._sampler_lock:
+            if self._sampler is not None and self._sampler.thread.is_alive():
+                return None
+            path = self._new_path("worker", ".folded")
+            self._sampler = StackSampler(path, seconds, interval).start()
+        return path, seconds
+
+    def _new_path(self, name, suffix):
+        os.makedirs(self.config.output_dir, exist_ok=True)
+        files = sorted(glob.glob(os.path.join(self.config.output_dir, "*")), key=os.path.getmtime)
+        for old_path in files[:max(0, len(files) - self.config.max_files + 1)]:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+        stamp = time.strftime("%Y_%m_%d_%H_%M_%S")
+        return os.path.join(self.config.output_dir, f"{name}_{stamp}_{os.getpid()}_{next(self._sequence)}{suffix}")
+
+
+def instrument_profiling(app, endpoints):
+    """
+    Install the per-request profiling hooks on the given Flask endpoints and the
+    /admin/profile endpoint. Does nothing unless a token or sample rate is set.
+    """
+    profiler = RequestProfiler()
+    if not profiler.config.enabled:
+        return None
+    from flask import g, request, jsonify
+    endpoints = set(endpoints)
+
+    def request_token():
+        return request.headers.get("X-Profile-Token") or request.args.get("profile_token")
+
+    @app.before_request
+    def _start_profile():
+        if request.endpoint in endpoints and profiler.should_profile(request_token()):
+            g.profile = profiler.start_request()
+
+    @app.after_request
+    def _finish_profile(response):
+        profile = g.pop("profile", None)
+        if profile is not None:
+            path = profiler.finish_request(profile, request.endpoint)
+            response.headers["X-Profile-File"] = os.path.basename(path)
+        return response
+
+    @app.teardown_request
+    def _abandon_profile(exc):
+        # after_request is skipped when the handler raises
+        profile = g.pop("profile", None)
+        if profile is not None:
+            profiler.finish_request(profile, request.endpoint)
+
+    @app.route("/admin/profile", methods=["POST"])
+    def admin_profile():
+        if not profiler.authorised(request_token()):
+            return jsonify({"success": False, "error": "Invalid or missing profile token"}), 403
+        try:
+            seconds = float(request.args.get("seconds", "30"))
+            interval = float(request.args.get("interval_ms", "5")) / 1000.0
+        except ValueError:
+            return jsonify({"success": False, "error": "seconds and interval_ms must be numbers"}), 400
+        started = profiler.start_sampling(seconds, interval)
+        if started is None:
+            return jsonify({"success": False, "error": "A profile is already running in this worker"}), 409
+        path, seconds = started
+        return jsonify({"success": True, "pid": os.getpid(), "seconds": seconds,
+                        "file": os.path.basename(path)}), 202
+
+    return profiler
+
+
+if __name__ == "__main__":
+    # Print the hottest functions of a dumped request profile
+    import pstats
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarise a request profile")
+    parser.add_argument("path")
+    parser.add_argument("--sort", default="cumulative")
+    parser.add_argument("--limit", type=int, default=30)
+    args = parser.parse_args()
+    pstats.Stats(args.path).sort_stats(args.sort).print_stats(args.limit)
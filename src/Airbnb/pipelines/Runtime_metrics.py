@@ -0,0 +1,279 @@
+import os
+import sys
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+# In-process metrics rendered in the Prometheus text exposition format (0.0.4)
+# for the /metrics endpoints. Standard library only: api/index.py imports this
+# at cold start, and prometheus_client is not a dependency. Under gunicorn every
+# worker keeps its own values and /metrics reports the worker that answered.
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+@dataclass
+class RuntimeMetricsConfig:
+    enabled: bool = os.environ.get("AIRBNB_METRICS", "true").lower() == "true"
+
+
+def _labels_text(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name, labels, value) for labels, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, label_names=(), function=None):
+        super().__init__(name, documentation, label_names)
+        # Evaluated at scrape time instead of being set by the application
+        self.function = function
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def replace(self, value, *labels):
+        """Drop every other label set, e.g. the previous model version of an info gauge."""
+        with self._lock:
+            self._values = {labels: value}
+
+    def samples(self):
+        if self.function is not None:
+            value = self.function()
+            return [] if value is None else [(self.name, (), value)]
+        return super().samples()
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = sorted((labels, (list(counts), total, count)) for labels, (counts, total, count) in self._values.items())
+        samples = []
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                samples.append((self.name + "_bucket", labels + (_number(bound),), cumulative))
+            samples.append((self.name + "_sum", labels, total))
+            samples.append((self.name + "_count", labels, count))
+        return samples
+
+
+class RuntimeMetrics:
+    """Prediction-path metrics shared by app.py and api/index.py."""
+
+    def __init__(self):
+        self.stage_seconds = Histogram(
+            "airbnb_stage_duration_seconds",
+            "Time spent per prediction stage (parse, normalise, transform, predict)",
+            ("stage",))
+        self.request_seconds = Histogram(
+            "airbnb_request_duration_seconds", "Prediction request latency by endpoint", ("endpoint",))
+        self.requests = Counter(
+            "airbnb_requests_total", "Prediction requests by endpoint and outcome", ("endpoint", "outcome"))
+        self.rows = Counter("airbnb_predicted_rows_total", "Rows scored by model.predict")
+        self.grid_hits = Counter("airbnb_price_grid_hits_total", "Predictions answered from the precomputed price grid")
+        self.microbatch_size = Histogram(
+            "airbnb_microbatch_size_rows", "Rows per micro-batch passed to model.predict", buckets=BATCH_SIZE_BUCKETS)
+        self.microbatch_wait_seconds = Histogram(
+            "airbnb_microbatch_wait_seconds", "Time a row waited in the micro-batch queue before its batch ran")
+        self.microbatch_queue_depth = Gauge(
+            "airbnb_microbatch_queue_depth", "Rows left in the micro-batch queue when the last batch ran")
+        self.microbatch_errors = Counter(
+            "airbnb_microbatch_errors_total", "Micro-batches that failed and were retried row by row")
+        self.model_load_seconds = Gauge(
+            "airbnb_model_load_seconds", "Seconds spent loading the current model artifacts")
+        self.model_loads = Counter("airbnb_model_loads_total", "Model artifact loads (startup and hot swaps)")
+        self.model_info = Gauge(
+            "airbnb_model_info", "Currently served model version (value is always 1)", ("version", "format"))
+        self.rss_bytes = Gauge(
+            "airbnb_process_resident_memory_bytes", "Resident set size of this process", function=resident_memory_bytes)
+        self.start_time = Gauge(
+            "airbnb_process_start_time_seconds", "Unix time the process loaded the metrics module")
+        self.start_time.set(time.time())
+        self._metrics = [self.requests, self.request_seconds, self.stage_seconds, self.rows, self.grid_hits,
+                         self.microbatch_size, self.microbatch_wait_seconds, self.microbatch_queue_depth,
+                         self.microbatch_errors, self.model_info, self.model_load_seconds, self.model_loads,
+                         self.rss_bytes, self.start_time]
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_seconds.observe(time.perf_counter() - start, name)
+
+    def observe_request(self, endpoint, outcome, seconds):
+        self.requests.inc(endpoint, outcome)
+        self.request_seconds.observe(seconds, endpoint)
+
+    def microbatch_ran(self, rows, waits, queue_depth, failed=False):
+        self.microbatch_size.observe(rows)
+        for wait in waits:
+            self.microbatch_wait_seconds.observe(wait)
+        self.microbatch_queue_depth.set(queue_depth)
+        if failed:
+            self.microbatch_errors.inc()
+
+    def model_loaded(self, version, load_seconds, artifact_format="pickle"):
+        self.model_info.replace(1, version, artifact_format)
+        self.model_load_seconds.set(load_seconds)
+        self.model_loads.inc()
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            names = metric.label_names
+            for name, labels, value in metric.samples():
+                label_names = names + ("le",) if name.endswith("_bucket") else names
+                lines.append(f"{name}{_labels_text(label_names, labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def resident_memory_bytes():
+    try:
+        # Second field of statm is the resident page count (Linux)
+        with open("/proc/self/statm") as file_obj:
+            return int(file_obj.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # Peak rather than current RSS where /proc is unavailable (kilobytes on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return None
+
+
+@contextmanager
+def _no_stage(name):
+    yield
+
+
+def timed_stage(name):
+    """Time a block as prediction stage `name` (no-op when metrics are disabled)."""
+    metrics = get_metrics()
+    return metrics.stage(name) if metrics is not None else _no_stage(name)
+
+
+def mark_failed():
+    """Count the current request as an error even though it renders a 200 error page."""
+    from flask import g
+    g.prediction_failed = True
+
+
+def instrument_app(app, endpoints):
+    """
+    Record latency and outcome of POST requests to the given Flask endpoints and
+    serve /metrics. Does nothing when metrics are disabled.
+    """
+    metrics = get_metrics()
+    if metrics is None:
+        return
+    from flask import g, request, Response
+    endpoints = set(endpoints)
+
+    @app.before_request
+    def _start_timer():
+        if request.method == "POST" and request.endpoint in endpoints:
+            g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            if response.status_code >= 500 or g.pop("prediction_failed", False):
+                outcome = "error"
+            elif response.status_code >= 400:
+                outcome = "client_error"
+            else:
+                outcome = "success"
+            metrics.observe_request(request.endpoint, outcome, time.perf_counter() - started)
+        return response
+
+    @app.route("/metrics")
+    def metrics_endpoint():
+        return Response(metrics.render(), mimetype=CONTENT_TYPE)
+
+
+_metrics = None
+_metrics_enabled = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """Process-wide RuntimeMetrics, or None when AIRBNB_METRICS is disabled."""
+    global _metrics, _metrics_enabled
+    if _metrics is None:
+        if _metrics_enabled is None:
+            _metrics_enabled = RuntimeMetricsConfig().enabled
+        if not _metrics_enabled:
+            return None
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = RuntimeMetrics()
+    return _metrics
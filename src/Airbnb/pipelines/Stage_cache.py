@@ -0,0 +1,275 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import numpy as np
+from scipy import sparse
+from dataclasses import dataclass
+from src.Airbnb.logger import logging
+from src.Airbnb.exception import customexception
+from src.Airbnb.pipelines.Compact_model import file_digest
+
+# Content-addressed cache for the stages of the training pipeline. A stage's key
+# is a hash of its name, parameters, the source of the code it runs, the content
+# of its input files and the keys of the stages it depends on. Its output files
+# (and returned arrays) are stored under cache_dir/<stage>/<key>/; when a re-run
+# computes the same key the stage is skipped and its outputs are restored.
+# Output files are hardlinked into the cache and back (copied only across
+# filesystems), so storing and restoring cost no I/O. Writers of stage outputs
+# replace files instead of rewriting them in place; an entry whose files were
+# modified anyway (size or mtime changed) is not restored.
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+MANIFEST_FILE = 'manifest.json'
+
+
+@dataclass
+class StageCacheConfig:
+    cache_dir: str = os.path.join('Artifacts', 'stage_cache')
+    enabled: bool = os.environ.get("AIRBNB_STAGE_CACHE", "true").lower() == "true"
+    # Cached entries kept per stage; older ones are removed
+    keep: int = int(os.environ.get("AIRBNB_STAGE_CACHE_KEEP", "3"))
+
+
+def config_params(config):
+    """Public, non-callable attributes of a config object (class or dataclass instance)."""
+    params = {}
+    for name in dir(config):
+        if name.startswith('_'):
+            continue
+        value = getattr(config, name)
+        if not callable(value):
+            params[name] = value
+    return params
+
+
+class StageRunner:
+    def __init__(self, config: StageCacheConfig = None, force=False, from_stage=None):
+        self.config = config or StageCacheConfig()
+        self.force = force
+        self.from_stage = from_stage
+        self.timings = []
+        self._fingerprints_path = os.path.join(self.config.cache_dir, 'fingerprints.json')
+        self._fingerprints = None
+
+    def fingerprint(self, path):
+        """
+        sha256 of a file or directory. File digests are remembered by (size,
+        mtime) so an unchanged multi-GB source CSV is hashed once.
+        """
+        if os.path.isdir(path):
+            digest = hashlib.sha256()
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    file_path = os.path.join(root, name)
+                    digest.update(os.path.relpath(file_path, path).encode())
+                    digest.update(self.fingerprint(file_path).encode())
+            return digest.hexdigest()
+        if not os.path.exists(path):
+            return None
+
+        if self._fingerprints is None:
+            try:
+                with open(self._fingerprints_path) as file_obj:
+                    self._fingerprints = json.load(file_obj)
+            except (OSError, ValueError):
+                self._fingerprints = {}
+        st = os.stat(path)
+        signature = [st.st_size, st.st_mtime_ns]
+        entry = self._fingerprints.get(os.path.abspath(path))
+        if entry and entry['signature'] == signature:
+            return entry['sha256']
+        sha256 = file_digest(path)
+        self._fingerprints[os.path.abspath(path)] = {'signature': signature, 'sha256': sha256}
+        return sha256
+
+    def _save_fingerprints(self):
+        if self._fingerprints is None:
+            return
+        os.makedirs(self.config.cache_dir, exist_ok=True)
+        tmp_path = self._fingerprints_path + '.tmp'
+        with open(tmp_path, 'w') as file_obj:
+            json.dump(self._fingerprints, file_obj, indent=2)
+        os.replace(tmp_path, self._fingerprints_path)
+
+    def stage_key(self, name, params, code, inputs, upstream):
+        description = {
+            'stage': name,
+            'params': params,
+            'code': {os.path.relpath(path, PROJECT_ROOT): self.fingerprint(path) for path in code},
+            'inputs': {path: self.fingerprint(path) for path in inputs},
+            'upstream': list(upstream)
+        }
+        encoded = json.dumps(description, sort_keys=True, default=str).encode()
+        return hashlib.sha256(encoded).hexdigest()
+
+    def run(self, name, function, params=None, code=(), inputs=(), upstream=(), outputs=()):
+        """
+        Run function() as stage `name` unless a cached result with the same key
+        exists. function returns a dict; NumPy arrays in it are stored as .npy,
+        scipy sparse matrices as .npz, everything else must be JSON-serialisable.
+        outputs are the files or directories the stage writes; one that a run
+        did not produce is removed when that run is restored. Returns (key, result).
+        """
+        if name == self.from_stage:
+            self.force = True
+        start = time.perf_counter()
+        try:
+            key = self.stage_key(name, params or {}, code, inputs, upstream)
+            entry_dir = os.path.join(self.config.cache_dir, name, key)
+
+            if self.config.enabled and not self.force:
+                result = self._restore(entry_dir, outputs)
+                if result is not None:
+                    self._record(name, 'cached', start, key)
+                    logging.info(f"Stage {name}: reused cached outputs {key[:12]}")
+                    return key, result
+
+            result = function()
+            status = 'ran'
+            if self.config.enabled:
+                try:
+                    self._store(name, entry_dir, result, outputs, time.perf_counter() - start)
+                except OSError as e:
+                    logging.info(f"Stage {name}: could not cache outputs: {e}")
+                    status = 'ran (not cached)'
+            self._record(name, status, start, key)
+            return key, result
+        except Exception as e:
+            logging.info(f'Exception occured in stage {name}')
+            raise customexception(e, sys)
+
+    def _record(self, name, status, start, key):
+        self.timings.append({'stage': name, 'status': status,
+                             'seconds': round(time.perf_counter() - start, 3), 'key': key[:12]})
+
+    def _restore(self, entry_dir, outputs):
+        try:
+            with open(os.path.join(entry_dir, MANIFEST_FILE)) as file_obj:
+                manifest = json.load(file_obj)
+        except (OSError, ValueError):
+            return None
+        stored = manifest['outputs']
+        if sorted(stored) != sorted(outputs):
+            return None
+        if not all(stored[path] is None or os.path.exists(os.path.join(entry_dir, stored[path])) for path in outputs):
+            return None
+        signatures = manifest.get('signatures', {})
+        if any(_signature(os.path.join(entry_dir, stored_name)) != signature
+               for stored_name, signature in signatures.items()):
+            logging.info(f"Stage cache entry {entry_dir} was modified, not restoring it")
+            return None
+        for path, stored_name in stored.items():
+            if stored_name is not None:
+                _replace(os.path.join(entry_dir, stored_name), path)
+            elif os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            elif os.path.lexists(path):
+                os.remove(path)
+        result = dict(manifest['values'])
+        for result_name in manifest['arrays']:
+            # Memory-mapped, so large transformed matrices are paged in by the consumer
+            result[result_name] = np.load(os.path.join(entry_dir, f'{result_name}.npy'), mmap_mode='r')
+        for result_name in manifest.get('sparse', []):
+            result[result_name] = sparse.load_npz(os.path.join(entry_dir, f'{result_name}.npz')).tocsr()
+        # Keep recently used entries from being evicted
+        os.utime(entry_dir)
+        return result
+
+    def _store(self, name, entry_dir, result, outputs, seconds):
+        staging = entry_dir + '.tmp'
+        if os.path.exists(staging):
+            shutil.rmtree(staging)
+        os.makedirs(staging)
+        manifest = {'stage': name, 'seconds': seconds, 'created': time.time(),
+                    'outputs': {}, 'signatures': {}, 'values': {}, 'arrays': [], 'sparse': []}
+        for i, path in enumerate(outputs):
+            if not os.path.exists(path):
+                manifest['outputs'][path] = None
+                continue
+            stored_name = f'output_{i}_{os.path.basename(path.rstrip(os.sep))}'
+            _link(path, os.path.join(staging, stored_name))
+            manifest['outputs'][path] = stored_name
+            manifest['signatures'][stored_name] = _signature(os.path.join(staging, stored_name))
+        for result_name, value in (result or {}).items():
+            if isinstance(value, np.ndarray):
+                np.save(os.path.join(staging, f'{result_name}.npy'), value)
+                manifest['arrays'].append(result_name)
+            elif sparse.issparse(value):
+                sparse.save_npz(os.path.join(staging, f'{result_name}.npz'), value)
+                manifest['sparse'].append(result_name)
+            else:
+                manifest['values'][result_name] = value
+        with open(os.path.join(staging, MANIFEST_FILE), 'w') as file_obj:
+            json.dump(manifest, file_obj, indent=2)
+        if os.path.exists(entry_dir):
+            shutil.rmtree(entry_dir)
+        os.replace(staging, entry_dir)
+        self._evict(os.path.dirname(entry_dir))
+
+    def _evict(self, stage_dir):
+        entries = sorted((os.path.join(stage_dir, entry) for entry in os.listdir(stage_dir)
+                          if not entry.endswith('.tmp')), key=os.path.getmtime)
+        for entry in entries[:max(0, len(entries) - self.config.keep)]:
+            shutil.rmtree(entry, ignore_errors=True)
+
+    def summary(self):
+        """Print and log per-stage timings, and write them to cache_dir/last_run.json."""
+        lines = [f"{'stage':<12}{'status':<18}{'seconds':>10}  key"]
+        for timing in self.timings:
+            lines.append(f"{timing['stage']:<12}{timing['status']:<18}{timing['seconds']:>10.3f}  {timing['key']}")
+        total = sum(timing['seconds'] for timing in self.timings)
+        lines.append(f"{'total':<30}{total:>10.3f}")
+        print('\n'.join(lines))
+        logging.info('Stage timings:\n' + '\n'.join(lines))
+        if self.config.enabled:
+            self._save_fingerprints()
+            with open(os.path.join(self.config.cache_dir, 'last_run.json'), 'w') as file_obj:
+                json.dump({'stages': self.timings, 'total_seconds': round(total, 3)}, file_obj, indent=2)
+
+
+def _link(source, target):
+    # Hardlink a file, or every file of a directory; copy when the two are on different filesystems
+    if os.path.isdir(source):
+        shutil.copytree(source, target, copy_function=_link)
+        return
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def _signature(path):
+    """[relative path, size, mtime] of a file or of every file in a directory."""
+    if not os.path.isdir(path):
+        st = os.stat(path)
+        return [['', st.st_size, st.st_mtime_ns]]
+    signature = []
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            st = os.stat(file_path)
+            signature.append([os.path.relpath(file_path, path), st.st_size, st.st_mtime_ns])
+    return signature
+
+
+def _replace(source, target):
+    # Link next to the target and swap it in
+    if os.path.isfile(target) and os.path.samefile(source, target):
+        # Already the cached file (rename() between two links of one file is a no-op)
+        return
+    parent = os.path.dirname(os.path.abspath(target))
+    os.makedirs(parent, exist_ok=True)
+    staging = os.path.join(parent, f'.{os.path.basename(target.rstrip(os.sep))}.restore')
+    if os.path.isdir(staging):
+        shutil.rmtree(staging)
+    elif os.path.lexists(staging):
+        os.remove(staging)
+    _link(source, staging)
+    if os.path.isdir(target) and not os.path.islink(target):
+        shutil.rmtree(target)
+    os.replace(staging, target)
@@ -1,22 +1,116 @@
 import sys
 import os
+import argparse
 
 # Add the project root to Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..')))
 
 from src.Airbnb.components.Data_ingestion import DataIngestion
-from src.Airbnb.components.Data_transformation import DataTransformation
-from src.Airbnb.components.Model_trainer import ModelTrainer
+from src.Airbnb.components.Data_transformation import DataTransformation, DataTransformationConfig
+from src.Airbnb.components.Model_trainer import ModelTrainer, ModelTrainerConfig
+from src.Airbnb.components.Model_export import ModelExportConfig
+from src.Airbnb.pipelines.Price_grid import PriceGridConfig
+from src.Airbnb.pipelines.Geo_index import GeoIndexConfig
+from src.Airbnb.pipelines.Amenities_encoder import AmenitiesConfig
+from src.Airbnb.pipelines.Stage_cache import StageRunner, config_params
+
+STAGES = ['ingest', 'transform', 'train']
+
+
+def module_files(*module_names):
+    return [sys.modules[name].__file__ for name in module_names]
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Airbnb training pipeline")
+    parser.add_argument("--incremental", action="store_true",
+                        help="continue from Artifacts/Model.pkl on new/changed rows only (full retrain on drift or schema change)")
+    parser.add_argument("--force", action="store_true", help="rerun every stage instead of reusing cached outputs")
+    parser.add_argument("--from-stage", choices=STAGES, help="rerun this stage and every stage after it")
+    args = parser.parse_args()
+    incremental = args.incremental or ModelTrainerConfig.incremental
+    # Keep the feature space of the previous run so its trees stay valid
+    reuse_preprocessor = incremental and os.path.exists(ModelTrainerConfig.watermark_file_path)
+
+    # Stages are skipped when their parameters, code, input files and upstream
+    # stages are unchanged since a cached run (Artifacts/stage_cache)
+    runner = StageRunner(force=args.force, from_stage=args.from_stage)
+    common_code = module_files('src.Airbnb.utils.utils', 'src.Airbnb.components.Feature_cleaning')
+
     # Data Ingestion Pipeline
     obj = DataIngestion()
-    train_data_path, test_data_path = obj.initiate_data_ingestion()
+    if incremental:
+        # New rows must not reshuffle listings already trained on into the test split
+        obj.ingestion_config.stable_split = True
+    ingestion_config = obj.ingestion_config
+    ingest_key, ingested = runner.run(
+        'ingest',
+        lambda: dict(zip(['train_data_path', 'test_data_path'], obj.initiate_data_ingestion())),
+        params=config_params(ingestion_config),
+        code=module_files('src.Airbnb.components.Data_ingestion') + common_code,
+        inputs=[ingestion_config.source_data_path],
+        outputs=[ingestion_config.train_data_path, ingestion_config.test_data_path]
+    )
 
     # Data Transformation Pipeline
     data_transformation = DataTransformation()
-    train_arr, test_arr = data_transformation.initialize_data_transformation(train_data_path, test_data_path)
+    preprocessor_path = DataTransformationConfig.preprocessor_obj_file_path
+    geo_config = GeoIndexConfig()
+    amenities_config = AmenitiesConfig()
+
+    def transform():
+        result = dict(zip(['train_arr', 'test_arr'], data_transformation.initialize_data_transformation(
+            ingested['train_data_path'], ingested['test_data_path'], reuse_preprocessor=reuse_preprocessor
+        )))
+        if amenities_config.enabled:
+            # Sparse bag-of-amenities matrices, kept apart from the dense ones
+            result.update(zip(['train_amenities', 'test_amenities'], data_transformation.initialize_amenities_transformation(
+                ingested['train_data_path'], ingested['test_data_path'], reuse_vocabulary=reuse_preprocessor
+            )))
+        return result
+
+    # The saved preprocessor (and geo index, vocabulary) are inputs when they are reused
+    reused_inputs = [preprocessor_path] if reuse_preprocessor else []
+    if reuse_preprocessor and geo_config.enabled:
+        reused_inputs.append(geo_config.index_dir)
+    if reuse_preprocessor and amenities_config.enabled:
+        reused_inputs.append(amenities_config.vocabulary_path)
+    transform_key, transformed = runner.run(
+        'transform',
+        transform,
+        params={**config_params(DataTransformationConfig), 'geo': config_params(geo_config),
+                'amenities': config_params(amenities_config), 'reuse_preprocessor': reuse_preprocessor},
+        code=module_files('src.Airbnb.components.Data_transformation',
+                          'src.Airbnb.components.Streaming_preprocessing', 'src.Airbnb.pipelines.Geo_index',
+                          'src.Airbnb.pipelines.Amenities_encoder') + common_code,
+        inputs=reused_inputs,
+        upstream=[ingest_key],
+        outputs=[preprocessor_path, geo_config.index_dir, amenities_config.vocabulary_path]
+    )
 
     # Model Training Pipeline
     model_trainer_obj = ModelTrainer()
-    model_trainer_obj.initate_model_training(train_arr, test_arr)
\ No newline at end of file
+    trainer_config = model_trainer_obj.model_trainer_config
+    runner.run(
+        'train',
+        lambda: model_trainer_obj.initate_model_training(transformed['train_arr'], transformed['test_arr'],
+                                                         incremental=incremental,
+                                                         split_method=ingestion_config.split_method,
+                                                         train_amenities=transformed.get('train_amenities'),
+                                                         test_amenities=transformed.get('test_amenities')),
+        params={**config_params(trainer_config), 'incremental': incremental},
+        code=module_files('src.Airbnb.components.Model_trainer', 'src.Airbnb.components.Training_watermark',
+                          'src.Airbnb.components.Model_export', 'src.Airbnb.pipelines.Compact_model',
+                          'src.Airbnb.pipelines.Price_grid', 'src.Airbnb.pipelines.Feature_encoder',
+                          'src.Airbnb.pipelines.Feature_schema', 'src.Airbnb.pipelines.Geo_index',
+                          'src.Airbnb.pipelines.Amenities_encoder', 'src.Airbnb.pipelines.Feature_layout') + common_code,
+        # An incremental run continues from the saved model and watermark
+        inputs=[trainer_config.trained_model_file_path, trainer_config.watermark_file_path,
+                trainer_config.trained_rows_file_path] if incremental else [],
+        upstream=[transform_key],
+        outputs=[trainer_config.trained_model_file_path, trainer_config.training_metrics_file_path,
+                 trainer_config.watermark_file_path, trainer_config.trained_rows_file_path,
+                 ModelExportConfig.compact_model_dir, PriceGridConfig.grid_dir]
+    )
+
+    runner.summary()
@@ -11,25 +11,28 @@ def save_object(file_path, obj):
     try:
         dir_path = os.path.dirname(file_path)
         os.makedirs(dir_path, exist_ok=True)
-        with open(file_path, "wb") as file_obj:
+        # Written next to the target and swapped in, so readers never see a partial
+        # pickle and a copy hardlinked into the stage cache is never modified
+        tmp_path = file_path + ".tmp"
+        with open(tmp_path, "wb") as file_obj:
             pickle.dump(obj, file_obj)
+        os.replace(tmp_path, file_path)
     except Exception as e:
         raise customexception(e, sys)
     
 
 def evaluate_model(X_train,y_train,X_test,y_test,models):
+    """
+    Fit every candidate (in parallel, with cached results) and return {name: test R2}.
+    The entries of models are replaced by their fitted estimators.
+    """
     try:
+        from src.Airbnb.components.Model_selection import ModelSelection
+        results = ModelSelection().run(models, X_train, y_train, X_test, y_test)
         report = {}
-        for i in range(len(models)):
-            model = list(models.values())[i]
-            # Train model
-            model.fit(X_train,y_train)
-            # Predict Testing data
-            y_test_pred =model.predict(X_test)
-            # Get R2 scores for train and test data
-            #train_model_score = r2_score(ytrain,y_train_pred)
-            test_model_score = r2_score(y_test,y_test_pred)
-            report[list(models.keys())[i]] =  test_model_score
+        for name, result in results.items():
+            models[name] = result.model
+            report[name] = result.score
         return report
     except Exception as e:
         logging.info('Exception occured during model training')
@@ -44,4 +47,188 @@ def load_object(file_path):
         logging.info('Exception Occured in load_object function utils')
         raise customexception(e,sys)
 
-    
\ No newline at end of file
+    
+
+def _require_pyarrow(file_path):
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError:
+        raise ImportError(f"Reading or writing {file_path} requires pyarrow (pip install pyarrow)")
+
+
+# Arrow IPC files hold one dictionary per column, so dictionary columns are
+# written as plain strings and re-encoded on read; their names are kept here
+DICTIONARY_COLUMNS_KEY = b'airbnb.dictionary_columns'
+
+
+def _arrow_file_schema(schema):
+    """schema with its dictionary fields stored as their value type, listed in the metadata."""
+    import json
+    import pyarrow as pa
+    dictionary_columns = [field.name for field in schema if pa.types.is_dictionary(field.type)]
+    fields = [pa.field(field.name, field.type.value_type, field.nullable) if field.name in dictionary_columns
+              else field for field in schema]
+    metadata = dict(schema.metadata or {})
+    metadata[DICTIONARY_COLUMNS_KEY] = json.dumps(dictionary_columns).encode()
+    return pa.schema(fields, metadata=metadata)
+
+
+def _decode_dictionaries(table, schema):
+    """Dictionary-encode the columns of table that _arrow_file_schema stored as values."""
+    import json
+    metadata = schema.metadata or {}
+    if DICTIONARY_COLUMNS_KEY not in metadata:
+        return table
+    for name in json.loads(metadata[DICTIONARY_COLUMNS_KEY]):
+        if name in table.column_names:
+            index = table.column_names.index(name)
+            table = table.set_column(index, name, table.column(name).dictionary_encode())
+    return table
+
+
+def dataset_format(file_path):
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == '.parquet':
+        return 'parquet'
+    if extension in ('.arrow', '.feather'):
+        return 'arrow'
+    return 'csv'
+
+
+def read_dataset(file_path, columns=None):
+    """
+    Read a train/test split written as CSV, Parquet or Arrow IPC (picked from the extension).
+    Only the requested columns that exist in the file are loaded; Parquet and Arrow
+    files are memory-mapped and keep their stored dtypes.
+    """
+    try:
+        file_format = dataset_format(file_path)
+        if file_format == 'csv':
+            if columns is not None:
+                available = pd.read_csv(file_path, nrows=0).columns
+                columns = [col for col in columns if col in available]
+            return pd.read_csv(file_path, usecols=columns)
+
+        pa = _require_pyarrow(file_path)
+        if file_format == 'parquet':
+            import pyarrow.parquet as pq
+            parquet_file = pq.ParquetFile(file_path, memory_map=True)
+            if columns is not None:
+                columns = [col for col in columns if col in parquet_file.schema_arrow.names]
+            table = parquet_file.read(columns=columns)
+        else:
+            import pyarrow.ipc as ipc
+            reader = ipc.open_file(pa.memory_map(file_path, 'r'))
+            table = reader.read_all()
+            if columns is not None:
+                table = table.select([col for col in columns if col in table.column_names])
+            table = _decode_dictionaries(table, reader.schema)
+        return table.to_pandas()
+    except Exception as e:
+        logging.info('Exception Occured in read_dataset function utils')
+        raise customexception(e, sys)
+
+
+def iter_dataset(file_path, columns=None, chunk_size=100000):
+    """
+    Yield a CSV, Parquet or Arrow IPC split as DataFrames of at most chunk_size rows,
+    with the same column selection as read_dataset.
+    """
+    try:
+        file_format = dataset_format(file_path)
+        if file_format == 'csv':
+            if columns is not None:
+                available = pd.read_csv(file_path, nrows=0).columns
+                columns = [col for col in columns if col in available]
+            with pd.read_csv(file_path, usecols=columns, chunksize=chunk_size) as reader:
+                yield from reader
+            return
+
+        pa = _require_pyarrow(file_path)
+        if file_format == 'parquet':
+            import pyarrow.parquet as pq
+            parquet_file = pq.ParquetFile(file_path, memory_map=True)
+            if columns is not None:
+                columns = [col for col in columns if col in parquet_file.schema_arrow.names]
+            for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+                yield batch.to_pandas()
+        else:
+            import pyarrow.ipc as ipc
+            # The memory-mapped table is not materialised; only each slice is converted
+            reader = ipc.open_file(pa.memory_map(file_path, 'r'))
+            table = reader.read_all()
+            if columns is not None:
+                table = table.select([col for col in columns if col in table.column_names])
+            for start in range(0, table.num_rows, chunk_size):
+                yield _decode_dictionaries(table.slice(start, chunk_size), reader.schema).to_pandas()
+    except Exception as e:
+        logging.info('Exception Occured in iter_dataset function utils')
+        raise customexception(e, sys)
+
+
+def dataset_rows(file_path):
+    """Row count of a split; read from the footer for Parquet/Arrow, counted in chunks for CSV."""
+    file_format = dataset_format(file_path)
+    if file_format == 'parquet':
+        _require_pyarrow(file_path)
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(file_path).metadata.num_rows
+    if file_format == 'arrow':
+        pa = _require_pyarrow(file_path)
+        import pyarrow.ipc as ipc
+        reader = ipc.open_file(pa.memory_map(file_path, 'r'))
+        return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+    first_column = pd.read_csv(file_path, nrows=0).columns[:1].tolist()
+    return sum(len(chunk) for chunk in iter_dataset(file_path, first_column))
+
+
+class DatasetWriter:
+    """
+    Appends DataFrame chunks to a CSV, Parquet or Arrow IPC file with a fixed schema.
+    Chunks may bring different category sets: Parquet stores a dictionary per row
+    group, Arrow IPC files get the categories as strings (see _arrow_file_schema).
+    """
+
+    def __init__(self, file_path, schema=None):
+        self.file_path = file_path
+        self.schema = schema
+        self.file_format = dataset_format(file_path)
+        self._writer = None
+        self._file_schema = None
+        self._header_written = False
+        self.rows = 0
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+
+    def write(self, df):
+        if self.file_format == 'csv':
+            df.to_csv(self.file_path, mode='a', header=not self._header_written, index=False)
+            self._header_written = True
+        else:
+            pa = _require_pyarrow(self.file_path)
+            table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+            if self._writer is None:
+                if self.file_format == 'parquet':
+                    import pyarrow.parquet as pq
+                    self._writer = pq.ParquetWriter(self.file_path, table.schema)
+                else:
+                    import pyarrow.ipc as ipc
+                    self._file_schema = _arrow_file_schema(table.schema)
+                    self._writer = ipc.new_file(self.file_path, self._file_schema)
+            if self.file_format == 'arrow':
+                table = table.cast(self._file_schema)
+            self._writer.write_table(table)
+        self.rows += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+# Keep the log files of the modules under test out of the working tree
+os.environ.setdefault('AIRBNB_LOG_DIR', tempfile.mkdtemp(prefix='airbnb_test_logs_'))
@@ -0,0 +1,96 @@
+import json
+import numpy as np
+import pytest
+from catboost import CatBoostRegressor
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import Ridge
+
+from src.Airbnb.components.Model_export import ModelExportConfig, export_compact_model
+from src.Airbnb.pipelines.Compact_model import CompactModel, META_FILE
+
+# The NumPy evaluator must reproduce model.predict for every model kind the
+# export supports, on batches smaller and larger than CompactModel.batch_size
+# (which are evaluated in blocks).
+
+N_FEATURES = 8
+# CompactModel's default meta['batch_size'] (asserted below)
+BATCH_SIZE = 1024
+ROWS = [BATCH_SIZE // 4, 2 * BATCH_SIZE + 37]
+# Inputs are float32 matrices (FEATURE_DTYPE) and the trees compare in float32
+TOLERANCE = 1e-6
+
+
+def features(n, seed, nan_fraction=0.0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, N_FEATURES)).astype(np.float32)
+    if nan_fraction:
+        X[rng.random(X.shape) < nan_fraction] = np.nan
+    return X
+
+
+def target(X):
+    X = np.nan_to_num(X, nan=3.0)
+    return np.sin(X[:, 0]) + 0.5 * X[:, 1] * X[:, 2] - np.abs(X[:, 3]) + 0.1 * X[:, 4:].sum(axis=1)
+
+
+def export_and_load(model, X_check, tmp_path):
+    model_dir = str(tmp_path / 'compact_model')
+    export_compact_model(model, X_check, ModelExportConfig(compact_model_dir=model_dir))
+    return CompactModel.load(model_dir)
+
+
+def assert_parity(model, compact, seed, nan_fraction=0.0):
+    assert compact.batch_size == BATCH_SIZE
+    for n in ROWS:
+        X = features(n, seed, nan_fraction)
+        expected = np.asarray(model.predict(X), dtype=np.float64).ravel()
+        np.testing.assert_allclose(compact.predict(X), expected, rtol=TOLERANCE, atol=TOLERANCE)
+    # A single row (1-d input) goes through the same path
+    np.testing.assert_allclose(compact.predict(X[0]), expected[:1], rtol=TOLERANCE, atol=TOLERANCE)
+
+
+def test_gradient_boosting(tmp_path):
+    X = features(1500, seed=0)
+    model = GradientBoostingRegressor(n_estimators=40, max_depth=4, random_state=0).fit(X, target(X))
+    compact = export_and_load(model, X[:200], tmp_path)
+    assert compact.kind == 'tree' and compact.meta['aggregation'] == 'sum'
+    assert_parity(model, compact, seed=1)
+
+
+def test_random_forest(tmp_path):
+    X = features(1500, seed=2)
+    model = RandomForestRegressor(n_estimators=25, max_depth=8, random_state=0).fit(X, target(X))
+    compact = export_and_load(model, X[:200], tmp_path)
+    assert compact.kind == 'tree' and compact.meta['aggregation'] == 'mean'
+    assert_parity(model, compact, seed=3)
+
+
+@pytest.mark.parametrize('nan_mode', ['Min', 'Max'])
+def test_catboost_with_missing_values(tmp_path, nan_mode):
+    X = features(1500, seed=4, nan_fraction=0.15)
+    model = CatBoostRegressor(iterations=60, depth=5, nan_mode=nan_mode, verbose=False, random_seed=0,
+                              allow_writing_files=False)
+    model.fit(X, target(X))
+    compact = export_and_load(model, X[:200], tmp_path)
+    assert compact.kind == 'oblivious'
+    # nan_mode='Max' sends missing values to the "greater than border" side
+    assert compact.meta['nan_as_true'] == (nan_mode == 'Max')
+    assert_parity(model, compact, seed=5, nan_fraction=0.15)
+
+
+def test_linear(tmp_path):
+    X = features(1500, seed=6)
+    model = Ridge(alpha=0.5).fit(X, target(X))
+    compact = export_and_load(model, X[:200], tmp_path)
+    assert compact.kind == 'linear'
+    assert_parity(model, compact, seed=7)
+
+
+def test_export_records_parity(tmp_path):
+    X = features(500, seed=8)
+    model = Ridge().fit(X, target(X))
+    export_and_load(model, X, tmp_path)
+    with open(tmp_path / 'compact_model' / META_FILE) as file_obj:
+        meta = json.load(file_obj)
+    assert meta['parity']['rows'] == len(X)
+    assert meta['parity']['max_abs_diff'] <= ModelExportConfig.parity_tolerance
@@ -0,0 +1,108 @@
+import math
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.Airbnb.components.Data_transformation import DataTransformation
+from src.Airbnb.pipelines.Feature_encoder import FastFeatureEncoder, compile_encoder
+from src.Airbnb.pipelines.Feature_schema import (
+    NUMERICAL_COLUMNS, CATEGORICAL_COLUMNS, FEATURE_COLUMNS, normalise_records
+)
+
+# FastFeatureEncoder must reproduce preprocessor.transform bit for bit, on the
+# rows serving actually sees: normalised requests, unseen categories, missing
+# values and the boolean flag columns.
+
+CATEGORIES = {
+    'property_type': ['Apartment', 'House', 'Condominium', 'Loft', 'Villa'],
+    'room_type': ['Entire home/apt', 'Private room', 'Shared room'],
+    'bed_type': ['Real Bed', 'Futon', 'Pull-out Sofa', 'Airbed', 'Couch'],
+    'cancellation_policy': ['strict', 'moderate', 'flexible', 'super_strict_30', 'super_strict_60'],
+    'cleaning_fee': ['True', 'False'],
+    'city': ['NYC', 'SF', 'DC', 'LA', 'Chicago', 'Boston'],
+    'host_has_profile_pic': ['t', 'f'],
+    'host_identity_verified': ['t', 'f'],
+    'instant_bookable': ['t', 'f']
+}
+
+
+def listings(n, seed):
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({col: rng.normal(10.0, 5.0, n) for col in NUMERICAL_COLUMNS})
+    frame['latitude'] = rng.uniform(33.0, 42.0, n)
+    frame['longitude'] = rng.uniform(-122.0, -71.0, n)
+    for col, values in CATEGORIES.items():
+        frame[col] = rng.choice(values, n)
+    return frame[FEATURE_COLUMNS]
+
+
+@pytest.fixture(scope='module')
+def preprocessor():
+    return DataTransformation().get_data_transformation().fit(listings(500, seed=0))
+
+
+def assert_parity(preprocessor, frame, dtype=np.float64):
+    encoder = FastFeatureEncoder.from_preprocessor(preprocessor, dtype)
+    expected = np.asarray(preprocessor.transform(frame[FEATURE_COLUMNS]), dtype=dtype)
+    actual = encoder.encode_many(frame[FEATURE_COLUMNS].to_dict(orient='records'))
+    assert actual.dtype == expected.dtype
+    np.testing.assert_array_equal(actual, expected)
+    for i, record in enumerate(frame[FEATURE_COLUMNS].to_dict(orient='records')[:20]):
+        np.testing.assert_array_equal(encoder.encode(record)[0], expected[i])
+
+
+@pytest.mark.parametrize('dtype', [np.float64, np.float32])
+def test_normal_rows(preprocessor, dtype):
+    assert_parity(preprocessor, listings(300, seed=1), dtype)
+
+
+def test_normalised_requests(preprocessor):
+    requests = listings(50, seed=2).to_dict(orient='records')
+    for request in requests[::3]:
+        request['city'] = 'San Francisco'
+        request['room_type'] = 'Private Room'
+        request['host_response_rate'] = '93%'
+        request['amenities'] = '{TV,"Wireless Internet",Kitchen}'
+    frame, errors = normalise_records(requests)
+    assert not errors
+    assert_parity(preprocessor, frame)
+
+
+def test_unseen_categories(preprocessor):
+    frame = listings(40, seed=3)
+    frame.loc[::2, 'property_type'] = 'Spaceship'
+    frame.loc[1::4, 'city'] = 'Atlantis'
+    frame.loc[::5, 'bed_type'] = 'Hammock'
+    assert_parity(preprocessor, frame)
+
+
+def test_missing_values(preprocessor):
+    frame = listings(40, seed=4).astype({col: object for col in CATEGORICAL_COLUMNS})
+    for i, col in enumerate(FEATURE_COLUMNS):
+        frame.loc[i % len(frame)::7, col] = math.nan
+    assert_parity(preprocessor, frame)
+
+
+def test_boolean_flags(preprocessor):
+    flags = ['cleaning_fee', 'host_has_profile_pic', 'host_identity_verified', 'instant_bookable']
+    requests = listings(16, seed=5).to_dict(orient='records')
+    for i, request in enumerate(requests):
+        for j, col in enumerate(flags):
+            value = bool((i >> j) & 1)
+            # Booleans, their string forms and the form's '1'/'0' all normalise to the trained categories
+            request[col] = [value, str(value), '1' if value else '0'][i % 3]
+    frame, errors = normalise_records(requests)
+    assert not errors
+    assert set(frame['cleaning_fee']) == {'True', 'False'}
+    assert set(frame['instant_bookable']) == {'t', 'f'}
+    assert_parity(preprocessor, frame)
+
+
+def test_saved_encoder_and_compile_check(preprocessor, tmp_path):
+    encoder = compile_encoder(preprocessor)
+    path = tmp_path / 'encoder.json'
+    encoder.save(str(path))
+    frame = listings(30, seed=6)
+    records = frame.to_dict(orient='records')
+    np.testing.assert_array_equal(FastFeatureEncoder.load(str(path)).encode_many(records), encoder.encode_many(records))
+    assert encoder.check_parity(preprocessor, frame)
@@ -6,6 +6,7 @@ to find the best performer for Airbnb price prediction in India.
 
 import os
 import pickle
+import argparse
 import numpy as np
 import pandas as pd
 from sklearn.compose import ColumnTransformer
@@ -15,11 +16,12 @@ from sklearn.preprocessing import OneHotEncoder, StandardScaler
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
 from sklearn.linear_model import LinearRegression
-from sklearn.metrics import r2_score
 
 # Configuration
 RANDOM_STATE = 42
 N_SAMPLES = 2000
+# Rows generated per chunk when streaming synthetic data to disk
+CHUNK_SIZE = 1_000_000
 OUTPUT_PATH = os.path.join("Artifacts", "Model.pkl")
 PREPROCESSOR_PATH = os.path.join("Artifacts", "Preprocessor.pkl")
 
@@ -56,8 +58,32 @@ BED_TYPES = ["Real Bed", "Futon", "Pull-out Sofa", "Airbed", "Couch"]
 # Cancellation policies
 CANCELLATION_POLICIES = ["flexible", "moderate", "strict", "super_strict_30", "super_strict_60"]
 
+# Bathroom counts
+BATHROOMS = np.array([1.0, 1.5, 2.0, 2.5, 3.0, 3.5, 4.0])
 
-def generate_synthetic_data(n_samples: int = N_SAMPLES) -> pd.DataFrame:
+# City centre coordinates
+CITY_COORDS_BY_NAME = {
+    "Mumbai": (19.0760, 72.8777),
+    "Delhi": (28.7041, 77.1025),
+    "Bangalore": (12.9716, 77.5946),
+    "Chennai": (13.0827, 80.2707),
+    "Hyderabad": (17.3850, 78.4867),
+    "Kolkata": (22.5726, 88.3639)
+}
+
+# Lookup arrays for column-wise generation, indexed by the sampled category index
+CITY_NAMES = np.array(list(CITIES), dtype=object)
+CITY_MULTIPLIERS = np.array(list(CITIES.values()))
+CITY_COORDS = np.array([CITY_COORDS_BY_NAME[city] for city in CITIES])
+PROPERTY_NAMES = np.array(list(PROPERTY_TYPES), dtype=object)
+PROPERTY_MULTIPLIERS = np.array(list(PROPERTY_TYPES.values()))
+ROOM_NAMES = np.array(list(ROOM_TYPES), dtype=object)
+ROOM_MULTIPLIERS = np.array(list(ROOM_TYPES.values()))
+BED_NAMES = np.array(BED_TYPES, dtype=object)
+CANCELLATION_NAMES = np.array(CANCELLATION_POLICIES, dtype=object)
+
+
+def generate_synthetic_data(n_samples: int = N_SAMPLES, seed: int = RANDOM_STATE) -> pd.DataFrame:
     """
     Generate synthetic Indian property data matching the columns expected by app.py.
     
@@ -67,104 +93,106 @@ def generate_synthetic_data(n_samples: int = N_SAMPLES) -> pd.DataFrame:
     - host_response_rate, instant_bookable, latitude, longitude, number_of_reviews
     - review_scores_rating, bedrooms, beds
     """
-    np.random.seed(RANDOM_STATE)
-    
-    data = []
-    
-    for _ in range(n_samples):
-        # Random selections
-        city = np.random.choice(list(CITIES.keys()))
-        property_type = np.random.choice(list(PROPERTY_TYPES.keys()))
-        room_type = np.random.choice(list(ROOM_TYPES.keys()))
-        bed_type = np.random.choice(BED_TYPES)
-        cancellation_policy = np.random.choice(CANCELLATION_POLICIES)
-        
-        # Numeric features
-        bedrooms = np.random.randint(1, 6)  # 1-5 bedrooms
-        beds = max(bedrooms, np.random.randint(1, 8))  # At least as many beds as bedrooms
-        bathrooms = np.random.choice([1.0, 1.5, 2.0, 2.5, 3.0, 3.5, 4.0])
-        accommodates = np.random.randint(1, 17)  # 1-16 guests
-        amenities = np.random.randint(5, 50)  # Number of amenities
-        
-        # Host features
-        host_response_rate = np.random.randint(50, 101)  # 50-100%
-        host_has_profile_pic = np.random.choice(["t", "f"], p=[0.9, 0.1])
-        host_identity_verified = np.random.choice(["t", "f"], p=[0.8, 0.2])
-        instant_bookable = np.random.choice(["t", "f"], p=[0.6, 0.4])
-        cleaning_fee = np.random.choice(["True", "False"], p=[0.7, 0.3])
-        
-        # Review features
-        number_of_reviews = np.random.randint(0, 500)
-        review_scores_rating = np.random.randint(60, 101)
-        
-        # Location coordinates (approximate for Indian cities)
-        city_coords = {
-            "Mumbai": (19.0760, 72.8777),
-            "Delhi": (28.7041, 77.1025),
-            "Bangalore": (12.9716, 77.5946),
-            "Chennai": (13.0827, 80.2707),
-            "Hyderabad": (17.3850, 78.4867),
-            "Kolkata": (22.5726, 88.3639)
-        }
-        base_lat, base_lon = city_coords[city]
-        latitude = base_lat + np.random.uniform(-0.1, 0.1)
-        longitude = base_lon + np.random.uniform(-0.1, 0.1)
-        
-        # Calculate price in INR (₹2,500 - ₹50,000)
-        base_price = 5000  # Base price in INR
-        
-        # Apply multipliers
-        price = base_price
-        price *= CITIES[city]
-        price *= PROPERTY_TYPES[property_type]
-        price *= ROOM_TYPES[room_type]
-        
-        # Bedroom/bed adjustments
-        price *= (1 + 0.15 * (bedrooms - 1))  # Each extra bedroom adds 15%
-        price *= (1 + 0.05 * (accommodates - 2))  # Each extra guest capacity adds 5%
-        
-        # Amenity bonus
-        price *= (1 + 0.005 * amenities)
-        
-        # Review score bonus
-        if review_scores_rating >= 90:
-            price *= 1.1
-        elif review_scores_rating >= 80:
-            price *= 1.05
-        
-        # Add some random noise
-        price *= np.random.uniform(0.85, 1.15)
-        
-        # Clamp to range
-        price = np.clip(price, 2500, 50000)
-        
+    return synthetic_chunk(np.random.default_rng(seed), n_samples)
+
+
+def synthetic_chunk(rng: np.random.Generator, n: int) -> pd.DataFrame:
+    """
+    Generate n rows at once: every feature is drawn as a whole column from rng
+    and the price formula is applied column-wise.
+    """
+    # Random selections (indices into the lookup tables)
+    city_idx = rng.integers(0, len(CITY_NAMES), n)
+    property_idx = rng.integers(0, len(PROPERTY_NAMES), n)
+    room_idx = rng.integers(0, len(ROOM_NAMES), n)
+    
+    # Numeric features
+    bedrooms = rng.integers(1, 6, n)  # 1-5 bedrooms
+    beds = np.maximum(bedrooms, rng.integers(1, 8, n))  # At least as many beds as bedrooms
+    bathrooms = rng.choice(BATHROOMS, n)
+    accommodates = rng.integers(1, 17, n)  # 1-16 guests
+    amenities = rng.integers(5, 50, n)  # Number of amenities
+    
+    # Host features
+    host_response_rate = rng.integers(50, 101, n)  # 50-100%
+    
+    # Review features
+    number_of_reviews = rng.integers(0, 500, n)
+    review_scores_rating = rng.integers(60, 101, n)
+    
+    # Location coordinates (approximate for Indian cities)
+    latitude = CITY_COORDS[city_idx, 0] + rng.uniform(-0.1, 0.1, n)
+    longitude = CITY_COORDS[city_idx, 1] + rng.uniform(-0.1, 0.1, n)
+    
+    # Calculate price in INR (₹2,500 - ₹50,000)
+    base_price = 5000  # Base price in INR
+    
+    # Apply multipliers
+    price = base_price * CITY_MULTIPLIERS[city_idx] * PROPERTY_MULTIPLIERS[property_idx] * ROOM_MULTIPLIERS[room_idx]
+    
+    # Bedroom/bed adjustments
+    price *= (1 + 0.15 * (bedrooms - 1))  # Each extra bedroom adds 15%
+    price *= (1 + 0.05 * (accommodates - 2))  # Each extra guest capacity adds 5%
+    
+    # Amenity bonus
+    price *= (1 + 0.005 * amenities)
+    
+    # Review score bonus
+    price *= np.select([review_scores_rating >= 90, review_scores_rating >= 80], [1.1, 1.05], 1.0)
+    
+    # Add some random noise
+    price *= rng.uniform(0.85, 1.15, n)
+    
+    # Clamp to range
+    price = np.clip(price, 2500, 50000)
+    
+    return pd.DataFrame({
+        "property_type": PROPERTY_NAMES[property_idx],
+        "room_type": ROOM_NAMES[room_idx],
+        "amenities": amenities,
+        "accommodates": accommodates,
+        "bathrooms": bathrooms,
+        "bed_type": BED_NAMES[rng.integers(0, len(BED_NAMES), n)],
+        "cancellation_policy": CANCELLATION_NAMES[rng.integers(0, len(CANCELLATION_NAMES), n)],
+        "cleaning_fee": np.where(rng.random(n) < 0.7, "True", "False").astype(object),
+        "city": CITY_NAMES[city_idx],
+        "host_has_profile_pic": np.where(rng.random(n) < 0.9, "t", "f").astype(object),
+        "host_identity_verified": np.where(rng.random(n) < 0.8, "t", "f").astype(object),
+        "host_response_rate": host_response_rate,
+        "instant_bookable": np.where(rng.random(n) < 0.6, "t", "f").astype(object),
+        "latitude": latitude,
+        "longitude": longitude,
+        "number_of_reviews": number_of_reviews,
+        "review_scores_rating": review_scores_rating,
+        "bedrooms": bedrooms,
+        "beds": beds,
         # Calculate log_price (as used in the original model)
-        log_price = np.log(price)
-        
-        data.append({
-            "property_type": property_type,
-            "room_type": room_type,
-            "amenities": amenities,
-            "accommodates": accommodates,
-            "bathrooms": bathrooms,
-            "bed_type": bed_type,
-            "cancellation_policy": cancellation_policy,
-            "cleaning_fee": cleaning_fee,
-            "city": city,
-            "host_has_profile_pic": host_has_profile_pic,
-            "host_identity_verified": host_identity_verified,
-            "host_response_rate": host_response_rate,
-            "instant_bookable": instant_bookable,
-            "latitude": latitude,
-            "longitude": longitude,
-            "number_of_reviews": number_of_reviews,
-            "review_scores_rating": review_scores_rating,
-            "bedrooms": bedrooms,
-            "beds": beds,
-            "log_price": log_price
-        })
-    
-    return pd.DataFrame(data)
+        "log_price": np.log(price)
+    })
+
+
+def iter_synthetic_data(n_samples: int, chunk_size: int = CHUNK_SIZE, seed: int = RANDOM_STATE):
+    """
+    Yield n_samples rows as DataFrames of at most chunk_size rows, so corpora larger
+    than memory can be generated. For a given seed and chunk_size the output is
+    reproducible.
+    """
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_samples, chunk_size):
+        yield synthetic_chunk(rng, min(chunk_size, n_samples - start))
+
+
+def write_synthetic_data(file_path: str, n_samples: int, chunk_size: int = CHUNK_SIZE, seed: int = RANDOM_STATE) -> int:
+    """
+    Stream synthetic data to a .csv, .parquet or .arrow file one chunk at a time.
+    Returns the number of rows written.
+    """
+    from src.Airbnb.utils.utils import DatasetWriter
+    
+    with DatasetWriter(file_path) as writer:
+        for chunk in iter_synthetic_data(n_samples, chunk_size, seed):
+            writer.write(chunk)
+    return writer.rows
 
 
 def create_preprocessor():
@@ -222,24 +250,19 @@ def train_and_compare_models(X_train, X_test, y_train, y_test):
         "LinearRegression": LinearRegression()
     }
     
-    results = {}
-    
     print("\n" + "=" * 60)
     print("MODEL BATTLE - Training and Comparing Models")
     print("=" * 60)
     
-    for name, model in models.items():
-        print(f"\n Training {name}...")
-        model.fit(X_train, y_train)
-        
-        # Predict
-        y_pred = model.predict(X_test)
-        
-        # Calculate R² score
-        r2 = r2_score(y_test, y_pred)
-        results[name] = {"model": model, "r2_score": r2}
-        
-        print(f"   R² Score: {r2:.4f}")
+    # Candidates are fitted in parallel; unchanged ones come from the result cache
+    from src.Airbnb.components.Model_selection import ModelSelection
+    
+    results = {}
+    for name, result in ModelSelection().run(models, X_train, y_train, X_test, y_test).items():
+        results[name] = {"model": result.model, "r2_score": result.score}
+        source = "cached" if result.cached else f"trained in {result.fit_seconds:.1f}s"
+        print(f"\n {name} ({source})")
+        print(f"   R² Score: {result.score:.4f}")
     
     # Find best model
     best_model_name = max(results, key=lambda x: results[x]["r2_score"])
@@ -253,17 +276,33 @@ def train_and_compare_models(X_train, X_test, y_train, y_test):
     return best_model_name, best_model, best_r2
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate synthetic Indian listings and train the price model.")
+    parser.add_argument("--samples", type=int, default=N_SAMPLES, help="number of synthetic rows")
+    parser.add_argument("--seed", type=int, default=RANDOM_STATE)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="rows per chunk with --data-only")
+    parser.add_argument("--data-only", metavar="PATH",
+                        help="stream the synthetic data to a .csv/.parquet/.arrow file and skip training")
+    return parser.parse_args()
+
+
 def main():
     """
     Main execution function.
     """
+    args = parse_args()
+    if args.data_only:
+        rows = write_synthetic_data(args.data_only, args.samples, args.chunk_size, args.seed)
+        print(f"Wrote {rows} synthetic rows to {args.data_only}")
+        return
+    
     print("\n" + "=" * 60)
     print("🇮🇳 INDIAN AIRBNB PRICE PREDICTION - AutoML Training")
     print("=" * 60)
     
     # Step 1: Generate synthetic data
     print("\n📊 Step 1: Generating Synthetic Indian Property Data...")
-    df = generate_synthetic_data(N_SAMPLES)
+    df = generate_synthetic_data(args.samples, args.seed)
     print(f"   Generated {len(df)} samples")
     print(f"   Cities: {df['city'].unique().tolist()}")
     print(f"   Price Range: ₹{np.exp(df['log_price'].min()):.0f} - ₹{np.exp(df['log_price'].max()):.0f}")
@@ -310,6 +349,24 @@ def main():
         pickle.dump(preprocessor, f)
     print(f"   Preprocessor saved to: {PREPROCESSOR_PATH}")
     
+    # Compact tree export for the NumPy evaluator, checked against the test split
+    from src.Airbnb.components.Model_export import export_compact_model, ModelExportConfig
+    try:
+        export_compact_model(best_model, X_test_processed, preprocessor=preprocessor,
+                             source_files=[OUTPUT_PATH, PREPROCESSOR_PATH])
+        print(f"   Compact model exported to: {ModelExportConfig.compact_model_dir}")
+    except Exception as e:
+        print(f"   Compact model export skipped: {e}")
+
+    from src.Airbnb.pipelines.Price_grid import build_price_grid, PriceGridConfig
+    from src.Airbnb.pipelines.Model_registry import artifacts_version
+    try:
+        build_price_grid(best_model, preprocessor, [OUTPUT_PATH, PREPROCESSOR_PATH],
+                         version=artifacts_version([PREPROCESSOR_PATH, OUTPUT_PATH]))
+        print(f"   Price grid written to: {PriceGridConfig.grid_dir}")
+    except Exception as e:
+        print(f"   Price grid skipped: {e}")
+    
     # Final summary
     print("\n" + "=" * 60)
     print("✅ TRAINING COMPLETE!")